@@ -0,0 +1,307 @@
+"""An ASGI-native GraphQL view resolving the root fields of queries concurrently.
+
+The synchronous GraphQL view resolves the root fields of a query one after another,
+so a dashboard querying dataPointsByHour for six series waits for the sum of all six.
+This view is an async Django view: it splits a query into one operation per root
+field and executes them concurrently in a bounded thread pool, where the ORM may be
+used, so the response takes about as long as the slowest field. Each root field has
+its own DataLoaders, as these are not thread-safe, while the accessible IDs are
+loaded once and shared. Mutations keep their serial execution and subscriptions are
+only served by the WebSocket consumer.
+
+Like the synchronous view, the GRAPHENE["MIDDLEWARE"] run on every root field and
+sampled operations are traced, one trace per root field. With the debug middleware
+enabled, queries are not split, so `_debug` sees the SQL statements of all fields."""
+
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from functools import partial
+from typing import Dict, List, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import HttpResponse, HttpResponseNotAllowed, JsonResponse
+from graphene_django.settings import graphene_settings
+from graphene_django.views import instantiate_middleware
+from graphql import GraphQLError
+from graphql.error import GraphQLSyntaxError, format_error
+from graphql.execution import ExecutionResult, execute
+from graphql.language import ast
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from core import json_codec
+from core.db_routers import replica_reads
+from core.document_cache import get_document_backend
+from core.query_cost import check_query_cost
+from core.tracing import trace_operation
+from iot.access import ACCESSIBLE_IDS_ATTRIBUTE, AccessibleIds
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """The process' thread pool resolving root fields."""
+
+    global _executor  # pylint: disable=global-statement
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.GRAPHQL_ASYNC_WORKERS,
+                thread_name_prefix="graphql",
+            )
+        return _executor
+
+
+class FieldContext:
+    """The context of a root field, which keeps its own attributes, e.g., DataLoaders,
+    and reads all others from the request."""
+
+    def __init__(self, request):
+        self._request = request
+
+    def __getattr__(self, name):
+        return getattr(self._request, name)
+
+
+def authenticate(request):
+    """Authenticate the request with DRF's authentication classes, e.g., session,
+    token or OAuth2. Returns the user or raises an APIException."""
+
+    drf_request = Request(
+        request,
+        authenticators=[cls() for cls in api_settings.DEFAULT_AUTHENTICATION_CLASSES],
+    )
+    user = drf_request.user
+    request.user = user
+    return user
+
+
+def get_graphql_params(request):
+    if request.method == "GET":
+        data = request.GET
+    else:
+        try:
+            data = json_codec.loads(request.body)
+        except (UnicodeDecodeError, ValueError):
+            raise GraphQLError("POST body sent invalid JSON.")
+        if not isinstance(data, dict):
+            raise GraphQLError("The received data is not a valid JSON query.")
+    variables = data.get("variables") or {}
+    if isinstance(variables, str):
+        try:
+            variables = json_codec.loads(variables)
+        except ValueError:
+            raise GraphQLError("Variables are invalid JSON.")
+    return data.get("query"), variables, data.get("operationName")
+
+
+def split_root_fields(document_ast, operation) -> List[ast.Document]:
+    """One document per root field of the operation, keeping all fragments."""
+
+    fragments = [
+        definition
+        for definition in document_ast.definitions
+        if isinstance(definition, ast.FragmentDefinition)
+    ]
+    return [
+        ast.Document(
+            definitions=[
+                ast.OperationDefinition(
+                    operation=operation.operation,
+                    name=operation.name,
+                    variable_definitions=operation.variable_definitions,
+                    directives=operation.directives,
+                    selection_set=ast.SelectionSet(selections=[selection]),
+                )
+            ]
+            + fragments
+        )
+        for selection in operation.selection_set.selections
+    ]
+
+
+def get_operation(document_ast, operation_name: Optional[str]):
+    operations = [
+        definition
+        for definition in document_ast.definitions
+        if isinstance(definition, ast.OperationDefinition)
+    ]
+    if operation_name:
+        for operation in operations:
+            if operation.name and operation.name.value == operation_name:
+                return operation
+        return None
+    return operations[0] if len(operations) == 1 else None
+
+
+def execute_in_thread(
+    schema,
+    document_ast,
+    context,
+    variables,
+    operation_name,
+    middleware,
+    read_only=False,
+):
+    """Execute a document in a pool thread, closing its connections afterwards.
+    Read-only operations are executed on a read replica. Sampled operations are
+    traced within the thread, whose connections execute the SQL statements."""
+
+    try:
+        with ExitStack() as stack:
+            stack.enter_context(trace_operation(context, operation_name))
+            if read_only:
+                stack.enter_context(replica_reads(context.user))
+            return execute(
+                schema,
+                document_ast,
+                context_value=context,
+                variable_values=variables,
+                operation_name=operation_name,
+                middleware=middleware,
+            )
+    finally:
+        close_old_connections()
+
+
+def merge_results(results: List[ExecutionResult]) -> ExecutionResult:
+    data: Optional[Dict] = {}
+    errors = []
+    for result in results:
+        errors.extend(result.errors or [])
+        if result.data is None:
+            data = None
+        elif data is not None:
+            data.update(result.data)
+    return ExecutionResult(data=data, errors=errors or None)
+
+
+async def run_in_pool(func, *args):
+    loop = asyncio.get_event_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(get_executor(), partial(context.run, func, *args))
+
+
+async def execute_graphql_request(request, query, variables, operation_name):
+    schema = graphene_settings.SCHEMA
+    try:
+        document = get_document_backend().document_from_string(schema, query)
+    except GraphQLSyntaxError as error:
+        return ExecutionResult(errors=[error], invalid=True)
+    if document.validation_errors:
+        return ExecutionResult(errors=document.validation_errors, invalid=True)
+
+    operation = get_operation(document.document_ast, operation_name)
+    if operation is None:
+        return ExecutionResult(
+            errors=[GraphQLError("Must provide a valid operation name.")],
+            invalid=True,
+        )
+    if operation.operation == "subscription":
+        return ExecutionResult(
+            errors=[GraphQLError("Subscriptions are served over WebSockets.")],
+            invalid=True,
+        )
+    if request.method == "GET" and operation.operation != "query":
+        return None
+    try:
+        await run_in_pool(
+            check_query_cost,
+            schema,
+            document.document_ast,
+            request.user,
+            variables,
+            operation_name,
+        )
+    except GraphQLError as error:
+        return ExecutionResult(errors=[error], invalid=True)
+
+    middleware = list(instantiate_middleware(graphene_settings.MIDDLEWARE))
+    if (
+        operation.operation != "query"
+        or len(operation.selection_set.selections) < 2
+        or settings.GRAPHQL_DEBUG_MIDDLEWARE
+    ):
+        return await run_in_pool(
+            execute_in_thread,
+            schema,
+            document.document_ast,
+            FieldContext(request),
+            variables,
+            operation_name,
+            middleware,
+            operation.operation == "query",
+        )
+    # Root fields share the accessible IDs, which are loaded once when first used
+    setattr(request, ACCESSIBLE_IDS_ATTRIBUTE, AccessibleIds(request.user))
+    results = await asyncio.gather(
+        *[
+            run_in_pool(
+                execute_in_thread,
+                schema,
+                field_document,
+                FieldContext(request),
+                variables,
+                None,
+                middleware,
+                True,
+            )
+            for field_document in split_root_fields(document.document_ast, operation)
+        ]
+    )
+    return merge_results(results)
+
+
+async def async_graphql_view(request):
+    """Execute a GraphQL operation of a GET or POST request, see the module."""
+
+    if request.method not in ("GET", "POST"):
+        return HttpResponseNotAllowed(["GET", "POST"])
+    try:
+        user = await sync_to_async(authenticate)(request)
+    except APIException as error:
+        return JsonResponse(
+            {"errors": [{"message": str(error.detail)}]}, status=error.status_code
+        )
+    if not user.is_authenticated:
+        return JsonResponse(
+            {"errors": [{"message": "Authentication credentials were not provided."}]},
+            status=403,
+        )
+    try:
+        query, variables, operation_name = get_graphql_params(request)
+    except GraphQLError as error:
+        return JsonResponse({"errors": [format_error(error)]}, status=400)
+    if not query:
+        return JsonResponse(
+            {"errors": [{"message": "Must provide query string."}]}, status=400
+        )
+
+    result = await execute_graphql_request(request, query, variables, operation_name)
+    if result is None:
+        return HttpResponseNotAllowed(
+            ["POST"], "Can only perform a query operation from a GET request."
+        )
+    response = {}
+    if result.errors:
+        response["errors"] = [format_error(error) for error in result.errors]
+    if not result.invalid:
+        response["data"] = result.data
+    return HttpResponse(
+        json_codec.dumps_bytes(response),
+        status=400 if result.invalid else 200,
+        content_type="application/json",
+    )
+
+
+# Token and OAuth2 requests carry no CSRF token, while DRF's SessionAuthentication
+# enforces CSRF for session users. csrf_exempt() would wrap the coroutine function in
+# a synchronous function, which Django 3.1 then runs as a synchronous view.
+async_graphql_view.csrf_exempt = True
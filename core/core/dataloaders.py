@@ -0,0 +1,84 @@
+"""Per-request DataLoaders that batch the lookups of related objects in GraphQL.
+
+Graphene resolves a foreign key of each object in a list with its own query. The
+resolvers created by resolve_related() instead collect the keys of all objects of a
+list and load the related objects with one `IN (...)` query per model and field.
+
+The loaders are kept on the context of the GraphQL operation. Over HTTP, a loader also
+caches the loaded objects for the rest of the request. WebSocket operations may live
+as long as their subscription, so their loaders only batch and never cache."""
+
+from typing import Callable, Dict, Hashable, List, Optional, Type
+
+from channels_graphql_ws.scope_as_context import ScopeAsContext
+from django.db import models
+from promise import Promise
+from promise.dataloader import DataLoader
+
+LOADERS_ATTRIBUTE = "_dataloaders"
+
+
+class ModelLoader(DataLoader):
+    """Loads the model instances whose field matches the given keys, e.g., their
+    primary key. Keys without instance resolve to None."""
+
+    def __init__(self, model: Type[models.Model], field: str = "pk", cache=True):
+        super().__init__(cache=cache)
+        self.model = model
+        self.field = field
+        # The attribute holding the key, e.g., the ID of a foreign key
+        self.attname = "pk" if field == "pk" else model._meta.get_field(field).attname
+
+    def batch_load_fn(self, keys: List[Hashable]) -> Promise:
+        instances = self.model.objects.filter(**{f"{self.field}__in": keys})
+        by_key = {getattr(instance, self.attname): instance for instance in instances}
+        return Promise.resolve([by_key.get(key) for key in keys])
+
+
+def get_context_loader(
+    info, key: Hashable, factory: Callable[[bool], DataLoader]
+) -> DataLoader:
+    """The loader with the key of the current GraphQL operation. It is created by the
+    factory, which is passed whether the loader may cache."""
+
+    loaders: Optional[Dict[Hashable, DataLoader]] = getattr(
+        info.context, LOADERS_ATTRIBUTE, None
+    )
+    if loaders is None:
+        loaders = {}
+        setattr(info.context, LOADERS_ATTRIBUTE, loaders)
+    if key not in loaders:
+        loaders[key] = factory(not isinstance(info.context, ScopeAsContext))
+    return loaders[key]
+
+
+def get_loader(info, model: Type[models.Model], field: str = "pk") -> ModelLoader:
+    """The loader of the model and field of the current GraphQL operation."""
+
+    return get_context_loader(
+        info, (model, field), lambda cache: ModelLoader(model, field, cache=cache)
+    )
+
+
+def resolve_related(name: str):
+    """Create a resolver of the foreign key, one-to-one field or reverse one-to-one
+    relation with the given name that batches its lookups with a loader. Related
+    objects that were already fetched, e.g., with select_related(), are reused."""
+
+    def resolver(instance, info, **kwargs):
+        field = instance._meta.get_field(name)
+        if field.is_cached(instance):
+            return field.get_cached_value(instance)
+        if isinstance(field, models.OneToOneRel):
+            # The related model references this instance
+            return get_loader(info, field.related_model, field.field.name).load(
+                instance.pk
+            )
+        key = getattr(instance, field.attname)
+        if key is None:
+            return None
+        target = field.target_field
+        target_name = "pk" if target.primary_key else target.name
+        return get_loader(info, field.related_model, target_name).load(key)
+
+    return resolver
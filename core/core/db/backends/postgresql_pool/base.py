@@ -0,0 +1,43 @@
+"""PostgreSQL backend that takes its connections from a ConnectionPool.
+
+Closing a connection, e.g., at the end of a request or a database_sync_to_async call,
+returns it to the pool. Set CONN_MAX_AGE to 0, the pool keeps the connections open."""
+
+import psycopg2.extras
+from django.db.backends.postgresql import base
+
+from core.db.pool import get_pool
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_pool(self, conn_params):
+        return get_pool(
+            self.alias,
+            lambda: base.Database.connect(**conn_params),
+            conn_params,
+            self.settings_dict.get("POOL", {}),
+        )
+
+    def get_new_connection(self, conn_params):
+        connection = self.get_pool(conn_params).get_connection()
+
+        # Same as the base class, as a reused connection may have another isolation
+        options = self.settings_dict["OPTIONS"]
+        try:
+            self.isolation_level = options["isolation_level"]
+        except KeyError:
+            self.isolation_level = connection.isolation_level
+        else:
+            if self.isolation_level != connection.isolation_level:
+                connection.set_session(isolation_level=self.isolation_level)
+        psycopg2.extras.register_default_jsonb(
+            conn_or_curs=connection, loads=lambda x: x
+        )
+        return connection
+
+    def _close(self):
+        if self.connection is not None:
+            with self.wrap_database_errors:
+                self.get_pool(self.get_connection_params()).put_connection(
+                    self.connection
+                )
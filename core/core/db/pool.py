@@ -0,0 +1,252 @@
+"""A thread-safe pool of database connections shared by all threads of a process.
+
+Django opens one connection per thread, e.g., per request, per database_sync_to_async
+call or per Celery task, and closes it again afterwards. The pool keeps the closed
+connections open and hands them out again, so only the first use of a connection pays
+for the connection setup. Returned connections are reset with DISCARD ALL, so no
+session state like temporary tables, advisory locks, SET parameters or prepared
+statements leaks to the next borrower. Django restores its own session settings, e.g.,
+the time zone, each time it takes a connection."""
+
+import os
+import threading
+import time
+from collections import Counter, deque
+from typing import Any, Callable, Deque, Dict, NamedTuple, Tuple
+
+from psycopg2 import OperationalError
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_UNKNOWN
+
+
+class PoolTimeout(OperationalError):
+    """Raised if no connection became available within the pool's timeout."""
+
+
+class PoolOptions(NamedTuple):
+    """The pool options, set with the POOL key of a database's settings."""
+
+    # Idle connections kept open, even if unused for longer than the max idle time
+    min_size: int = 1
+    # The maximum number of connections opened by a process
+    max_size: int = 20
+    # Seconds to wait for a connection if all are in use
+    timeout: float = 10
+    # Seconds after which connections are replaced, e.g., to release server memory
+    max_lifetime: float = 3600
+    # Seconds after which idle connections beyond the min size are closed
+    max_idle: float = 600
+    # Connections idle for longer than this are checked before being handed out
+    health_check_after: float = 30
+
+    @classmethod
+    def from_settings(cls, options: Dict) -> "PoolOptions":
+        return cls(**{key.lower(): value for key, value in options.items()})
+
+
+class _IdleConnection(NamedTuple):
+    connection: Any
+    created_at: float
+    returned_at: float
+
+
+class ConnectionPool:
+    """Hands out connections created by the connect function. Connections are
+    returned with put_connection() and reused in LIFO order, so rarely needed
+    connections become idle and are closed eventually."""
+
+    def __init__(self, connect: Callable[[], Any], options: PoolOptions):
+        self.connect = connect
+        self.options = options
+        self.stats: Counter = Counter()
+        self._idle: Deque[_IdleConnection] = deque()
+        self._created_at: Dict[int, float] = {}
+        self._size = 0
+        self._condition = threading.Condition()
+
+    def get_connection(self):
+        """Return an idle connection or open a new one. Waits for a returned connection
+        if the pool is exhausted and raises PoolTimeout after the timeout."""
+
+        start = time.monotonic()
+        deadline = start + self.options.timeout
+        while True:
+            idle = None
+            with self._condition:
+                self._close_idle_connections()
+                if self._idle:
+                    idle = self._idle.pop()
+                elif self._size < self.options.max_size:
+                    self._size += 1
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or not self._condition.wait(remaining):
+                        self.stats["timeouts"] += 1
+                        raise PoolTimeout(
+                            f"No connection available within {self.options.timeout} s"
+                            f" ({self.options.max_size} in use)"
+                        )
+                    continue
+
+            if idle:
+                if self._is_healthy(idle):
+                    self._checked_out(start, reused=True)
+                    return idle.connection
+                self._discard(idle.connection)
+                continue
+            try:
+                connection = self.connect()
+            except Exception:
+                with self._condition:
+                    self._size -= 1
+                    self._condition.notify()
+                raise
+            self._created_at[id(connection)] = time.monotonic()
+            self.stats["connections_created"] += 1
+            self._checked_out(start, reused=False)
+            return connection
+
+    def put_connection(self, connection):
+        """Return a connection to the pool, rolling back open transactions and
+        resetting the session. Broken and expired connections and those that cannot
+        be reset are closed instead."""
+
+        try:
+            status = connection.get_transaction_status()
+            if not connection.closed and status != TRANSACTION_STATUS_IDLE:
+                if status == TRANSACTION_STATUS_UNKNOWN:
+                    raise OperationalError("Connection lost")
+                connection.rollback()
+            if not connection.closed:
+                self._reset_session(connection)
+        except Exception:  # pylint: disable=broad-except
+            self.stats["broken_connections"] += 1
+            self._discard(connection)
+            return
+        created_at = self._created_at.get(id(connection), 0)
+        if connection.closed or self._is_expired(created_at):
+            self._discard(connection)
+            return
+        with self._condition:
+            self._idle.append(_IdleConnection(connection, created_at, time.monotonic()))
+            self._condition.notify()
+
+    def close(self):
+        """Close all idle connections, e.g., before the process exits."""
+
+        with self._condition:
+            idle, self._idle = self._idle, deque()
+        for connection in idle:
+            self._discard(connection.connection)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """The counters of the pool and its current size."""
+
+        with self._condition:
+            idle = len(self._idle)
+            size = self._size
+        return {
+            **self.stats,
+            "size": size,
+            "idle": idle,
+            "in_use": size - idle,
+            "max_size": self.options.max_size,
+        }
+
+    def _checked_out(self, start: float, reused: bool):
+        self.stats["checkouts"] += 1
+        if reused:
+            self.stats["reuses"] += 1
+        self.stats["wait_ms"] += round((time.monotonic() - start) * 1000)
+
+    @staticmethod
+    def _reset_session(connection):
+        """Drop the session state of the connection, which must be idle. DISCARD ALL
+        cannot run in a transaction, so it is run in autocommit mode."""
+
+        autocommit = connection.autocommit
+        connection.autocommit = True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("DISCARD ALL")
+        finally:
+            connection.autocommit = autocommit
+
+    def _is_expired(self, created_at: float) -> bool:
+        return time.monotonic() - created_at > self.options.max_lifetime
+
+    def _is_healthy(self, idle: _IdleConnection) -> bool:
+        """Check that the connection is open, not expired and, if it was idle for a
+        while, still responds."""
+
+        if idle.connection.closed or self._is_expired(idle.created_at):
+            return False
+        if time.monotonic() - idle.returned_at < self.options.health_check_after:
+            return True
+        try:
+            with idle.connection.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            idle.connection.rollback()
+        except Exception:  # pylint: disable=broad-except
+            self.stats["failed_health_checks"] += 1
+            return False
+        return True
+
+    def _close_idle_connections(self):
+        """Close the connections idle for too long, oldest first. Must hold the lock."""
+
+        now = time.monotonic()
+        while (
+            len(self._idle) > self.options.min_size
+            and now - self._idle[0].returned_at > self.options.max_idle
+        ):
+            connection = self._idle.popleft().connection
+            self._size -= 1
+            self._close(connection)
+
+    def _discard(self, connection):
+        with self._condition:
+            self._size -= 1
+            self._condition.notify()
+        self._close(connection)
+
+    def _close(self, connection):
+        self._created_at.pop(id(connection), None)
+        self.stats["connections_closed"] += 1
+        try:
+            connection.close()
+        except Exception:  # pylint: disable=broad-except
+            pass
+
+
+_pools: Dict[Tuple, ConnectionPool] = {}
+_pools_pid = os.getpid()
+_pools_lock = threading.Lock()
+
+
+def get_pool(
+    alias: str, connect: Callable[[], Any], conn_params: Dict, options: Dict
+) -> ConnectionPool:
+    """Return the process' pool of the database alias and connection parameters. A
+    forked process, e.g., a Celery worker, starts with new pools, as sharing the
+    parent's connections would corrupt them."""
+
+    global _pools_pid  # pylint: disable=global-statement
+    key = (alias, tuple(sorted((k, str(v)) for k, v in conn_params.items())))
+    with _pools_lock:
+        if _pools_pid != os.getpid():
+            _pools.clear()
+            _pools_pid = os.getpid()
+        if key not in _pools:
+            _pools[key] = ConnectionPool(connect, PoolOptions.from_settings(options))
+        return _pools[key]
+
+
+def get_pool_stats() -> Dict[str, Dict[str, Any]]:
+    """The stats of all pools of the process by database alias and name."""
+
+    with _pools_lock:
+        pools = list(_pools.items())
+    return {
+        f"{alias}/{dict(conn_params).get('database', '')}": pool.get_stats()
+        for (alias, conn_params), pool in pools
+    }
@@ -0,0 +1,127 @@
+"""Route read-only workloads to read replicas of the primary database.
+
+Reads only go to a replica within a replica_reads() block, e.g., for read-only GraphQL
+operations, analytics and admin lists. Everything else, including all writes, uses
+the primary. After a user wrote to the primary, their reads stay on the primary for
+DATABASE_REPLICA_STICKY_SECONDS, so they always read their own writes despite the
+replication lag. Within the request that wrote, all following reads use the primary."""
+
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+PRIMARY_DATABASE = DEFAULT_DB_ALIAS
+
+_replica_reads: ContextVar[bool] = ContextVar("replica_reads", default=False)
+# Mutable per request state, so writes in copied contexts (threads) are noticed too
+_request_writes: ContextVar[Optional[dict]] = ContextVar("request_writes", default=None)
+
+
+def _sticky_cache_key(user) -> str:
+    return f"db-replica-sticky-{user.pk}"
+
+
+def is_sticky(user) -> bool:
+    """Whether the user's reads have to use the primary."""
+
+    return bool(cache.get(_sticky_cache_key(user)))
+
+
+def stick_to_primary(user):
+    """Send the user's reads to the primary until the replicas caught up."""
+
+    cache.set(_sticky_cache_key(user), True, settings.DATABASE_REPLICA_STICKY_SECONDS)
+
+
+def can_read_replica(user=None) -> bool:
+    """Whether replicas are configured and neither the user recently wrote nor the
+    current request, e.g., a mutation earlier in a batch."""
+
+    if not settings.DATABASE_REPLICAS:
+        return False
+    if (writes := _request_writes.get()) is not None and writes["count"]:
+        return False
+    return not (user and user.is_authenticated and is_sticky(user))
+
+
+def get_read_database(user=None) -> str:
+    """The database alias for explicit reads of the user, e.g., with raw SQL."""
+
+    if can_read_replica(user):
+        return random.choice(settings.DATABASE_REPLICAS)
+    return PRIMARY_DATABASE
+
+
+@contextmanager
+def replica_reads(user=None):
+    """Route the reads within the block to a replica, unless no replicas are
+    configured or the user recently wrote to the primary."""
+
+    if not can_read_replica(user):
+        yield
+        return
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+class ReplicaRouter:
+    """Route reads within replica_reads() blocks to a random replica."""
+
+    def db_for_read(self, model, **hints):
+        if _replica_reads.get() and settings.DATABASE_REPLICAS:
+            return random.choice(settings.DATABASE_REPLICAS)
+        return PRIMARY_DATABASE
+
+    def db_for_write(self, model, **hints):
+        if (writes := _request_writes.get()) is not None:
+            writes["count"] += 1
+        return PRIMARY_DATABASE
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replicas mirror the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY_DATABASE
+
+
+class ReplicaStickinessMiddleware:
+    """Keep the reads of users on the primary for a while after their request wrote
+    to the database."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        writes = {"count": 0}
+        token = _request_writes.set(writes)
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_writes.reset(token)
+        user = getattr(request, "user", None)
+        if writes["count"] and user and user.is_authenticated:
+            stick_to_primary(user)
+        return response
+
+
+class ReplicaReadAdminMixin:
+    """Render the admin change lists of a model admin from a replica."""
+
+    def changelist_view(self, request, extra_context=None):
+        if request.method != "GET":
+            return super().changelist_view(request, extra_context)
+        with replica_reads(request.user):
+            response = super().changelist_view(request, extra_context)
+            # The queries of template responses run when rendering them
+            if hasattr(response, "render"):
+                response.render()
+        return response
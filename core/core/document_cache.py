@@ -0,0 +1,129 @@
+"""A cache of parsed and validated GraphQL documents and Automatic Persisted Queries.
+
+Clients like the planner UI and Node-RED flows send the same few operations over and
+over again. The documents are parsed and validated once per process and kept in an
+LRU cache keyed by the SHA-256 hash of the query, the same hash clients use for
+Automatic Persisted Queries (APQ). With APQ, a client only sends the hash and sends
+the full query once if the server does not know it yet:
+https://www.apollographql.com/docs/apollo-server/performance/apq/
+
+The query strings of persisted queries are kept in Django's cache, which all server
+processes share if it is a shared cache like Redis."""
+
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import partial
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from graphql import GraphQLError, parse, validate
+from graphql.backend.base import GraphQLBackend, GraphQLDocument
+from graphql.execution import ExecutionResult, execute
+
+PERSISTED_QUERY_NOT_FOUND = "PersistedQueryNotFound"
+
+
+def get_query_hash(query: str) -> str:
+    """The hex SHA-256 hash of the query as used by APQ."""
+
+    return hashlib.sha256(query.encode("utf-8")).hexdigest()
+
+
+def _persisted_query_key(query_hash: str) -> str:
+    return f"graphql-persisted-query-{query_hash}"
+
+
+def get_persisted_query(query_hash: str) -> Optional[str]:
+    """The query string of a persisted query, or None if unknown."""
+
+    return cache.get(_persisted_query_key(query_hash))
+
+
+def persist_query(query_hash: str, query: str):
+    """Store the query for requests only sending its hash. Raises a GraphQLError if
+    the hash does not match the query."""
+
+    if get_query_hash(query) != query_hash:
+        raise GraphQLError("The provided SHA-256 hash does not match the query")
+    cache.set(
+        _persisted_query_key(query_hash),
+        query,
+        settings.GRAPHQL_PERSISTED_QUERY_TIMEOUT,
+    )
+
+
+def persisted_query_not_found() -> ExecutionResult:
+    """The error telling the client to send the full query along with its hash."""
+
+    return ExecutionResult(
+        errors=[
+            GraphQLError(
+                PERSISTED_QUERY_NOT_FOUND,
+                extensions={"code": "PERSISTED_QUERY_NOT_FOUND"},
+            )
+        ]
+    )
+
+
+def execute_validated(schema, document_ast, validation_errors, *args, **kwargs):
+    """Execute a document that was validated before, or report its errors."""
+
+    if validation_errors:
+        return ExecutionResult(errors=validation_errors, invalid=True)
+    return execute(schema, document_ast, *args, **kwargs)
+
+
+class CachedDocumentBackend(GraphQLBackend):
+    """A backend that parses and validates each document once and keeps the most
+    recently used ones. Syntax errors are raised and never cached."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._documents: "OrderedDict[tuple, GraphQLDocument]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def document_from_string(self, schema, document_string: str) -> GraphQLDocument:
+        key = (id(schema), get_query_hash(document_string))
+        with self._lock:
+            document = self._documents.get(key)
+            if document is not None:
+                self._documents.move_to_end(key)
+                return document
+
+        document_ast = parse(document_string)
+        validation_errors = validate(schema, document_ast)
+        document = GraphQLDocument(
+            schema=schema,
+            document_string=document_string,
+            document_ast=document_ast,
+            execute=partial(execute_validated, schema, document_ast, validation_errors),
+        )
+        document.validation_errors = validation_errors
+        with self._lock:
+            self._documents[key] = document
+            while len(self._documents) > self.max_size:
+                self._documents.popitem(last=False)
+        return document
+
+    def clear(self):
+        with self._lock:
+            self._documents.clear()
+
+
+_backend: Optional[CachedDocumentBackend] = None
+_backend_lock = threading.Lock()
+
+
+def get_document_backend() -> CachedDocumentBackend:
+    """The process' backend with the cache size of the settings."""
+
+    global _backend  # pylint: disable=global-statement
+    with _backend_lock:
+        if (
+            _backend is None
+            or _backend.max_size != settings.GRAPHQL_DOCUMENT_CACHE_SIZE
+        ):
+            _backend = CachedDocumentBackend(settings.GRAPHQL_DOCUMENT_CACHE_SIZE)
+        return _backend
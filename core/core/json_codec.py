@@ -0,0 +1,103 @@
+"""The JSON codec of the API and WebSocket paths.
+
+Every controller frame, GraphQL subscription message and GraphQL response is encoded
+and decoded as JSON. orjson does so several times faster than the standard library
+and serializes UUIDs, dates and datetimes natively, so messages need no conversion
+pass. The codec is selected by the JSON_CODEC setting: `auto` uses orjson if it is
+installed and falls back to the standard library, `orjson` requires it and `json`
+always uses the standard library, whose encoder handles the same types as Django's.
+Both raise a ValueError for invalid JSON."""
+
+import json
+from functools import lru_cache
+from typing import Any, Union
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework import parsers
+from rest_framework.exceptions import ParseError
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class StdlibCodec:
+    """The codec of the standard library with Django's encoder."""
+
+    name = "json"
+
+    def dumps(self, obj: Any) -> str:
+        return json.dumps(obj, cls=DjangoJSONEncoder, separators=(",", ":"))
+
+    def dumps_bytes(self, obj: Any) -> bytes:
+        return self.dumps(obj).encode("utf-8")
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        return json.loads(data)
+
+
+class OrjsonCodec:
+    """The orjson codec. UTC times end in Z like with Django's encoder, which also
+    encodes the types orjson does not support, e.g., decimals."""
+
+    name = "orjson"
+
+    def __init__(self):
+        self.encoder = DjangoJSONEncoder()
+
+    def dumps(self, obj: Any) -> str:
+        return self.dumps_bytes(obj).decode("utf-8")
+
+    def dumps_bytes(self, obj: Any) -> bytes:
+        return orjson.dumps(
+            obj,
+            default=self.encoder.default,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z,
+        )
+
+    def loads(self, data: Union[str, bytes]) -> Any:
+        return orjson.loads(data)
+
+
+@lru_cache(maxsize=None)
+def _get_codec(name: str):
+    if name == "json" or (name == "auto" and orjson is None):
+        return StdlibCodec()
+    if name in ("auto", "orjson"):
+        if orjson is None:
+            raise ImproperlyConfigured("JSON_CODEC is orjson, which is not installed")
+        return OrjsonCodec()
+    raise ImproperlyConfigured(f"Unknown JSON_CODEC {name}")
+
+
+def get_codec():
+    """The codec selected by the JSON_CODEC setting."""
+
+    return _get_codec(settings.JSON_CODEC)
+
+
+def dumps(obj: Any) -> str:
+    return get_codec().dumps(obj)
+
+
+def dumps_bytes(obj: Any) -> bytes:
+    return get_codec().dumps_bytes(obj)
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    """Decode the JSON data. Raises a ValueError if it is invalid."""
+
+    return get_codec().loads(data)
+
+
+class JSONParser(parsers.JSONParser):
+    """DRF's JSON parser decoding with the codec."""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return loads(stream.read())
+        except ValueError as error:
+            raise ParseError(f"JSON parse error - {error}")
@@ -0,0 +1,171 @@
+"""Keyset pagination of connections over time ordered tables.
+
+Relay connections of graphene-django count all matching rows and slice pages by
+offset, so every page costs a COUNT(*) and deeper pages scan all rows before them.
+For the data point hypertable and the controller messages, KeysetConnectionField
+encodes the time key of the last row of a page in the cursor instead and fetches the
+next page with `WHERE time < cursor ORDER BY time DESC LIMIT n + 1`, which only
+touches the rows of the page. No total count is computed, hasNextPage is given by the
+extra row and hasPreviousPage by the presence of the cursor."""
+
+import json
+from datetime import datetime
+from functools import partial
+from typing import Any, List, NamedTuple, Optional, Sequence
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q, QuerySet
+from graphene.relay import PageInfo
+from graphene_django.utils import maybe_queryset
+from graphql import GraphQLError
+from graphql_relay.utils import base64, unbase64
+
+from core.query_optimizer import OptimizedConnectionField
+
+CURSOR_PREFIX = "keyset:"
+
+
+class KeysetPage(NamedTuple):
+    """The nodes of a page and their cursors."""
+
+    nodes: List[Any]
+    cursors: List[str]
+    has_previous_page: bool
+    has_next_page: bool
+
+
+def get_key_field(model, name: str):
+    return model._meta.pk if name == "pk" else model._meta.get_field(name)
+
+
+def encode_cursor(node, key: Sequence[str]) -> str:
+    values = [getattr(node, name) for name in key]
+    values = [i.isoformat() if isinstance(i, datetime) else i for i in values]
+    return base64(CURSOR_PREFIX + json.dumps(values))
+
+
+def decode_cursor(model, key: Sequence[str], cursor: Optional[str]) -> Optional[List]:
+    """The key values of the cursor. Raises a GraphQLError for invalid cursors."""
+
+    if not cursor:
+        return None
+    try:
+        cursor = unbase64(cursor)
+        if not cursor.startswith(CURSOR_PREFIX):
+            raise ValueError(cursor)
+        values = json.loads(cursor[len(CURSOR_PREFIX) :])
+        if len(values) != len(key):
+            raise ValueError(cursor)
+        return [
+            get_key_field(model, name).to_python(value)
+            for name, value in zip(key, values)
+        ]
+    except (ValueError, TypeError, ValidationError):
+        raise GraphQLError(f"Invalid cursor: {cursor}")
+
+
+def keyset_filter(key: Sequence[str], values: Sequence, lookup: str) -> Q:
+    """The rows after the key values in the direction of the lookup, lt or gt."""
+
+    condition = Q()
+    for index, name in enumerate(key):
+        equal = {key[i]: values[i] for i in range(index)}
+        condition |= Q(**equal, **{f"{name}__{lookup}": values[index]})
+    return condition
+
+
+def is_descending(queryset: QuerySet, name: str) -> bool:
+    """Whether the queryset is ordered descending by the key, the default."""
+
+    ordering = queryset.query.order_by or queryset.model._meta.ordering
+    return not ordering or ordering[0] != name
+
+
+def paginate(
+    queryset: QuerySet, key: Sequence[str], args, max_limit: Optional[int]
+) -> KeysetPage:
+    """Fetch the page of the connection arguments first, after, last and before."""
+
+    descending = is_descending(queryset, key[0])
+    forward_lookup, backward_lookup = ("lt", "gt") if descending else ("gt", "lt")
+    after = decode_cursor(queryset.model, key, args.get("after"))
+    before = decode_cursor(queryset.model, key, args.get("before"))
+    if after is not None:
+        queryset = queryset.filter(keyset_filter(key, after, forward_lookup))
+    if before is not None:
+        queryset = queryset.filter(keyset_filter(key, before, backward_lookup))
+
+    first, last = args.get("first"), args.get("last")
+    prefix, reverse_prefix = ("-", "") if descending else ("", "-")
+    if last and not first:
+        # Fetch the last rows in reverse order
+        ordering = [reverse_prefix + name for name in key]
+        rows = list(queryset.order_by(*ordering)[: last + 1])
+        nodes = rows[:last][::-1]
+        has_previous_page, has_next_page = len(rows) > last, before is not None
+    else:
+        first = first or max_limit
+        queryset = queryset.order_by(*[prefix + name for name in key])
+        rows = list(queryset[: first + 1] if first else queryset)
+        nodes = rows[:first] if first else rows
+        has_previous_page = after is not None
+        has_next_page = bool(first) and len(rows) > first
+        if last and len(nodes) > last:
+            nodes, has_previous_page = nodes[-last:], True
+    return KeysetPage(
+        nodes=nodes,
+        cursors=[encode_cursor(node, key) for node in nodes],
+        has_previous_page=has_previous_page,
+        has_next_page=has_next_page,
+    )
+
+
+class KeysetConnectionField(OptimizedConnectionField):
+    """A filter connection paginated by the key, the time by default, instead of
+    offsets. The key must be unique, e.g., end with the primary key. It never reuses
+    prefetched objects, as a parent could only prefetch all of them."""
+
+    reuses_prefetched = False
+
+    def __init__(self, *args, key: Sequence[str] = ("time",), **kwargs):
+        self.key = tuple(key)
+        super().__init__(*args, **kwargs)
+
+    def get_queryset_resolver(self):
+        queryset_resolver = partial(
+            self.resolve_queryset,
+            filterset_class=self.filterset_class,
+            filtering_args=self.filtering_args,
+            required=[name for name in self.key if name != "pk"],
+        )
+        return partial(self.resolve_page, queryset_resolver, self.key, self.max_limit)
+
+    @classmethod
+    def resolve_page(
+        cls, queryset_resolver, key, max_limit, connection, iterable, info, args
+    ):
+        queryset = maybe_queryset(queryset_resolver(connection, iterable, info, args))
+        if not isinstance(queryset, QuerySet):
+            return queryset
+        return paginate(queryset, key, args, max_limit)
+
+    @classmethod
+    def resolve_connection(cls, connection, args, iterable, max_limit=None):
+        if not isinstance(iterable, KeysetPage):
+            return super().resolve_connection(connection, args, iterable, max_limit)
+        edges = [
+            connection.Edge(node=node, cursor=cursor)
+            for node, cursor in zip(iterable.nodes, iterable.cursors)
+        ]
+        resolved = connection(
+            edges=edges,
+            page_info=PageInfo(
+                start_cursor=iterable.cursors[0] if edges else None,
+                end_cursor=iterable.cursors[-1] if edges else None,
+                has_previous_page=iterable.has_previous_page,
+                has_next_page=iterable.has_next_page,
+            ),
+        )
+        resolved.iterable = iterable.nodes
+        resolved.length = len(edges)
+        return resolved
@@ -0,0 +1,290 @@
+"""Static cost analysis of GraphQL operations and the per-user budgets they must fit.
+
+A single nested operation like
+`allSites { edges { node { siteentitySet { ... dataPointSet } } } }` may page through
+whole hypertables, as every connection multiplies the rows of the connections nested
+in it. Before an operation is executed, its cost is estimated from the document:
+- the depth, counting nested fields without the edges and node of connections,
+- the largest connection size, given by first or last, and
+- the estimated rows, the number of objects all nested connections, lists and object
+  fields may return. Connections without first or last count their maximum size.
+
+Operations exceeding the budget of the user are rejected. The estimated rows are also
+charged per user and minute in Django's cache, and operations exceeding the rows per
+minute are throttled until the next minute."""
+
+import threading
+import time
+import weakref
+from typing import Dict, Iterator, NamedTuple, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from graphene_django.settings import graphene_settings
+from graphql import GraphQLError
+from graphql.language import ast
+from graphql.type.definition import GraphQLList, GraphQLNonNull, get_named_type
+
+QUERY_TOO_COMPLEX = "QUERY_TOO_COMPLEX"
+QUERY_THROTTLED = "QUERY_THROTTLED"
+
+
+class QueryBudget(NamedTuple):
+    """The limits of a user's operations."""
+
+    max_depth: int
+    max_rows: int
+    max_connection_size: int
+    rows_per_minute: int
+
+
+class QueryCost(NamedTuple):
+    """The estimated cost of an operation."""
+
+    depth: int
+    rows: int
+    connection_size: int
+
+
+def get_query_budget(user) -> QueryBudget:
+    """The budget of the user, the staff budget for staff users."""
+
+    budgets = settings.GRAPHQL_QUERY_BUDGETS
+    if getattr(user, "is_staff", False) and "staff" in budgets:
+        return QueryBudget(**budgets["staff"])
+    return QueryBudget(**budgets["default"])
+
+
+def is_connection(graphql_type) -> bool:
+    fields = getattr(graphql_type, "fields", None) or {}
+    return "edges" in fields and "pageInfo" in fields
+
+
+def is_list(graphql_type) -> bool:
+    if isinstance(graphql_type, GraphQLNonNull):
+        graphql_type = graphql_type.of_type
+    return isinstance(graphql_type, GraphQLList)
+
+
+class CostAnalysis:
+    """Estimates the cost of an operation of a document by walking its selections."""
+
+    def __init__(self, schema, document_ast, variables: Optional[Dict] = None):
+        self.schema = schema
+        self.variables = variables or {}
+        self.fragments = {
+            definition.name.value: definition
+            for definition in document_ast.definitions
+            if isinstance(definition, ast.FragmentDefinition)
+        }
+        self.operations = [
+            definition
+            for definition in document_ast.definitions
+            if isinstance(definition, ast.OperationDefinition)
+        ]
+        self.default_size = graphene_settings.RELAY_CONNECTION_MAX_LIMIT
+        self.depth = 0
+        self.rows = 0
+        self.connection_size = 0
+
+    def get_operation(self, operation_name: Optional[str]):
+        if operation_name:
+            for operation in self.operations:
+                if operation.name and operation.name.value == operation_name:
+                    return operation
+            return None
+        return self.operations[0] if len(self.operations) == 1 else None
+
+    def analyze(self, operation_name: Optional[str] = None) -> Optional[QueryCost]:
+        """The cost of the operation, or None if the document does not tell which
+        operation to execute."""
+
+        operation = self.get_operation(operation_name)
+        if operation is None:
+            return None
+        root_type = {
+            "query": self.schema.get_query_type,
+            "mutation": self.schema.get_mutation_type,
+            "subscription": self.schema.get_subscription_type,
+        }[operation.operation]()
+        if root_type is not None:
+            self.visit(operation.selection_set, root_type, 1, 1)
+        return QueryCost(self.depth, self.rows, self.connection_size)
+
+    def get_fields(
+        self, selection_set, parent_type, fragments: Tuple[str, ...] = ()
+    ) -> Iterator[Tuple[ast.Field, object]]:
+        """The fields of a selection set and their definitions, including the ones of
+        its fragments. Unknown fields are left to the validation."""
+
+        for selection in selection_set.selections if selection_set else []:
+            if isinstance(selection, ast.Field):
+                fields = getattr(parent_type, "fields", None) or {}
+                field_def = fields.get(selection.name.value)
+                if field_def is not None:
+                    yield selection, field_def
+            elif isinstance(selection, ast.InlineFragment):
+                fragment_type = parent_type
+                if selection.type_condition:
+                    fragment_type = self.schema.get_type(
+                        selection.type_condition.name.value
+                    )
+                yield from self.get_fields(
+                    selection.selection_set, fragment_type, fragments
+                )
+            elif isinstance(selection, ast.FragmentSpread):
+                name = selection.name.value
+                fragment = self.fragments.get(name)
+                if fragment is None or name in fragments:
+                    continue
+                yield from self.get_fields(
+                    fragment.selection_set,
+                    self.schema.get_type(fragment.type_condition.name.value),
+                    fragments + (name,),
+                )
+
+    def get_argument(self, field: ast.Field, name: str) -> Optional[int]:
+        for argument in field.arguments or []:
+            if argument.name.value != name:
+                continue
+            if isinstance(argument.value, ast.Variable):
+                value = self.variables.get(argument.value.name.value)
+            elif isinstance(argument.value, ast.IntValue):
+                value = argument.value.value
+            else:
+                return None
+            try:
+                return int(value)
+            except (TypeError, ValueError):
+                return None
+        return None
+
+    def get_connection_size(self, field: ast.Field) -> int:
+        sizes = [
+            size
+            for size in (
+                self.get_argument(field, "first"),
+                self.get_argument(field, "last"),
+            )
+            if size is not None
+        ]
+        size = min(sizes) if sizes else self.default_size
+        self.connection_size = max(self.connection_size, size)
+        return size
+
+    def visit(self, selection_set, parent_type, multiplier: int, depth: int):
+        for field, field_def in self.get_fields(selection_set, parent_type):
+            self.depth = max(self.depth, depth)
+            if not field.selection_set:
+                continue
+            field_type = get_named_type(field_def.type)
+            if is_connection(field_type):
+                size = multiplier * self.get_connection_size(field)
+                self.rows += size
+                self.visit_connection(field.selection_set, field_type, size, depth + 1)
+            elif is_list(field_def.type):
+                size = multiplier * self.default_size
+                self.rows += size
+                self.visit(field.selection_set, field_type, size, depth + 1)
+            else:
+                self.rows += multiplier
+                self.visit(field.selection_set, field_type, multiplier, depth + 1)
+
+    def visit_connection(self, selection_set, connection_type, size: int, depth: int):
+        """Visit the nodes of a connection, whose edges and node add no rows."""
+
+        for edges, edges_def in self.get_fields(selection_set, connection_type):
+            if edges.name.value != "edges":
+                continue
+            edge_type = get_named_type(edges_def.type)
+            for node, node_def in self.get_fields(edges.selection_set, edge_type):
+                if node.name.value == "node":
+                    self.visit(
+                        node.selection_set, get_named_type(node_def.type), size, depth
+                    )
+
+
+def charge_rows(user, rows: int) -> int:
+    """Add the rows to the user's rows of the current minute and return the sum."""
+
+    key = f"graphql-query-rows-{user.pk}-{int(time.time() // 60)}"
+    cache.add(key, 0, 60)
+    try:
+        return cache.incr(key, rows)
+    except ValueError:
+        # The key expired in between
+        cache.set(key, rows, 60)
+        return rows
+
+
+def check_query_cost(
+    schema,
+    document_ast,
+    user,
+    variables: Optional[Dict] = None,
+    operation_name: Optional[str] = None,
+) -> Optional[QueryCost]:
+    """Estimate the cost of the operation and charge it to the user. Raises a
+    GraphQLError if it exceeds the user's budget."""
+
+    cost = CostAnalysis(schema, document_ast, variables).analyze(operation_name)
+    if cost is None:
+        return None
+    budget = get_query_budget(user)
+    exceeded = [
+        f"{name} {value} exceeds the limit of {limit}"
+        for name, value, limit in (
+            ("Depth", cost.depth, budget.max_depth),
+            ("Connection size", cost.connection_size, budget.max_connection_size),
+            ("Estimated rows", cost.rows, budget.max_rows),
+        )
+        if value > limit
+    ]
+    if exceeded:
+        raise GraphQLError(
+            "Query is too complex: " + ", ".join(exceeded),
+            extensions={"code": QUERY_TOO_COMPLEX, "cost": cost._asdict()},
+        )
+    if charge_rows(user, cost.rows) > budget.rows_per_minute:
+        raise GraphQLError(
+            "Too many estimated rows queried, retry in the next minute",
+            extensions={"code": QUERY_THROTTLED, "cost": cost._asdict()},
+        )
+    return cost
+
+
+class QueryCostMiddleware:
+    """GraphQL middleware checking the cost of each operation before its first root
+    field is resolved, for executions that do not expose the document beforehand, e.g.,
+    those of the WebSocket consumer. Every root field of a rejected operation fails
+    with the same error. Each execution needs its own context object supporting weak
+    references, e.g., a request or the scope wrapper of channels_graphql_ws."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # The operation and the error, if any, of each running execution's context
+        self._checked = weakref.WeakKeyDictionary()
+
+    def check(self, info) -> Optional[GraphQLError]:
+        with self._lock:
+            checked = self._checked.get(info.context)
+        if checked and checked[0] is info.operation:
+            return checked[1]
+        document = ast.Document(definitions=[info.operation, *info.fragments.values()])
+        try:
+            check_query_cost(
+                info.schema, document, info.context.user, info.variable_values
+            )
+            error = None
+        except GraphQLError as err:
+            error = err
+        with self._lock:
+            self._checked[info.context] = (info.operation, error)
+        return error
+
+    def resolve(self, next_middleware, root, info, **kwargs):
+        if len(info.path) == 1:
+            error = self.check(info)
+            if error:
+                raise error
+        return next_middleware(root, info, **kwargs)
@@ -0,0 +1,201 @@
+"""Eager loading of the related objects selected by a GraphQL query.
+
+The get_queryset() methods of the nodes only add owner filters, so every nested field
+would otherwise cost queries per object. OptimizedConnectionField inspects the fields
+selected on the nodes of its connection and applies to the queryset
+- select_related() for selected foreign keys and one-to-one fields,
+- prefetch_related() for selected reverse and many-to-many relations without filters,
+  if their field reuses prefetched objects, and
+- only() for the columns of the selected fields, if all of them are columns.
+
+Reverse one-to-one relations are left to the DataLoaders of core.dataloaders."""
+
+from typing import List, Optional, Set, Tuple
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch, QuerySet
+from graphene import Dynamic
+from graphene.utils.str_converters import to_snake_case
+from graphene_django import DjangoObjectType
+from graphene_django.fields import DjangoListField
+from graphene_django.filter import DjangoFilterConnectionField
+from graphene_django.registry import get_global_registry
+from graphene_django.utils import maybe_queryset
+from graphql.language.ast import Field, FragmentSpread, InlineFragment
+
+# Arguments of connections that only slice the prefetched objects
+PAGINATION_ARGUMENTS = {"first", "last", "before", "after", "offset"}
+# Selected fields that need no column besides the primary key
+KEY_FIELDS = {"id", "__typename"}
+
+
+def get_selected_fields(selection_set, info) -> List[Field]:
+    """The fields of a selection set, including the ones of its fragments."""
+
+    fields = []
+    for selection in selection_set.selections if selection_set else []:
+        if isinstance(selection, Field):
+            fields.append(selection)
+        elif isinstance(selection, FragmentSpread):
+            fragment = info.fragments[selection.name.value]
+            fields.extend(get_selected_fields(fragment.selection_set, info))
+        elif isinstance(selection, InlineFragment):
+            fields.extend(get_selected_fields(selection.selection_set, info))
+    return fields
+
+
+def get_node_fields(field_asts: List[Field], info) -> List[Field]:
+    """The fields selected on the nodes of connections, i.e., in edges { node { } }."""
+
+    fields = []
+    for field_ast in field_asts:
+        for edges in get_selected_fields(field_ast.selection_set, info):
+            if edges.name.value != "edges":
+                continue
+            for node in get_selected_fields(edges.selection_set, info):
+                if node.name.value == "node":
+                    fields.extend(get_selected_fields(node.selection_set, info))
+    return fields
+
+
+def is_prefetched(queryset) -> bool:
+    """Whether the queryset holds objects of a prefetch_related() lookup."""
+
+    # pylint: disable=protected-access
+    return isinstance(queryset, QuerySet) and queryset._result_cache is not None
+
+
+def get_prefetch_fields(
+    related_type, graphene_field, field_ast, info
+) -> Optional[List[Field]]:
+    """The fields selected on the objects of a relation if its field reuses
+    prefetched objects, else None."""
+
+    if isinstance(graphene_field, Dynamic):
+        graphene_field = graphene_field.get_type()
+    if any(arg.name.value not in PAGINATION_ARGUMENTS for arg in field_ast.arguments):
+        # Filtered relations query the database anyway
+        return None
+    if (
+        isinstance(graphene_field, OptimizedConnectionField)
+        and graphene_field.reuses_prefetched
+    ):
+        return get_node_fields([field_ast], info)
+    # List fields refilter the objects with the node's get_queryset()
+    if (
+        isinstance(graphene_field, DjangoListField)
+        and related_type.get_queryset.__func__ is DjangoObjectType.get_queryset.__func__
+    ):
+        return get_selected_fields(field_ast.selection_set, info)
+    return None
+
+
+def collect_lookups(
+    node_type, fields: List[Field], info, prefix: str = ""
+) -> Tuple[List[str], List[Prefetch], Optional[Set[str]]]:
+    """The select_related() and prefetch_related() lookups and only() fields of the
+    fields selected on a node. The only() fields are None if a selected field may
+    need other columns, e.g., a property."""
+
+    model = node_type._meta.model
+    registry = get_global_registry()
+    select_related: List[str] = []
+    prefetches: List[Prefetch] = []
+    only: Optional[Set[str]] = {prefix + model._meta.pk.name}
+
+    for field_ast in fields:
+        name = to_snake_case(field_ast.name.value)
+        if name in KEY_FIELDS:
+            continue
+        try:
+            field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            only = None
+            continue
+        if not field.is_relation:
+            if only is not None:
+                only.add(prefix + name)
+            continue
+        related_type = registry.get_type_for_model(field.related_model)
+        if related_type is None:
+            continue
+
+        if field.many_to_one or (field.one_to_one and field.concrete):
+            if only is not None:
+                only.add(prefix + name)
+            related_fields = get_selected_fields(field_ast.selection_set, info)
+            if all(i.name.value in KEY_FIELDS for i in related_fields):
+                # The foreign key holds all selected columns
+                continue
+            select_related.append(prefix + name)
+            lookups = collect_lookups(
+                related_type, related_fields, info, f"{prefix}{name}__"
+            )
+            select_related.extend(lookups[0])
+            prefetches.extend(lookups[1])
+            only = None if only is None or lookups[2] is None else only | lookups[2]
+        elif field.one_to_many or field.many_to_many:
+            related_fields = get_prefetch_fields(
+                related_type, node_type._meta.fields.get(name), field_ast, info
+            )
+            if related_fields is None:
+                continue
+            queryset = related_type.get_queryset(
+                field.related_model._default_manager.all(), info
+            )
+            # The prefetch matches the related objects by their foreign key
+            required = [field.field.name] if field.one_to_many else []
+            queryset = optimize_queryset(
+                queryset, related_type, related_fields, info, required
+            )
+            prefetches.append(Prefetch(prefix + name, queryset=queryset))
+    return select_related, prefetches, only
+
+
+def optimize_queryset(
+    queryset: QuerySet, node_type, fields: List[Field], info, required=()
+) -> QuerySet:
+    """Apply the eager loading and column selection of the fields selected on the
+    node to its queryset. Required fields are always loaded."""
+
+    select_related, prefetches, only = collect_lookups(node_type, fields, info)
+    if select_related:
+        queryset = queryset.select_related(*select_related)
+    if prefetches:
+        queryset = queryset.prefetch_related(*prefetches)
+    if only is not None:
+        queryset = queryset.only(*only, *required)
+    return queryset
+
+
+class OptimizedConnectionField(DjangoFilterConnectionField):
+    """A filter connection that eager loads the selected related objects. As a
+    nested connection, it reuses the objects prefetched by its parent's query."""
+
+    reuses_prefetched = True
+
+    @classmethod
+    def resolve_queryset(
+        cls,
+        connection,
+        iterable,
+        info,
+        args,
+        filtering_args,
+        filterset_class,
+        required=(),
+    ):
+        queryset = maybe_queryset(iterable)
+        filtered = any(args.get(name) is not None for name in filtering_args)
+        if is_prefetched(queryset) and not filtered:
+            return queryset
+        queryset = super().resolve_queryset(
+            connection, iterable, info, args, filtering_args, filterset_class
+        )
+        return optimize_queryset(
+            queryset,
+            connection._meta.node,
+            get_node_fields(info.field_asts, info),
+            info,
+            required,
+        )
@@ -1,3 +1,4 @@
+from django.conf import settings
 from graphene import ObjectType, Schema, Field
 from graphene_django.debug import DjangoDebug
 from iot.graphql.schema import Query as IoTQuery
@@ -7,10 +8,20 @@ from greenhouse.graphql.schema import Query as GreenhouseQuery
 from greenhouse.graphql.schema import Mutation as GreenhouseMutation
 
 
-class Query(IoTQuery, GreenhouseQuery, ObjectType):
+class DebugQuery:
     debug = Field(DjangoDebug, name="_debug")
 
 
+# The _debug field is only resolved by the debug middleware
+QUERY_BASES = (IoTQuery, GreenhouseQuery)
+if settings.GRAPHQL_DEBUG_MIDDLEWARE:
+    QUERY_BASES += (DebugQuery,)
+
+
+class Query(*QUERY_BASES, ObjectType):
+    pass
+
+
 class Mutation(IoTMutation, GreenhouseMutation, ObjectType):
     pass
 
@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/2.1/ref/settings/
 
 import os
 import sys
+from datetime import timedelta
 
 TESTING = sys.argv[1:2] == ["test"] or "pytest" in sys.argv[0]
 
@@ -112,11 +113,13 @@ MIDDLEWARE = [
     "csp.middleware.CSPMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
+    "core.compression.CompressionMiddleware",
     "debug_toolbar.middleware.DebugToolbarMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "core.db_routers.ReplicaStickinessMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
     "oauth2_provider.middleware.OAuth2TokenMiddleware",
@@ -166,6 +169,47 @@ if TESTING:
     # Override password hasher
     PASSWORD_HASHERS = ["django.contrib.auth.hashers.MD5PasswordHasher"]
 
+# Connections are pooled per process (see core/db/pool.py) and shared by request,
+# consumer and task threads. Without a pool, i.e., with a max size of 0, each thread
+# keeps its connection for CONN_MAX_AGE seconds instead.
+DATABASE_POOL_MAX_SIZE = int(os.environ.get("DATABASE_POOL_MAX_SIZE", 20))
+if DATABASE_POOL_MAX_SIZE and not TESTING:
+    DATABASES["default"]["ENGINE"] = "core.db.backends.postgresql_pool"
+    DATABASES["default"]["CONN_MAX_AGE"] = 0
+    DATABASES["default"]["POOL"] = {
+        "MIN_SIZE": int(os.environ.get("DATABASE_POOL_MIN_SIZE", 2)),
+        "MAX_SIZE": DATABASE_POOL_MAX_SIZE,
+        "TIMEOUT": float(os.environ.get("DATABASE_POOL_TIMEOUT", 10)),
+        "MAX_LIFETIME": float(os.environ.get("DATABASE_POOL_MAX_LIFETIME", 3600)),
+        "MAX_IDLE": float(os.environ.get("DATABASE_POOL_MAX_IDLE", 600)),
+        "HEALTH_CHECK_AFTER": float(
+            os.environ.get("DATABASE_POOL_HEALTH_CHECK_AFTER", 30)
+        ),
+    }
+else:
+    DATABASES["default"]["CONN_MAX_AGE"] = int(
+        os.environ.get("DATABASE_CONN_MAX_AGE", 60)
+    )
+
+# Read replicas of the default database, e.g., "replica-1,replica-2". Read-only GraphQL
+# operations, analytics and admin lists are routed to them.
+DATABASE_REPLICAS = []
+for index, host in enumerate(
+    filter(None, os.environ.get("DATABASE_REPLICA_HOSTS", "").split(","))
+):
+    DATABASES[f"replica_{index}"] = {
+        **DATABASES["default"],
+        "HOST": host.strip(),
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_REPLICAS.append(f"replica_{index}")
+DATABASE_ROUTERS = ["core.db_routers.ReplicaRouter"]
+# How long a user's reads stay on the primary after they wrote, to cover the replication
+# lag. Stored in the cache, which has to be shared with multiple server processes.
+DATABASE_REPLICA_STICKY_SECONDS = int(
+    os.environ.get("DATABASE_REPLICA_STICKY_SECONDS", 10)
+)
+
 # Celery and RabbitMQ
 if os.environ.get("RABBITMQ_HOST"):
     if os.environ.get("RABBITMQ_DEFAULT_USER"):
@@ -181,6 +225,21 @@ if os.environ.get("RABBITMQ_HOST"):
         CELERY_BROKER_URL = f"amqp://{os.environ.get('RABBITMQ_HOST')}"
 else:
     CELERY_BROKER_URL = "amqp://localhost"
+# Run tasks synchronously in tests, e.g., the background deletion of sites
+CELERY_TASK_ALWAYS_EAGER = TESTING
+
+CELERY_BEAT_SCHEDULE = {
+    "merge-data-point-backfill": {
+        "task": "iot.tasks.merge_data_point_backfill",
+        "schedule": timedelta(
+            minutes=int(os.environ.get("DATA_POINT_BACKFILL_MERGE_MINUTES", 5))
+        ),
+    },
+    "archive-data-points": {
+        "task": "iot.tasks.archive_old_data_points",
+        "schedule": timedelta(days=1),
+    },
+}
 
 
 # Password validation
@@ -263,15 +322,66 @@ if DEBUG:
 else:
     EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
 
+# The JSON codec of the API and WebSocket paths (see core/json_codec.py): auto uses
+# orjson if installed, else the standard library, which json selects
+JSON_CODEC = os.environ.get("JSON_CODEC", "auto")
+
+# Compression of JSON responses of at least the min size in bytes (see
+# core/compression.py), with the gzip level 1-9 and the Brotli quality 0-11
+RESPONSE_COMPRESSION_MIN_SIZE = int(
+    os.environ.get("RESPONSE_COMPRESSION_MIN_SIZE", 1024)
+)
+RESPONSE_COMPRESSION_GZIP_LEVEL = int(
+    os.environ.get("RESPONSE_COMPRESSION_GZIP_LEVEL", 6)
+)
+RESPONSE_COMPRESSION_BROTLI_LEVEL = int(
+    os.environ.get("RESPONSE_COMPRESSION_BROTLI_LEVEL", 5)
+)
+
 # Graphene-Django
 # https://docs.graphene-python.org/projects/django/en/latest/
 
 GRAPHENE = {
     "SCHEMA": "core.schema.schema",
     "MIDDLEWARE": [
-        "graphene_django.debug.DjangoDebugMiddleware",
+        "core.tracing.TracingMiddleware",
     ],
 }
+# The debug middleware records all SQL statements of every operation for the _debug
+# field and is only enabled on request. Otherwise, the field is left out of the schema.
+GRAPHQL_DEBUG_MIDDLEWARE = os.environ.get("GRAPHQL_DEBUG_MIDDLEWARE", "") == "True"
+if GRAPHQL_DEBUG_MIDDLEWARE:
+    GRAPHENE["MIDDLEWARE"].append("graphene_django.debug.DjangoDebugMiddleware")
+# Fraction of GraphQL operations whose resolvers and SQL statements are traced (see
+# core/tracing.py) and the number of traces kept per process
+GRAPHQL_TRACE_SAMPLE_RATE = float(os.environ.get("GRAPHQL_TRACE_SAMPLE_RATE", 0.01))
+GRAPHQL_TRACE_STORE_SIZE = int(os.environ.get("GRAPHQL_TRACE_STORE_SIZE", 100))
+
+# Parsed and validated GraphQL documents kept per process
+GRAPHQL_DOCUMENT_CACHE_SIZE = int(os.environ.get("GRAPHQL_DOCUMENT_CACHE_SIZE", 500))
+# Seconds Automatic Persisted Queries are kept after their last registration
+GRAPHQL_PERSISTED_QUERY_TIMEOUT = int(
+    os.environ.get("GRAPHQL_PERSISTED_QUERY_TIMEOUT", 7 * 24 * 3600)
+)
+# Operations a batch request, a JSON array of operations, may hold
+GRAPHQL_BATCH_MAX_SIZE = int(os.environ.get("GRAPHQL_BATCH_MAX_SIZE", 20))
+# Threads of a process resolving the root fields of the async GraphQL view
+GRAPHQL_ASYNC_WORKERS = int(os.environ.get("GRAPHQL_ASYNC_WORKERS", 8))
+# Limits of the estimated cost of GraphQL operations per user (see core/query_cost.py)
+GRAPHQL_QUERY_BUDGETS = {
+    "default": {
+        "max_depth": int(os.environ.get("GRAPHQL_MAX_DEPTH", 10)),
+        "max_rows": int(os.environ.get("GRAPHQL_MAX_ROWS", 50000)),
+        "max_connection_size": 100,
+        "rows_per_minute": int(os.environ.get("GRAPHQL_ROWS_PER_MINUTE", 500000)),
+    },
+    "staff": {
+        "max_depth": 20,
+        "max_rows": 500000,
+        "max_connection_size": 100,
+        "rows_per_minute": 5000000,
+    },
+}
 
 # REDIS & Channels
 
@@ -294,6 +404,17 @@ CHANNEL_LAYERS = {
     },
 }
 
+# The cache is shared by the web and Celery processes in Redis' database 1, e.g., so
+# backfills merged by Celery invalidate the cached data point buckets of the web server
+CACHES = {
+    "default": {
+        "BACKEND": "django_redis.cache.RedisCache",
+        "LOCATION": f"{REDIS_URL}/1",
+    }
+}
+if TESTING:
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
 # CORS (Cross-Origin Resource Sharing)
 
 CORS_ALLOWED_ORIGINS = [
@@ -350,6 +471,30 @@ SITE_ENTITY_COMPONENTS = [
     "water_cycle_component",
 ]
 
+# Telemetry older than this is staged and merged in the background, so that live
+# inserts never land in compressed chunks
+DATA_POINT_BACKFILL_AGE = timedelta(
+    hours=int(os.environ.get("DATA_POINT_BACKFILL_AGE_HOURS", 24))
+)
+
+# Ring buffers of the most recent data points per series (see iot/hot_series.py). The
+# capacity is the number of data points per series, 0 disables the buffers. They are
+# disabled in tests, as these write data points without the ingest path.
+HOT_SERIES_CAPACITY = 0 if TESTING else int(os.environ.get("HOT_SERIES_CAPACITY", 2880))
+HOT_SERIES_MAX_SERIES = int(os.environ.get("HOT_SERIES_MAX_SERIES", 1000))
+HOT_SERIES_LOAD_WINDOW = timedelta(
+    hours=int(os.environ.get("HOT_SERIES_LOAD_WINDOW_HOURS", 24))
+)
+
+# Seconds the aggregated buckets of closed days and hours are cached in the shared
+# cache (see iot/bucket_cache.py), 0 disables the cache. It is disabled in tests for
+# the same reason as the ring buffers.
+DATA_POINT_BUCKET_CACHE_TIMEOUT = (
+    0
+    if TESTING
+    else int(os.environ.get("DATA_POINT_BUCKET_CACHE_TIMEOUT", 30 * 24 * 3600))
+)
+
 # Greenhouse Settings
 DEFAULT_FILE_STORAGE = "storages.backends.s3boto3.S3Boto3Storage"
 AWS_ACCESS_KEY_ID = os.environ.get("MINIO_ACCESS_KEY_ID")
@@ -367,3 +512,13 @@ else:
     AWS_S3_CUSTOM_DOMAIN = os.environ.get("MINIO_DOMAIN")
     AWS_S3_SECURE_URLS = True
     AWS_S3_URL_PROTOCOL = "https:"
+
+# Chunks of data points older than this are moved to Parquet objects in cold storage
+# (MinIO by default) and dropped from the database. Disabled if not set.
+if os.environ.get("DATA_POINT_ARCHIVE_AGE_DAYS"):
+    DATA_POINT_ARCHIVE_AGE = timedelta(
+        days=int(os.environ.get("DATA_POINT_ARCHIVE_AGE_DAYS"))
+    )
+else:
+    DATA_POINT_ARCHIVE_AGE = None
+DATA_POINT_ARCHIVE_STORAGE = DEFAULT_FILE_STORAGE
@@ -0,0 +1,112 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+from unittest import mock
+
+import graphene
+from django.contrib.auth import get_user_model
+from django.test import Client, SimpleTestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from graphene_django.settings import graphene_settings
+from rest_framework.authtoken.models import Token
+
+from core.async_graphql import execute_graphql_request
+from core.tracing import trace_store
+from iot.models import Site
+
+barrier = threading.Barrier(2, timeout=5)
+
+
+class Query(graphene.ObjectType):
+    first = graphene.String()
+    second = graphene.String()
+
+    @staticmethod
+    def resolve_first(parent, info):
+        barrier.wait()
+        return threading.current_thread().name
+
+    @staticmethod
+    def resolve_second(parent, info):
+        barrier.wait()
+        return threading.current_thread().name
+
+
+schema = graphene.Schema(query=Query)
+
+
+@mock.patch.object(graphene_settings, "SCHEMA", schema)
+class AsyncGraphQLTests(SimpleTestCase):
+    """Test the concurrent execution of root fields"""
+
+    def execute(self, query, operation_name=None):
+        request = SimpleNamespace(
+            method="POST", user=SimpleNamespace(pk=1, is_staff=False)
+        )
+        return asyncio.run(execute_graphql_request(request, query, {}, operation_name))
+
+    def test_concurrent_root_fields(self):
+        """Test that root fields are resolved concurrently in the pool"""
+
+        result = self.execute(
+            "fragment Second on Query { second } query Q { first ...Second }", "Q"
+        )
+        self.assertIsNone(result.errors)
+        self.assertEqual(list(result.data), ["first", "second"])
+        self.assertNotEqual(result.data["first"], result.data["second"])
+        self.assertTrue(result.data["first"].startswith("graphql"))
+
+    def test_invalid_operations(self):
+        """Test that invalid documents are reported without execution"""
+
+        self.assertTrue(self.execute("{ unknown }").invalid)
+        self.assertTrue(self.execute("query A { first } query B { first }").invalid)
+
+
+class AsyncGraphQLViewTests(TransactionTestCase):
+    """Test the async GraphQL view with the project's schema, which runs the root fields
+    with their own database connections"""
+
+    def setUp(self):
+        self.owner = get_user_model().objects.create_user(
+            email="owner@bar.com", password="foo"
+        )
+        self.token = Token.objects.create(user=self.owner, key=Token.generate_key())
+        Site.objects.create(name="Site A", owner=self.owner)
+        self.client = Client(enforce_csrf_checks=True)
+        trace_store.clear()
+
+    def post(self, query, **headers):
+        return self.client.post(
+            reverse("graphql-async"),
+            {"query": query},
+            content_type="application/json",
+            **headers,
+        )
+
+    @override_settings(GRAPHQL_TRACE_SAMPLE_RATE=1)
+    def test_token_authentication(self):
+        """Test that token requests need no CSRF token and run the middleware"""
+
+        query = """query Sites {
+            first: allSites(first: 10) { edges { node { name } } }
+            second: allSites(first: 10) { edges { node { name } } }
+        }"""
+        response = self.post(query, HTTP_AUTHORIZATION=f"Token {self.token.key}")
+        self.assertEqual(response.status_code, 200)
+        sites = {"edges": [{"node": {"name": "Site A"}}]}
+        self.assertEqual(response.json(), {"data": {"first": sites, "second": sites}})
+
+        # TracingMiddleware timed each root field in its own trace
+        traces = trace_store.get_traces()
+        self.assertEqual(len(traces), 2)
+        for trace in traces:
+            self.assertEqual(trace["fields"]["Query.allSites"]["calls"], 1)
+
+    def test_session_authentication(self):
+        """Test that session requests still need a CSRF token"""
+
+        self.client.force_login(self.owner)
+        response = self.post("{ allSites(first: 10) { edges { node { name } } } }")
+        self.assertEqual(response.status_code, 403)
+        self.assertIn("CSRF", response.json()["errors"][0]["message"])
@@ -0,0 +1,50 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from iot.models import Site
+
+
+class BatchRequestTests(TestCase):
+    """Test executing a JSON array of operations in one request"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            email="owner@bar.com", password="foo"
+        )
+        self.client.force_login(self.user)
+
+    def post(self, data):
+        return self.client.post(
+            reverse("graphql"), data, content_type="application/json"
+        )
+
+    def test_batch(self):
+        """Test that each operation gets its result in order"""
+
+        Site.objects.create(name="Site A", owner=self.user)
+        response = self.post(
+            [
+                {"id": "sites", "query": "{ allSites { edges { node { name } } } }"},
+                {"id": "invalid", "query": "{ unknownField }"},
+            ]
+        )
+        self.assertEqual(response.status_code, 400)
+        sites, invalid = response.json()
+        self.assertEqual(sites["id"], "sites")
+        self.assertEqual(sites["status"], 200)
+        self.assertEqual(
+            sites["data"], {"allSites": {"edges": [{"node": {"name": "Site A"}}]}}
+        )
+        self.assertEqual(invalid["status"], 400)
+        self.assertIn("errors", invalid)
+
+    @override_settings(GRAPHQL_BATCH_MAX_SIZE=2)
+    def test_batch_size(self):
+        """Test that empty and too large batches are rejected"""
+
+        query = {"query": "{ allSites { edges { node { id } } } }"}
+        self.assertEqual(self.post([]).status_code, 400)
+        self.assertEqual(self.post([query] * 3).status_code, 400)
+        self.assertEqual(self.post(["query"]).status_code, 400)
+        self.assertEqual(self.post([query] * 2).status_code, 200)
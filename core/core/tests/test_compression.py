@@ -0,0 +1,76 @@
+import gzip
+import json
+
+import brotli
+from django.http import HttpResponse, JsonResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from core.compression import (
+    CompressionMiddleware,
+    compression_stats,
+    negotiate_encoding,
+)
+
+CONTENT = {
+    "edges": [
+        {"node": {"time": "2021-04-01T12:00:00+00:00", "value": i}} for i in range(100)
+    ]
+}
+
+
+@override_settings(RESPONSE_COMPRESSION_MIN_SIZE=1024)
+class CompressionTests(SimpleTestCase):
+    """Test the negotiated compression of JSON responses"""
+
+    def setUp(self):
+        compression_stats.clear()
+
+    def get(self, response, accept_encoding="gzip, deflate, br"):
+        request = RequestFactory().get(
+            "/graphql/", HTTP_ACCEPT_ENCODING=accept_encoding
+        )
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def test_negotiate_encoding(self):
+        """Test that the client's preferred supported encoding is chosen"""
+
+        self.assertEqual(negotiate_encoding("gzip, deflate, br"), "br")
+        self.assertEqual(negotiate_encoding("gzip;q=1.0, br;q=0.5"), "gzip")
+        self.assertEqual(negotiate_encoding("br;q=0, *"), "gzip")
+        self.assertEqual(negotiate_encoding("identity, deflate"), None)
+        self.assertEqual(negotiate_encoding("*;q=0"), None)
+        self.assertEqual(negotiate_encoding(""), None)
+
+    def test_compression(self):
+        """Test that large JSON responses are compressed and counted"""
+
+        response = self.get(JsonResponse(CONTENT))
+        self.assertEqual(response["Content-Encoding"], "br")
+        self.assertEqual(response["Vary"], "Accept-Encoding")
+        self.assertEqual(json.loads(brotli.decompress(response.content)), CONTENT)
+        self.assertEqual(int(response["Content-Length"]), len(response.content))
+
+        response = self.get(JsonResponse(CONTENT), "gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(json.loads(gzip.decompress(response.content)), CONTENT)
+
+        stats = compression_stats.get_stats()
+        self.assertEqual(stats["br"]["responses"], 1)
+        self.assertEqual(stats["gzip"]["responses"], 1)
+        self.assertGreater(stats["gzip"]["saved_bytes"], 0)
+        self.assertEqual(
+            stats["gzip"]["saved_bytes"],
+            stats["gzip"]["original_bytes"] - stats["gzip"]["compressed_bytes"],
+        )
+
+    def test_skipped_responses(self):
+        """Test that small, non-JSON and unaccepted responses are left as is"""
+
+        for response, accept_encoding in (
+            (JsonResponse({"data": None}), "br"),
+            (HttpResponse("x" * 2048, content_type="text/html"), "br"),
+            (JsonResponse(CONTENT), "identity"),
+        ):
+            response = self.get(response, accept_encoding)
+            self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertEqual(compression_stats.get_stats(), {})
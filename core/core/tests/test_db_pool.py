@@ -0,0 +1,148 @@
+import threading
+from unittest import mock
+
+from django.test import SimpleTestCase
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_INTRANS
+
+from core.db.pool import ConnectionPool, PoolOptions, PoolTimeout
+
+
+class FakeConnection:
+    """Mimics the parts of a psycopg2 connection used by the pool"""
+
+    def __init__(self):
+        self.closed = 0
+        self.broken = False
+        self.status = TRANSACTION_STATUS_IDLE
+        self.autocommit = False
+        self.rollbacks = 0
+        self.executed = []
+
+    def get_transaction_status(self):
+        return self.status
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.status = TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+    def cursor(self):
+        connection = self
+
+        class Cursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *args):
+                pass
+
+            def execute(self, query):
+                if connection.broken:
+                    raise Exception("Server closed the connection")
+                connection.executed.append((query, connection.autocommit))
+
+        return Cursor()
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    """Test handing out, reusing and checking pooled connections"""
+
+    def create_pool(self, **options):
+        return ConnectionPool(FakeConnection, PoolOptions(**options))
+
+    def test_reuse(self):
+        """Test that returned connections are reused"""
+
+        pool = self.create_pool()
+        connection = pool.get_connection()
+        pool.put_connection(connection)
+        self.assertIs(pool.get_connection(), connection)
+        stats = pool.get_stats()
+        self.assertEqual(stats["connections_created"], 1)
+        self.assertEqual(stats["reuses"], 1)
+        self.assertEqual(stats["in_use"], 1)
+
+    def test_rollback_on_return(self):
+        """Test that open transactions are rolled back when returning connections"""
+
+        pool = self.create_pool()
+        connection = pool.get_connection()
+        connection.status = TRANSACTION_STATUS_INTRANS
+        pool.put_connection(connection)
+        self.assertEqual(connection.rollbacks, 1)
+        self.assertIs(pool.get_connection(), connection)
+
+    def test_reset_on_return(self):
+        """Test that the session is reset in autocommit mode when returning
+        connections and connections failing to reset are closed"""
+
+        pool = self.create_pool()
+        connection = pool.get_connection()
+        pool.put_connection(connection)
+        self.assertEqual(connection.executed, [("DISCARD ALL", True)])
+        self.assertFalse(connection.autocommit)
+        self.assertIs(pool.get_connection(), connection)
+
+        connection.broken = True
+        pool.put_connection(connection)
+        self.assertTrue(connection.closed)
+        stats = pool.get_stats()
+        self.assertEqual(stats["broken_connections"], 1)
+        self.assertEqual(stats["size"], 0)
+
+    def test_max_size(self):
+        """Test that the pool waits for returned connections and times out"""
+
+        pool = self.create_pool(max_size=1, timeout=0.05)
+        connection = pool.get_connection()
+        self.assertRaises(PoolTimeout, pool.get_connection)
+        self.assertEqual(pool.get_stats()["timeouts"], 1)
+
+        timer = threading.Timer(0.01, pool.put_connection, [connection])
+        pool.options = pool.options._replace(timeout=1)
+        timer.start()
+        self.assertIs(pool.get_connection(), connection)
+        timer.join()
+
+    def test_health_check(self):
+        """Test that broken idle connections are replaced"""
+
+        pool = self.create_pool(health_check_after=0)
+        connection = pool.get_connection()
+        pool.put_connection(connection)
+        connection.broken = True
+        new_connection = pool.get_connection()
+        self.assertIsNot(new_connection, connection)
+        self.assertTrue(connection.closed)
+        stats = pool.get_stats()
+        self.assertEqual(stats["failed_health_checks"], 1)
+        self.assertEqual(stats["size"], 1)
+
+    def test_closed_and_expired_connections(self):
+        """Test that closed and expired connections are not pooled"""
+
+        pool = self.create_pool(max_lifetime=60)
+        connection = pool.get_connection()
+        connection.close()
+        pool.put_connection(connection)
+        self.assertEqual(pool.get_stats()["size"], 0)
+
+        connection = pool.get_connection()
+        with mock.patch("core.db.pool.time.monotonic", return_value=10 ** 9):
+            pool.put_connection(connection)
+        self.assertTrue(connection.closed)
+        self.assertEqual(pool.get_stats()["size"], 0)
+
+    def test_close_idle_connections(self):
+        """Test that idle connections beyond the min size are closed"""
+
+        pool = self.create_pool(min_size=1, max_idle=60)
+        connections = [pool.get_connection() for _ in range(3)]
+        for connection in connections:
+            pool.put_connection(connection)
+        with mock.patch("core.db.pool.time.monotonic", return_value=10 ** 9):
+            pool._close_idle_connections()
+        self.assertEqual(pool.get_stats()["idle"], 1)
+        self.assertEqual(sum(connection.closed for connection in connections), 2)
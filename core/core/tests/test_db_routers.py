@@ -0,0 +1,126 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from graphql_relay import to_global_id
+from rest_framework.authtoken.models import Token
+
+from core.db_routers import (
+    ReplicaRouter,
+    get_read_database,
+    is_sticky,
+    replica_reads,
+    stick_to_primary,
+)
+from iot.models import (
+    ControllerComponent,
+    ControllerComponentType,
+    ControllerTask,
+    Site,
+    SiteEntity,
+)
+
+
+@override_settings(DATABASE_REPLICAS=["replica_0"])
+class ReplicaRouterTests(TestCase):
+    """Test routing reads to replicas with read-your-writes stickiness"""
+
+    def setUp(self):
+        cache.clear()
+        self.router = ReplicaRouter()
+        self.user = get_user_model().objects.create_user(
+            email="owner@bar.com", password="foo"
+        )
+
+    def test_routing(self):
+        """Test that only reads within replica_reads() go to a replica"""
+
+        self.assertEqual(self.router.db_for_read(Site), "default")
+        with replica_reads(self.user):
+            self.assertEqual(self.router.db_for_read(Site), "replica_0")
+            self.assertEqual(self.router.db_for_write(Site), "default")
+        self.assertEqual(self.router.db_for_read(Site), "default")
+        self.assertEqual(get_read_database(self.user), "replica_0")
+        self.assertTrue(self.router.allow_migrate("default", "iot"))
+        self.assertFalse(self.router.allow_migrate("replica_0", "iot"))
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas(self):
+        """Test that all reads use the primary without replicas"""
+
+        with replica_reads(self.user):
+            self.assertEqual(self.router.db_for_read(Site), "default")
+        self.assertEqual(get_read_database(self.user), "default")
+
+    def test_stickiness(self):
+        """Test that users read from the primary after writing"""
+
+        stick_to_primary(self.user)
+        with replica_reads(self.user):
+            self.assertEqual(self.router.db_for_read(Site), "default")
+        self.assertEqual(get_read_database(self.user), "default")
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_writes_stick_to_primary(self):
+        """Test that a GraphQL query does not stick, but a write does"""
+
+        token = Token.objects.create(user=self.user)
+        headers = {"HTTP_AUTHORIZATION": f"Token {token.key}"}
+        response = self.client.post(
+            reverse("graphql"),
+            {"query": "query { allSites { edges { node { id } } } }"},
+            content_type="application/json",
+            **headers,
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(is_sticky(self.user))
+
+        self.client.force_login(self.user)
+        self.client.post(reverse("iot:create-site"), {"name": "Site A"})
+        self.assertTrue(Site.objects.filter(owner=self.user).exists())
+        self.assertTrue(is_sticky(self.user))
+
+    @mock.patch("core.db_routers.random.choice", return_value="default")
+    def test_batch_reads_own_writes(self, choice):
+        """Test that queries of a batch read from the primary after a mutation"""
+
+        controller = ControllerComponent.objects.create(
+            component_type=ControllerComponentType.objects.create(name="ESP32"),
+            site_entity=SiteEntity.objects.create(
+                name="ESP32 A", site=Site.objects.create(name="Site A", owner=self.user)
+            ),
+            channel_name="some_channel",
+        )
+        self.client.force_login(self.user)
+        query = {"query": "{ allControllerTasks { edges { node { state } } } }"}
+        response = self.client.post(
+            reverse("graphql"), [query], content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(choice.called)
+        self.assertFalse(is_sticky(self.user))
+
+        choice.reset_mock()
+        mutation = {
+            "query": """mutation ($input: StartControllerTaskInput!) {
+                startControllerTask(input: $input) { controllerTask { state } }
+            }""",
+            "variables": {
+                "input": {
+                    "controllerComponent": to_global_id(
+                        "ControllerComponentNode", controller.pk
+                    ),
+                    "taskType": ControllerTask.TaskType.SET_VALUE.value,
+                    "parameters": "{}",
+                }
+            },
+        }
+        response = self.client.post(
+            reverse("graphql"), [mutation, query], content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 200)
+        tasks = response.json()[1]["data"]["allControllerTasks"]["edges"]
+        self.assertEqual(len(tasks), 1)
+        choice.assert_not_called()
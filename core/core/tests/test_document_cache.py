@@ -0,0 +1,87 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from graphql.error import GraphQLSyntaxError
+
+from core.document_cache import CachedDocumentBackend, get_query_hash
+from core.schema import schema
+
+
+class CachedDocumentBackendTests(SimpleTestCase):
+    """Test the LRU cache of parsed and validated documents"""
+
+    def test_lru_cache(self):
+        """Test that documents are reused and the least recently used evicted"""
+
+        backend = CachedDocumentBackend(max_size=2)
+        queries = [
+            "{ allSites { edges { node { id } } } }",
+            "{ allSites { edges { node { name } } } }",
+            "{ allDataPointTypes { edges { node { name } } } }",
+        ]
+        first = backend.document_from_string(schema, queries[0])
+        backend.document_from_string(schema, queries[1])
+        self.assertIs(backend.document_from_string(schema, queries[0]), first)
+        backend.document_from_string(schema, queries[2])
+        self.assertIs(backend.document_from_string(schema, queries[0]), first)
+        self.assertIsNot(backend.document_from_string(schema, queries[1]), first)
+
+    def test_invalid_documents(self):
+        """Test that validation errors are reported and syntax errors raised"""
+
+        backend = CachedDocumentBackend(max_size=2)
+        document = backend.document_from_string(schema, "{ unknownField }")
+        result = document.execute()
+        self.assertTrue(result.invalid)
+        self.assertIn("unknownField", result.errors[0].message)
+        with self.assertRaises(GraphQLSyntaxError):
+            backend.document_from_string(schema, "{ allSites ")
+
+
+class PersistedQueryTests(TestCase):
+    """Test Automatic Persisted Queries of the GraphQL view"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            email="owner@bar.com", password="foo"
+        )
+        self.client.force_login(self.user)
+        self.query = "query { allSites { edges { node { id } } } }"
+        self.extensions = {
+            "persistedQuery": {"version": 1, "sha256Hash": get_query_hash(self.query)}
+        }
+
+    def post(self, data):
+        return self.client.post(
+            reverse("graphql"), data, content_type="application/json"
+        )
+
+    def test_persisted_query(self):
+        """Test that a query is registered once and then sent by hash only"""
+
+        response = self.post({"extensions": self.extensions})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()["errors"][0]["extensions"]["code"],
+            "PERSISTED_QUERY_NOT_FOUND",
+        )
+
+        response = self.post({"query": self.query, "extensions": self.extensions})
+        self.assertEqual(response.json(), {"data": {"allSites": {"edges": []}}})
+        response = self.post({"extensions": self.extensions})
+        self.assertEqual(response.json(), {"data": {"allSites": {"edges": []}}})
+
+    def test_hash_mismatch(self):
+        """Test that a query is not registered under another query's hash"""
+
+        response = self.post(
+            {
+                "query": "{ allSites { edges { node { name } } } }",
+                "extensions": self.extensions,
+            }
+        )
+        self.assertEqual(response.status_code, 400)
+        response = self.post({"extensions": self.extensions})
+        self.assertIn("errors", response.json())
@@ -0,0 +1,52 @@
+import uuid
+from datetime import datetime, timezone
+from decimal import Decimal
+from unittest import skipIf
+
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase, override_settings
+
+from core import json_codec
+
+MESSAGE = {
+    "uuid": uuid.UUID("12345678-1234-5678-1234-567812345678"),
+    "time": datetime(2021, 4, 1, 12, 0, tzinfo=timezone.utc),
+    "value": Decimal("1.5"),
+    "data_points": [{"value": 21.5}],
+}
+ENCODED = {
+    "uuid": "12345678-1234-5678-1234-567812345678",
+    "time": "2021-04-01T12:00:00Z",
+    "value": "1.5",
+    "data_points": [{"value": 21.5}],
+}
+
+
+class JsonCodecTests(SimpleTestCase):
+    """Test the selectable JSON codecs"""
+
+    def assert_codec(self, name):
+        codec = json_codec.get_codec()
+        self.assertEqual(codec.name, name)
+        self.assertEqual(json_codec.loads(json_codec.dumps(MESSAGE)), ENCODED)
+        self.assertEqual(json_codec.loads(json_codec.dumps_bytes(MESSAGE)), ENCODED)
+        with self.assertRaises(ValueError):
+            json_codec.loads("{invalid")
+
+    @override_settings(JSON_CODEC="json")
+    def test_stdlib_codec(self):
+        """Test that the standard library encodes UUIDs, datetimes and decimals"""
+
+        self.assert_codec("json")
+
+    @skipIf(json_codec.orjson is None, "orjson is not installed")
+    @override_settings(JSON_CODEC="auto")
+    def test_orjson_codec(self):
+        """Test that orjson is used when installed and encodes the same types"""
+
+        self.assert_codec("orjson")
+
+    @override_settings(JSON_CODEC="unknown")
+    def test_unknown_codec(self):
+        with self.assertRaises(ImproperlyConfigured):
+            json_codec.get_codec()
@@ -0,0 +1,108 @@
+from types import SimpleNamespace
+
+from django.core.cache import cache
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from graphql import GraphQLError, parse
+
+from core.query_cost import (
+    QUERY_THROTTLED,
+    QUERY_TOO_COMPLEX,
+    CostAnalysis,
+    QueryCost,
+    QueryCostMiddleware,
+    check_query_cost,
+)
+from core.schema import schema
+
+BUDGET = {
+    "max_depth": 4,
+    "max_rows": 1000,
+    "max_connection_size": 50,
+    "rows_per_minute": 1500,
+}
+
+
+class QueryCostTests(SimpleTestCase):
+    """Test the static cost analysis of GraphQL operations"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = SimpleNamespace(pk=1, is_staff=False)
+
+    def analyze(self, query, variables=None, operation_name=None):
+        return CostAnalysis(schema, parse(query), variables).analyze(operation_name)
+
+    def test_nested_connections(self):
+        """Test that nested connections multiply the estimated rows"""
+
+        query = """query Points($first: Int) {
+            allSiteEntities(first: 10) { edges { node {
+                peripheralComponent { dataPointSet(first: $first) {
+                    edges { node { value } }
+                } }
+            } } }
+        }"""
+        self.assertEqual(
+            self.analyze(query, {"first": 20}),
+            QueryCost(depth=4, rows=10 + 10 + 200, connection_size=20),
+        )
+        # Connections without first or last count their maximum size
+        self.assertEqual(self.analyze(query).rows, 10 + 10 + 1000)
+
+    def test_fragments(self):
+        """Test that fields of fragments and lists are counted"""
+
+        query = """
+            fragment SiteFields on SiteNode { name }
+            query Sites { allSites(last: 5) { edges { node { ...SiteFields } } } }
+            query ByDay { dataPointsByDay(peripheralComponent: "a", dataPointType: "b") {
+                edges { node { avg } }
+            } }
+        """
+        self.assertEqual(
+            self.analyze(query, operation_name="Sites"),
+            QueryCost(depth=2, rows=5, connection_size=5),
+        )
+        self.assertEqual(self.analyze(query, operation_name="ByDay").rows, 100)
+        self.assertIsNone(self.analyze(query))
+
+    @override_settings(GRAPHQL_QUERY_BUDGETS={"default": BUDGET})
+    def test_budget(self):
+        """Test that expensive operations are rejected and throttled"""
+
+        query = parse(
+            """query($first: Int) { allSiteEntities(first: $first) { edges { node {
+                peripheralComponent { dataPointSet(first: 10) { edges { node {
+                    value
+                } } } }
+            } } } }"""
+        )
+        cost = check_query_cost(schema, query, self.user, {"first": 50})
+        self.assertEqual(cost.rows, 600)
+        with self.assertRaises(GraphQLError) as context:
+            check_query_cost(schema, query, self.user, {"first": 100})
+        self.assertEqual(context.exception.extensions["code"], QUERY_TOO_COMPLEX)
+
+        check_query_cost(schema, query, self.user, {"first": 50})
+        with self.assertRaises(GraphQLError) as context:
+            check_query_cost(schema, query, self.user, {"first": 50})
+        self.assertEqual(context.exception.extensions["code"], QUERY_THROTTLED)
+
+    @override_settings(GRAPHQL_QUERY_BUDGETS={"default": BUDGET})
+    def test_middleware(self):
+        """Test that the middleware rejects expensive operations once per execution"""
+
+        query = """{
+            sites: allSites(first: 100) { edges { node { name } } }
+            siteEntities: allSiteEntities(first: 100) { edges { node { name } } }
+        }"""
+        request = RequestFactory().get("/graphql/")
+        request.user = self.user
+        result = schema.execute(
+            query, context=request, middleware=[QueryCostMiddleware()]
+        )
+        self.assertEqual(result.data, {"sites": None, "siteEntities": None})
+        self.assertEqual(len(result.errors), 2)
+        for error in result.errors:
+            self.assertEqual(error.extensions["code"], QUERY_TOO_COMPLEX)
+            self.assertIn("Connection size 100", error.message)
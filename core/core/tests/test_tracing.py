@@ -0,0 +1,90 @@
+from types import SimpleNamespace
+
+import graphene
+from django.test import SimpleTestCase, override_settings
+
+from core.tracing import (
+    UNATTRIBUTED,
+    Trace,
+    TracingMiddleware,
+    trace_operation,
+    trace_store,
+)
+
+
+class Item(graphene.ObjectType):
+    name = graphene.String()
+
+
+class Query(graphene.ObjectType):
+    items = graphene.List(Item)
+
+    @staticmethod
+    def resolve_items(parent, info):
+        return [Item(name="a"), Item(name="b")]
+
+
+schema = graphene.Schema(query=Query)
+
+
+@override_settings(GRAPHQL_TRACE_STORE_SIZE=2)
+class TracingTests(SimpleTestCase):
+    """Test the sampled tracing of GraphQL operations"""
+
+    def setUp(self):
+        trace_store.clear()
+
+    def execute(self, context):
+        result = schema.execute(
+            "query Items { items { name } }",
+            context_value=context,
+            middleware=[TracingMiddleware()],
+        )
+        self.assertIsNone(result.errors)
+
+    @override_settings(GRAPHQL_TRACE_SAMPLE_RATE=1)
+    def test_sampled_operation(self):
+        """Test that the resolvers of sampled operations are traced and stored"""
+
+        context = SimpleNamespace()
+        with trace_operation(context) as trace:
+            self.execute(context)
+        self.assertEqual(trace.operation_name, "Items")
+        self.assertEqual(trace.fields["Query.items"].calls, 1)
+        self.assertEqual(trace.fields["Item.name"].calls, 2)
+        self.assertIsNone(context._trace)
+
+        for _ in range(2):
+            with trace_operation(context):
+                self.execute(context)
+        traces = trace_store.get_traces()
+        self.assertEqual(len(traces), 2)
+        self.assertEqual(traces[0]["operation_name"], "Items")
+
+    @override_settings(GRAPHQL_TRACE_SAMPLE_RATE=0)
+    def test_unsampled_operation(self):
+        """Test that operations which are not sampled are not traced"""
+
+        context = SimpleNamespace()
+        with trace_operation(context) as trace:
+            self.execute(context)
+        self.assertIsNone(trace)
+        self.assertEqual(trace_store.get_traces(), [])
+
+    def test_sql_statements(self):
+        """Test that statements are charged to the running resolver"""
+
+        def execute(sql, params, many, context):
+            return sql
+
+        trace = Trace("Items")
+        trace.current_field = "Query.items"
+        self.assertEqual(
+            trace.record_sql(execute, "SELECT 1", (), False, {}), "SELECT 1"
+        )
+        trace.current_field = None
+        trace.record_sql(execute, "SELECT 2", (), False, {})
+        trace.record_sql(execute, "SELECT 3", (), False, {})
+        self.assertEqual(trace.fields["Query.items"].sql_count, 1)
+        self.assertEqual(trace.fields[UNATTRIBUTED].sql_count, 2)
+        self.assertEqual(trace.as_dict()["sql_count"], 3)
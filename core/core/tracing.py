@@ -0,0 +1,166 @@
+"""Sampled tracing of GraphQL operations.
+
+graphene-django's DjangoDebugMiddleware records every SQL statement of every request
+and is only enabled on explicit opt-in. Instead, a configurable fraction of the
+operations is traced: TracingMiddleware times each resolver and every SQL statement
+executed while it runs is charged to its field, e.g., `PeripheralComponentNode.
+dataPointSet`. Statements of DataLoader batches and lazily evaluated results, which
+run after their resolvers returned, are charged to `(unattributed)`.
+
+Finished traces are tagged with the operation name, logged to the `core.tracing`
+logger and kept in a bounded in-process store for the admin endpoint. Operations that
+are not sampled only cost an attribute lookup per resolver."""
+
+import json
+import logging
+import random
+import threading
+import time
+from collections import deque
+from contextlib import ExitStack, contextmanager
+from typing import Dict, List, Optional
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+TRACE_ATTRIBUTE = "_trace"
+UNATTRIBUTED = "(unattributed)"
+
+
+class FieldStats:
+    """The resolver calls and SQL statements of a field."""
+
+    __slots__ = ("calls", "duration", "sql_count", "sql_duration")
+
+    def __init__(self):
+        self.calls = 0
+        self.duration = 0.0
+        self.sql_count = 0
+        self.sql_duration = 0.0
+
+    def as_dict(self) -> Dict:
+        return {
+            "calls": self.calls,
+            "duration_ms": round(self.duration * 1000, 3),
+            "sql_count": self.sql_count,
+            "sql_duration_ms": round(self.sql_duration * 1000, 3),
+        }
+
+
+class Trace:
+    """The timings of the resolvers and SQL statements of an operation."""
+
+    def __init__(self, operation_name: Optional[str] = None):
+        self.operation_name = operation_name
+        self.started = time.perf_counter()
+        self.duration = 0.0
+        self.fields: Dict[str, FieldStats] = {}
+        self.current_field: Optional[str] = None
+
+    def get_field(self, field: str) -> FieldStats:
+        stats = self.fields.get(field)
+        if stats is None:
+            stats = self.fields[field] = FieldStats()
+        return stats
+
+    def record_sql(self, execute, sql, params, many, context):
+        """A database execute wrapper charging statements to the current field."""
+
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            stats = self.get_field(self.current_field or UNATTRIBUTED)
+            stats.sql_count += 1
+            stats.sql_duration += time.perf_counter() - started
+
+    def finish(self):
+        self.duration = time.perf_counter() - self.started
+
+    def as_dict(self) -> Dict:
+        return {
+            "operation_name": self.operation_name,
+            "duration_ms": round(self.duration * 1000, 3),
+            "sql_count": sum(i.sql_count for i in self.fields.values()),
+            "fields": {
+                field: stats.as_dict()
+                for field, stats in sorted(
+                    self.fields.items(), key=lambda item: -item[1].duration
+                )
+            },
+        }
+
+
+class TraceStore:
+    """The most recent traces of the process."""
+
+    def __init__(self):
+        self._traces: deque = deque()
+        self._lock = threading.Lock()
+
+    def add(self, trace: Dict):
+        with self._lock:
+            self._traces.append(trace)
+            while len(self._traces) > settings.GRAPHQL_TRACE_STORE_SIZE:
+                self._traces.popleft()
+
+    def get_traces(self) -> List[Dict]:
+        with self._lock:
+            return list(self._traces)
+
+    def clear(self):
+        with self._lock:
+            self._traces.clear()
+
+
+trace_store = TraceStore()
+
+
+def is_sampled() -> bool:
+    return random.random() < settings.GRAPHQL_TRACE_SAMPLE_RATE
+
+
+@contextmanager
+def trace_operation(context, operation_name: Optional[str] = None):
+    """Trace the operation executed within if it is sampled. The trace is stored on
+    the context, where TracingMiddleware picks it up."""
+
+    if not is_sampled():
+        yield None
+        return
+    trace = Trace(operation_name)
+    setattr(context, TRACE_ATTRIBUTE, trace)
+    try:
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(trace.record_sql))
+            yield trace
+    finally:
+        trace.finish()
+        setattr(context, TRACE_ATTRIBUTE, None)
+        result = trace.as_dict()
+        trace_store.add(result)
+        logger.info("GraphQL trace %s", json.dumps(result))
+
+
+class TracingMiddleware:
+    """Graphene middleware timing the resolvers of traced operations."""
+
+    def resolve(self, next, root, info, **args):  # pylint: disable=redefined-builtin
+        trace = getattr(info.context, TRACE_ATTRIBUTE, None)
+        if trace is None:
+            return next(root, info, **args)
+        if trace.operation_name is None and info.operation.name:
+            trace.operation_name = info.operation.name.value
+        field = f"{info.parent_type.name}.{info.field_name}"
+        trace.current_field = field
+        started = time.perf_counter()
+        try:
+            return next(root, info, **args)
+        finally:
+            stats = trace.get_field(field)
+            stats.calls += 1
+            stats.duration += time.perf_counter() - started
+            trace.current_field = None
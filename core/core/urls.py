@@ -8,6 +8,7 @@ from rest_framework.authtoken.views import obtain_auth_token
 
 from core import oauth2_views
 from core import views as root_views
+from core.async_graphql import async_graphql_view
 
 urlpatterns = [
     path("", root_views.index, name="index"),
@@ -26,6 +27,7 @@ urlpatterns = [
         root_views.DRFAuthenticatedGraphQLView.as_view(graphiql=True),
         name="graphql",
     ),
+    path("graphql/async/", async_graphql_view, name="graphql-async"),
     path("api-token-auth/", obtain_auth_token, name="api_token_auth"),
     # OAuth2 Endpoints
     path(
@@ -35,6 +37,17 @@ urlpatterns = [
         ),
     ),
     path("api/v1/userinfo/", root_views.UserInfo.as_view(), name="api-v1-userinfo"),
+    path("api/v1/db_pool/", root_views.database_pool_stats, name="api-v1-db-pool"),
+    path(
+        "api/v1/compression/",
+        root_views.compression_stats_view,
+        name="api-v1-compression",
+    ),
+    path(
+        "api/v1/graphql_traces/",
+        root_views.graphql_traces,
+        name="api-v1-graphql-traces",
+    ),
     # Static files
     path(
         "favicon.ico",
@@ -1,17 +1,41 @@
+from typing import Optional
+
 import rest_framework
-from django.http import JsonResponse
+from django.conf import settings
+from django.http import HttpResponseBadRequest, JsonResponse
 from django.shortcuts import render
-from graphene_django.views import GraphQLView
+from graphene_django.views import GraphQLView, HttpError
+from graphql import GraphQLError
+from graphql.error import GraphQLSyntaxError
+from graphql.execution import ExecutionResult
 from oauth2_provider.views.generic import ScopedProtectedResourceView
 from rest_framework.authtoken.models import Token
 from rest_framework.decorators import (
     api_view,
     authentication_classes,
+    parser_classes,
     permission_classes,
 )
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.parsers import FormParser, MultiPartParser
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.response import Response
 from rest_framework.settings import api_settings
 
+from core import json_codec
+from core.compression import compression_stats
+from core.dataloaders import LOADERS_ATTRIBUTE
+from core.db.pool import get_pool_stats
+from core.db_routers import replica_reads
+from core.document_cache import (
+    get_document_backend,
+    get_persisted_query,
+    persist_query,
+    persisted_query_not_found,
+)
+from core.query_cost import check_query_cost
+from core.tracing import trace_operation, trace_store
+from iot.access import ACCESSIBLE_IDS_ATTRIBUTE
+
 
 def index(request):
     context = {}
@@ -38,18 +62,177 @@ class UserInfo(ScopedProtectedResourceView):
         return JsonResponse({"error": "Unknown user"})
 
 
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def database_pool_stats(request):
+    """The connection pool stats of this process for monitoring."""
+
+    return Response(get_pool_stats())
+
+
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def compression_stats_view(request):
+    """The compressed responses and bytes saved by this process for monitoring."""
+
+    return Response(compression_stats.get_stats())
+
+
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def graphql_traces(request):
+    """The sampled GraphQL operation traces of this process for monitoring."""
+
+    return Response(trace_store.get_traces())
+
+
 class DRFAuthenticatedGraphQLView(GraphQLView):
-    """Add DRF authentication to classes (session, token, OAuth2) to the GraphQL view."""
+    """Add DRF authentication to classes (session, token, OAuth2) to the GraphQL view.
+
+    A JSON array of operations is executed as a batch and answered with an array of
+    results, each with the operation's id and status. The operations of a batch share
+    the request, so its authentication, DataLoaders and accessible IDs."""
+
+    # Request caches the operations of a batch share until a mutation
+    REQUEST_CACHE_ATTRIBUTES = (LOADERS_ATTRIBUTE, ACCESSIBLE_IDS_ATTRIBUTE)
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method.lower() == "post":
+            try:
+                data = self.parse_body(request)
+                if isinstance(data, list):
+                    self.validate_batch(data)
+                    # Views are instantiated per request
+                    self.batch = True
+            except HttpError as error:
+                response = error.response
+                response["Content-Type"] = "application/json"
+                response.content = self.json_encode(
+                    request, {"errors": [self.format_error(error)]}
+                )
+                return response
+        return super().dispatch(request, *args, **kwargs)
+
+    @staticmethod
+    def validate_batch(data: list):
+        """Raise an HttpError unless the batch holds 1 up to the maximum operations."""
+
+        if not data:
+            raise HttpError(HttpResponseBadRequest("Received an empty batch request."))
+        if len(data) > settings.GRAPHQL_BATCH_MAX_SIZE:
+            raise HttpError(
+                HttpResponseBadRequest(
+                    "A batch request may hold at most "
+                    f"{settings.GRAPHQL_BATCH_MAX_SIZE} operations."
+                )
+            )
+        if not all(isinstance(entry, dict) for entry in data):
+            raise HttpError(
+                HttpResponseBadRequest("Batch entries must be JSON objects.")
+            )
 
     def parse_body(self, request):
         if isinstance(request, rest_framework.request.Request):
             return request.data
         return super().parse_body(request)
 
+    def json_encode(self, request, d, pretty=False):
+        """Encode responses with the fast JSON codec unless pretty printed."""
+
+        if not (self.pretty or pretty) and not request.GET.get("pretty"):
+            return json_codec.dumps(d)
+        return super().json_encode(request, d, pretty)
+
+    def get_backend(self, request):
+        """Reuse the parsed and validated documents of previous requests."""
+
+        return get_document_backend()
+
+    @staticmethod
+    def get_persisted_query_hash(request, data) -> Optional[str]:
+        """The query hash of an Automatic Persisted Query, if any."""
+
+        extensions = request.GET.get("extensions") or data.get("extensions") or {}
+        if isinstance(extensions, str):
+            try:
+                extensions = json_codec.loads(extensions)
+            except ValueError:
+                raise HttpError(HttpResponseBadRequest("Extensions are invalid JSON."))
+        return (extensions.get("persistedQuery") or {}).get("sha256Hash")
+
+    def get_graphql_params(self, request, data):
+        """Resolve Automatic Persisted Queries, which may only send the query hash."""
+
+        query, variables, operation_name, id = super().get_graphql_params(request, data)
+        query_hash = self.get_persisted_query_hash(request, data)
+        if query_hash and query:
+            try:
+                persist_query(query_hash, query)
+            except GraphQLError as error:
+                raise HttpError(HttpResponseBadRequest(str(error)))
+        elif query_hash:
+            query = get_persisted_query(query_hash)
+        return query, variables, operation_name, id
+
+    def is_query_operation(self, request, query, operation_name) -> bool:
+        """Whether the operation only reads, i.e., is no mutation or subscription."""
+
+        try:
+            document = self.get_backend(request).document_from_string(
+                self.schema, query
+            )
+        except GraphQLSyntaxError:
+            return False
+        return document.get_operation_type(operation_name) == "query"
+
+    def check_query_cost(self, request, query, variables, operation_name):
+        """Reject operations exceeding the user's budget, see core.query_cost. Syntax
+        errors are left to the execution."""
+
+        try:
+            document = self.get_backend(request).document_from_string(
+                self.schema, query
+            )
+        except GraphQLSyntaxError:
+            return
+        check_query_cost(
+            self.schema, document.document_ast, request.user, variables, operation_name
+        )
+
+    def execute_graphql_request(
+        self, request, data, query, variables, operation_name, *args, **kwargs
+    ):
+        """Execute read-only operations on a read replica, tracing sampled ones."""
+
+        if not query and self.get_persisted_query_hash(request, data):
+            return persisted_query_not_found()
+        if query:
+            try:
+                self.check_query_cost(request, query, variables, operation_name)
+            except GraphQLError as error:
+                return ExecutionResult(errors=[error], invalid=True)
+        with trace_operation(request, operation_name):
+            if query and self.is_query_operation(request, query, operation_name):
+                with replica_reads(request.user):
+                    return super().execute_graphql_request(
+                        request, data, query, variables, operation_name, *args, **kwargs
+                    )
+            try:
+                return super().execute_graphql_request(
+                    request, data, query, variables, operation_name, *args, **kwargs
+                )
+            finally:
+                # Later operations of a batch must see the changes
+                for attribute in self.REQUEST_CACHE_ATTRIBUTES:
+                    setattr(request, attribute, None)
+
     @classmethod
     def as_view(cls, *args, **kwargs):
         view = super().as_view(*args, **kwargs)
         view = permission_classes((IsAuthenticated,))(view)
+        view = parser_classes((json_codec.JSONParser, FormParser, MultiPartParser))(
+            view
+        )
         view = authentication_classes(api_settings.DEFAULT_AUTHENTICATION_CLASSES)(view)
         view = api_view(["GET", "POST"])(view)
         return view
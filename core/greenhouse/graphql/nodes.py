@@ -20,7 +20,10 @@ from greenhouse.models import (
     WaterSensor,
     WaterValve,
 )
-from iot.graphql.nodes import TextChoice
+from core.dataloaders import resolve_related
+from core.query_optimizer import OptimizedConnectionField
+from iot.access import filter_by_site, filter_by_site_entity
+from iot.graphql.nodes import PeripheralComponentNode, TextChoice
 
 
 class HydroponicSystemComponentEnumNode(ObjectType):
@@ -54,9 +57,15 @@ class HydroponicSystemComponentNode(DjangoObjectType):
         )
         convert_choices_to_enum = False
 
+    peripheral_component_set = OptimizedConnectionField(
+        PeripheralComponentNode, required=True
+    )
+
     @classmethod
     def get_queryset(cls, queryset, info):
-        return queryset.filter(site_entity__site__owner=info.context.user)
+        return filter_by_site_entity(queryset, info)
+
+    resolve_site_entity = resolve_related("site_entity")
 
 
 class PlantComponentNode(DjangoObjectType):
@@ -89,9 +98,15 @@ class PlantComponentNode(DjangoObjectType):
             "modified_at",
         )
 
+    plant_image_set = OptimizedConnectionField(lambda: PlantImageNode, required=True)
+
     @classmethod
     def get_queryset(cls, queryset, info):
-        return queryset.filter(site_entity__site__owner=info.context.user)
+        return filter_by_site_entity(queryset, info)
+
+    resolve_site_entity = resolve_related("site_entity")
+    resolve_hydroponic_system = resolve_related("hydroponic_system")
+    resolve_species = resolve_related("species")
 
 
 class PlantFamilyNode(DjangoObjectType):
@@ -101,6 +116,8 @@ class PlantFamilyNode(DjangoObjectType):
         filter_fields = {"name": ["exact", "icontains"]}
         fields = ("name", "genus_set")
 
+    genus_set = OptimizedConnectionField(lambda: PlantGenusNode, required=True)
+
 
 class PlantGenusNode(DjangoObjectType):
     class Meta:
@@ -113,6 +130,10 @@ class PlantGenusNode(DjangoObjectType):
         }
         fields = ("name", "family", "species_set")
 
+    species_set = OptimizedConnectionField(lambda: PlantSpeciesNode, required=True)
+
+    resolve_family = resolve_related("family")
+
 
 class PlantSpeciesNode(DjangoObjectType):
     class Meta:
@@ -128,6 +149,10 @@ class PlantSpeciesNode(DjangoObjectType):
         }
         fields = ("common_name", "binomial_name", "genus", "plant_set")
 
+    plant_set = OptimizedConnectionField(PlantComponentNode, required=True)
+
+    resolve_genus = resolve_related("genus")
+
 
 class PlantImageNode(DjangoObjectType):
     image = graphene.String(required=False)
@@ -146,7 +171,9 @@ class PlantImageNode(DjangoObjectType):
 
     @classmethod
     def get_queryset(cls, queryset, info):
-        return queryset.filter(plant__site_entity__site__owner=info.context.user)
+        return filter_by_site_entity(queryset, info, "plant__site_entity")
+
+    resolve_plant = resolve_related("plant")
 
 
 class TrackingImageNode(DjangoObjectType):
@@ -163,9 +190,9 @@ class TrackingImageNode(DjangoObjectType):
 
     @classmethod
     def get_queryset(cls, queryset, info):
-        return queryset.filter(
-            hydroponic_system__site_entity__site__owner=info.context.user
-        )
+        return filter_by_site_entity(queryset, info, "hydroponic_system__site_entity")
+
+    resolve_hydroponic_system = resolve_related("hydroponic_system")
 
 
 class WaterCycleNode(DjangoObjectType):
@@ -176,7 +203,7 @@ class WaterCycleNode(DjangoObjectType):
 
     @classmethod
     def get_queryset(cls, queryset, info):
-        return queryset.filter(site__owner=info.context.user)
+        return filter_by_site(queryset, info)
 
 
 class WaterCycleComponentFilter(FilterSet):
@@ -210,7 +237,10 @@ class WaterCycleLogNode(DjangoObjectType):
 
     @classmethod
     def get_queryset(cls, queryset, info):
-        return queryset.filter(water_cycle__site__owner=info.context.user)
+        return filter_by_site(queryset, info, "water_cycle__site")
+
+    resolve_water_cycle_component = resolve_related("water_cycle_component")
+    resolve_water_cycle = resolve_related("water_cycle")
 
 
 class WaterCycleFlowsToNode(DjangoObjectType):
@@ -221,7 +251,10 @@ class WaterCycleFlowsToNode(DjangoObjectType):
 
     @classmethod
     def get_queryset(cls, queryset, info):
-        return queryset.filter(flows_from__site_entity__site__owner=info.context.user)
+        return filter_by_site_entity(queryset, info, "flows_from__site_entity")
+
+    resolve_flows_from = resolve_related("flows_from")
+    resolve_flows_to = resolve_related("flows_to")
 
 
 class WaterCycleComponentNode(DjangoObjectType):
@@ -250,13 +283,28 @@ class WaterCycleComponentNode(DjangoObjectType):
             "modified_at",
         )
 
+    flows_to_set = OptimizedConnectionField(
+        lambda: WaterCycleComponentNode, required=True
+    )
+    flows_from_set = OptimizedConnectionField(
+        lambda: WaterCycleComponentNode, required=True
+    )
+
     @staticmethod
     def resolve_types(water_cycle_component, args):
         return water_cycle_component.get_type_values()
 
     @classmethod
     def get_queryset(cls, queryset, info):
-        return queryset.filter(site_entity__site__owner=info.context.user)
+        return filter_by_site_entity(queryset, info)
+
+    resolve_site_entity = resolve_related("site_entity")
+    resolve_water_cycle = resolve_related("water_cycle")
+    resolve_water_reservoir = resolve_related("water_reservoir")
+    resolve_water_pump = resolve_related("water_pump")
+    resolve_water_pipe = resolve_related("water_pipe")
+    resolve_water_sensor = resolve_related("water_sensor")
+    resolve_water_valve = resolve_related("water_valve")
 
 
 class WaterComponentEnumNode(ObjectType):
@@ -277,8 +325,8 @@ class WaterReservoirNode(DjangoObjectType):
 
     @classmethod
     def get_queryset(cls, queryset, info):
-        return queryset.filter(
-            water_cycle_component__site_entity__site__owner=info.context.user
+        return filter_by_site_entity(
+            queryset, info, "water_cycle_component__site_entity"
         )
 
 
@@ -294,8 +342,8 @@ class WaterPumpNode(DjangoObjectType):
 
     @classmethod
     def get_queryset(cls, queryset, info):
-        return queryset.filter(
-            water_cycle_component__site_entity__site__owner=info.context.user
+        return filter_by_site_entity(
+            queryset, info, "water_cycle_component__site_entity"
         )
 
 
@@ -306,8 +354,8 @@ class WaterPipeNode(DjangoObjectType):
 
     @classmethod
     def get_queryset(cls, queryset, info):
-        return queryset.filter(
-            water_cycle_component__site_entity__site__owner=info.context.user
+        return filter_by_site_entity(
+            queryset, info, "water_cycle_component__site_entity"
         )
 
 
@@ -319,8 +367,8 @@ class WaterSensorNode(DjangoObjectType):
 
     @classmethod
     def get_queryset(cls, queryset, info):
-        return queryset.filter(
-            water_cycle_component__site_entity__site__owner=info.context.user
+        return filter_by_site_entity(
+            queryset, info, "water_cycle_component__site_entity"
         )
 
 
@@ -331,6 +379,6 @@ class WaterValveNode(DjangoObjectType):
 
     @classmethod
     def get_queryset(cls, queryset, info):
-        return queryset.filter(
-            water_cycle_component__site_entity__site__owner=info.context.user
+        return filter_by_site_entity(
+            queryset, info, "water_cycle_component__site_entity"
         )
@@ -1,5 +1,5 @@
 import graphene
-from graphene_django.filter import DjangoFilterConnectionField
+from core.query_optimizer import OptimizedConnectionField
 from greenhouse.graphql.mutations import (
     CloseWaterValve,
     OpenWaterValve,
@@ -33,34 +33,34 @@ class Query(object):
     hydroponic_system_component = graphene.relay.Node.Field(
         HydroponicSystemComponentNode
     )
-    all_hydroponic_system_components = DjangoFilterConnectionField(
+    all_hydroponic_system_components = OptimizedConnectionField(
         HydroponicSystemComponentNode
     )
     hydroponic_system_enums = graphene.Field(HydroponicSystemComponentEnumNode)
 
     plant_component = graphene.relay.Node.Field(PlantComponentNode)
-    all_plant_components = DjangoFilterConnectionField(PlantComponentNode)
+    all_plant_components = OptimizedConnectionField(PlantComponentNode)
 
     plant_family = graphene.relay.Node.Field(PlantFamilyNode)
-    all_plant_families = DjangoFilterConnectionField(PlantFamilyNode)
+    all_plant_families = OptimizedConnectionField(PlantFamilyNode)
 
     plant_genus = graphene.relay.Node.Field(PlantGenusNode)
-    all_plant_genera = DjangoFilterConnectionField(PlantGenusNode)
+    all_plant_genera = OptimizedConnectionField(PlantGenusNode)
 
     plant_species = graphene.relay.Node.Field(PlantSpeciesNode)
-    all_plant_species = DjangoFilterConnectionField(PlantSpeciesNode)
+    all_plant_species = OptimizedConnectionField(PlantSpeciesNode)
 
     plant_image = graphene.relay.Node.Field(PlantImageNode)
-    all_plant_images = DjangoFilterConnectionField(PlantImageNode)
+    all_plant_images = OptimizedConnectionField(PlantImageNode)
 
     tracking_image = graphene.relay.Node.Field(TrackingImageNode)
-    all_tracking_images = DjangoFilterConnectionField(TrackingImageNode)
+    all_tracking_images = OptimizedConnectionField(TrackingImageNode)
 
     water_cycle = graphene.relay.Node.Field(WaterCycleNode)
-    all_water_cycles = DjangoFilterConnectionField(WaterCycleNode)
+    all_water_cycles = OptimizedConnectionField(WaterCycleNode)
 
     water_cycle_component = graphene.relay.Node.Field(WaterCycleComponentNode)
-    all_water_cycle_components = DjangoFilterConnectionField(WaterCycleComponentNode)
+    all_water_cycle_components = OptimizedConnectionField(WaterCycleComponentNode)
     water_cycle_component_enums = graphene.Field(WaterComponentEnumNode)
 
     water_reservoir = graphene.relay.Node.Field(WaterReservoirNode)
@@ -0,0 +1,108 @@
+"""Owner scoping of GraphQL querysets by the cached IDs the user may access.
+
+Filtering through chains like peripheral_component__site_entity__site__owner joins
+up to four tables, even for the data point hypertable. Instead, the IDs of the user's
+sites, site entities and peripheral components are loaded once per query operation
+and the querysets are filtered with an indexed `IN (...)`. As all components use
+their site entity's ID as primary key, the site entity IDs also scope the foreign keys
+to controller and peripheral components without any join.
+
+Mutations and subscriptions may change the accessible objects or outlive them, so
+they keep filtering by the owner."""
+
+import uuid
+from functools import cached_property
+from typing import FrozenSet, Optional
+
+from iot.models import PeripheralComponent, Site, SiteEntity
+
+ACCESSIBLE_IDS_ATTRIBUTE = "_accessible_ids"
+
+
+class AccessibleIds:
+    """The IDs of the objects of a user, each loaded on first use."""
+
+    def __init__(self, user):
+        self.user = user
+
+    @cached_property
+    def site_ids(self) -> FrozenSet[uuid.UUID]:
+        return frozenset(
+            Site.objects.filter(owner=self.user).values_list("pk", flat=True)
+        )
+
+    @cached_property
+    def site_entity_ids(self) -> FrozenSet[uuid.UUID]:
+        return frozenset(
+            SiteEntity.objects.filter(site__owner=self.user).values_list(
+                "pk", flat=True
+            )
+        )
+
+    @cached_property
+    def peripheral_component_ids(self) -> FrozenSet[uuid.UUID]:
+        return frozenset(
+            PeripheralComponent.objects.filter(
+                site_entity__site__owner=self.user
+            ).values_list("pk", flat=True)
+        )
+
+
+def get_accessible_ids(info) -> Optional[AccessibleIds]:
+    """The accessible IDs of the current query operation's user, or None for
+    mutations and subscriptions."""
+
+    if info.operation.operation != "query":
+        return None
+    user = info.context.user
+    accessible = getattr(info.context, ACCESSIBLE_IDS_ATTRIBUTE, None)
+    if accessible is None or accessible.user != user:
+        accessible = AccessibleIds(user)
+        setattr(info.context, ACCESSIBLE_IDS_ATTRIBUTE, accessible)
+    return accessible
+
+
+def filter_by_site(queryset, info, path: str = "site"):
+    """Limit the queryset to objects whose site at the path is owned by the user."""
+
+    accessible = get_accessible_ids(info)
+    if accessible is None:
+        return queryset.filter(**{f"{path}__owner": info.context.user})
+    return queryset.filter(**{f"{path}__in": accessible.site_ids})
+
+
+def filter_by_site_entity(queryset, info, path: str = "site_entity"):
+    """Limit the queryset to objects whose site entity at the path, or component
+    sharing its ID, belongs to a site of the user."""
+
+    accessible = get_accessible_ids(info)
+    if accessible is None:
+        return queryset.filter(**{f"{path}__site__owner": info.context.user})
+    return queryset.filter(**{f"{path}__in": accessible.site_entity_ids})
+
+
+def to_uuid(value) -> Optional[uuid.UUID]:
+    try:
+        return uuid.UUID(str(value))
+    except ValueError:
+        return None
+
+
+def can_access_site(info, site_id) -> bool:
+    """Whether the site is owned by the user."""
+
+    accessible = get_accessible_ids(info)
+    if accessible is None:
+        return Site.objects.filter(pk=site_id, owner=info.context.user).exists()
+    return to_uuid(site_id) in accessible.site_ids
+
+
+def can_access_peripheral_component(info, peripheral_component_id) -> bool:
+    """Whether the peripheral component belongs to a site of the user."""
+
+    accessible = get_accessible_ids(info)
+    if accessible is None:
+        return PeripheralComponent.objects.filter(
+            pk=peripheral_component_id, site_entity__site__owner=info.context.user
+        ).exists()
+    return to_uuid(peripheral_component_id) in accessible.peripheral_component_ids
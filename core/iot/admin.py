@@ -2,6 +2,7 @@ from django.contrib import admin
 from django.utils.safestring import mark_safe
 from django.urls import reverse
 
+from core.db_routers import ReplicaReadAdminMixin
 from .models import (
     ControllerAuthToken,
     ControllerComponent,
@@ -9,7 +10,10 @@ from .models import (
     ControllerMessage,
     ControllerTask,
     DataPoint,
+    DataPointArchive,
+    DataPointBackfill,
     DataPointType,
+    DeletionJob,
     PeripheralComponent,
     PeripheralDataPointType,
     Site,
@@ -112,10 +116,25 @@ class DataPointTypeAdmin(admin.ModelAdmin):
 
 
 @admin.register(DataPoint)
-class DataPointAdmin(admin.ModelAdmin):
+class DataPointAdmin(ReplicaReadAdminMixin, admin.ModelAdmin):
     pass
 
 
+@admin.register(DataPointArchive)
+class DataPointArchiveAdmin(ReplicaReadAdminMixin, admin.ModelAdmin):
+    list_display = ("peripheral_component", "start_time", "end_time", "row_count")
+
+
+@admin.register(DataPointBackfill)
+class DataPointBackfillAdmin(ReplicaReadAdminMixin, admin.ModelAdmin):
+    list_display = ("time", "peripheral_component", "data_point_type", "value")
+
+
+@admin.register(DeletionJob)
+class DeletionJobAdmin(admin.ModelAdmin):
+    list_display = ("name", "target_type", "owner", "state", "progress", "created_at")
+
+
 @admin.register(ControllerAuthToken)
 class ControllerAuthTokenAdmin(admin.ModelAdmin):
     def get_form(self, request, obj=None, change=False, **kwargs):
@@ -125,5 +144,5 @@ class ControllerAuthTokenAdmin(admin.ModelAdmin):
 
 
 @admin.register(ControllerMessage)
-class ControllerMessageAdmin(admin.ModelAdmin):
+class ControllerMessageAdmin(ReplicaReadAdminMixin, admin.ModelAdmin):
     pass
@@ -0,0 +1,66 @@
+"""Statistics of time-aligned data point series, computed with NumPy.
+
+The series are passed as a matrix with a row per time bucket and a column per series,
+see DataPoint.objects.aligned(). Buckets without data points of a series are NaN."""
+
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+
+def to_matrix(rows: List[Tuple], columns: int) -> Tuple[List[datetime], np.ndarray]:
+    """Split the aligned rows of the given number of series into the bucket times and
+    a float matrix of the values."""
+
+    times = [row[0] for row in rows]
+    values = np.array([row[1:] for row in rows], dtype=np.float64)
+    return times, values.reshape(len(rows), columns)
+
+
+def _complete(x: np.ndarray, y: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """The buckets with values of both series."""
+
+    mask = ~(np.isnan(x) | np.isnan(y))
+    return x[mask], y[mask]
+
+
+def pearson_correlation(matrix: np.ndarray) -> List[List[Optional[float]]]:
+    """The Pearson correlation coefficient of each pair of series over the buckets
+    with values of both. None if there are fewer than two such buckets or a series
+    is constant within them."""
+
+    count = matrix.shape[1]
+    correlation: List[List[Optional[float]]] = [[None] * count for _ in range(count)]
+    for i in range(count):
+        for j in range(i, count):
+            x, y = _complete(matrix[:, i], matrix[:, j])
+            if len(x) < 2 or not x.std() or not y.std():
+                continue
+            coefficient = float(np.corrcoef(x, y)[0, 1])
+            correlation[i][j] = correlation[j][i] = coefficient
+    return correlation
+
+
+def linear_regression(matrix: np.ndarray) -> List[Dict[str, Optional[float]]]:
+    """Fit each series as a linear function of the first one by least squares.
+    Returns the slope, intercept and coefficient of determination per series."""
+
+    fits = []
+    for i in range(matrix.shape[1]):
+        x, y = _complete(matrix[:, 0], matrix[:, i])
+        if len(x) < 2 or not x.std():
+            fits.append({"slope": None, "intercept": None, "r_squared": None})
+            continue
+        slope, intercept = np.polyfit(x, y, 1)
+        residuals = y - (slope * x + intercept)
+        total = ((y - y.mean()) ** 2).sum()
+        r_squared = 1 - (residuals ** 2).sum() / total if total else 1.0
+        fits.append(
+            {
+                "slope": float(slope),
+                "intercept": float(intercept),
+                "r_squared": float(r_squared),
+            }
+        )
+    return fits
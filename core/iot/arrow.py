@@ -0,0 +1,245 @@
+"""Columnar export of data point series as Apache Arrow record batches.
+
+The rows are never materialized as Python objects. PostgreSQL streams each series as
+CSV via COPY, which is parsed by Arrow's C++ reader directly into column buffers. A
+series is copied in pages of COPY_BATCH_ROWS rows, continuing after the time of the
+last row, so a long range is never held in memory as a whole."""
+
+import io
+import json
+from datetime import datetime, timedelta
+from typing import Iterator, List, Optional, Tuple
+from uuid import UUID
+
+import pyarrow as pa
+from django.db import DEFAULT_DB_ALIAS, connections
+from pyarrow import csv as pa_csv
+
+from iot.models import DataPoint
+
+# The time is transferred as microseconds since the epoch and cast without a copy
+TIME_TYPE = pa.timestamp("us", tz="UTC")
+ARROW_STREAM_CONTENT_TYPE = "application/vnd.apache.arrow.stream"
+
+RAW_COLUMNS = [("series", pa.int16()), ("time", pa.int64()), ("value", pa.float64())]
+BUCKET_COLUMNS = [
+    ("series", pa.int16()),
+    ("time", pa.int64()),
+    ("avg", pa.float64()),
+    ("min", pa.float64()),
+    ("max", pa.float64()),
+    ("count", pa.int64()),
+]
+
+# Exact epoch in µs. Extracting the epoch directly would round through a double.
+EPOCH_US_SQL = (
+    "(date_part('epoch', date_trunc('second', {time}))::bigint * 1000000"
+    " + date_part('microseconds', {time})::bigint % 1000000)"
+)
+
+Series = Tuple[UUID, UUID]
+
+# The rows of a series copied and held in memory at once, a few MB of CSV
+COPY_BATCH_ROWS = 100000
+
+
+def to_schema(series: List[Series], bucket: Optional[timedelta] = None) -> pa.Schema:
+    """The schema of the Arrow stream. The series column indexes the list of series
+    stored in the schema metadata."""
+
+    columns = BUCKET_COLUMNS if bucket else RAW_COLUMNS
+    fields = [
+        pa.field(name, TIME_TYPE if name == "time" else column_type)
+        for name, column_type in columns
+    ]
+    metadata = {
+        "series": json.dumps(
+            [
+                {"peripheral_component": str(peripheral), "data_point_type": str(dpt)}
+                for peripheral, dpt in series
+            ]
+        )
+    }
+    if bucket:
+        metadata["bucket_seconds"] = str(bucket.total_seconds())
+    return pa.schema(fields, metadata=metadata)
+
+
+def series_sql(
+    index: int,
+    peripheral_component_id: UUID,
+    data_point_type_id: UUID,
+    from_time: Optional[datetime] = None,
+    before_time: Optional[datetime] = None,
+    bucket: Optional[timedelta] = None,
+    limit: Optional[int] = None,
+) -> Tuple[str, List]:
+    """Build the query of a single series, either raw or aggregated by time bucket,
+    optionally limited to the first rows."""
+
+    table = DataPoint._meta.db_table
+    conditions = ["peripheral_component_id = %s", "data_point_type_id = %s"]
+    params: List = [peripheral_component_id, data_point_type_id]
+    if from_time:
+        conditions.append("time >= %s")
+        params.append(from_time)
+    if before_time:
+        conditions.append("time < %s")
+        params.append(before_time)
+    where = " AND ".join(conditions)
+
+    if bucket:
+        time = EPOCH_US_SQL.format(time="time_bucket(%s, time)")
+        query = (
+            f"SELECT {index}, {time} AS bucket, avg(value), min(value), max(value),"
+            f" count(*) FROM {table} WHERE {where} GROUP BY bucket ORDER BY bucket"
+        )
+        # The bucket width is used twice by the time expression
+        params = [bucket, bucket] + params
+    else:
+        time = EPOCH_US_SQL.format(time="time")
+        query = (
+            f"SELECT {index}, {time}, value FROM {table} WHERE {where} ORDER BY time"
+        )
+    if limit:
+        query += f" LIMIT {int(limit)}"
+    return query, params
+
+
+def copy_to_record_batches(
+    query: str, params: List, schema: pa.Schema, using: str = DEFAULT_DB_ALIAS
+) -> List[pa.RecordBatch]:
+    """Run the query with COPY and parse the CSV output into record batches."""
+
+    buffer = io.BytesIO()
+    with connections[using].cursor() as cursor:
+        sql = cursor.mogrify(query, params).decode()
+        cursor.copy_expert(f"COPY ({sql}) TO STDOUT WITH (FORMAT csv)", buffer)
+    if not buffer.getbuffer().nbytes:
+        return []
+    buffer.seek(0)
+
+    column_types = {
+        field.name: pa.int64() if field.name == "time" else field.type
+        for field in schema
+    }
+    table = pa_csv.read_csv(
+        buffer,
+        read_options=pa_csv.ReadOptions(column_names=schema.names),
+        convert_options=pa_csv.ConvertOptions(column_types=column_types),
+    )
+    columns = [
+        table.column(name).cast(TIME_TYPE) if name == "time" else table.column(name)
+        for name in schema.names
+    ]
+    return pa.Table.from_arrays(columns, schema=schema).to_batches()
+
+
+def copy_series_record_batches(
+    index: int,
+    peripheral_component_id: UUID,
+    data_point_type_id: UUID,
+    schema: pa.Schema,
+    from_time: Optional[datetime] = None,
+    before_time: Optional[datetime] = None,
+    bucket: Optional[timedelta] = None,
+    using: str = DEFAULT_DB_ALIAS,
+) -> Iterator[pa.RecordBatch]:
+    """Yield the record batches of a series in the database, copying at most
+    COPY_BATCH_ROWS rows per query. Each page starts after the last data point or
+    bucket of the previous one, as the time is unique and buckets are aligned."""
+
+    while True:
+        query, params = series_sql(
+            index,
+            peripheral_component_id,
+            data_point_type_id,
+            from_time,
+            before_time,
+            bucket,
+            COPY_BATCH_ROWS,
+        )
+        batches = copy_to_record_batches(query, params, schema, using)
+        yield from batches
+        if sum(batch.num_rows for batch in batches) < COPY_BATCH_ROWS:
+            return
+        last_time = batches[-1].column("time")[-1].as_py()
+        from_time = last_time + (bucket or timedelta(microseconds=1))
+
+
+def to_archived_record_batch(
+    index: int, table: pa.Table, schema: pa.Schema, bucket: Optional[timedelta] = None
+) -> pa.RecordBatch:
+    """Convert archived data points of a series to a record batch of the schema."""
+
+    # Avoid a circular import, the cold storage exports its data with this module
+    from iot.cold_storage import aggregate_buckets
+
+    if bucket:
+        aggregates = aggregate_buckets(table, bucket)
+        columns = [
+            pa.array(aggregates["time"], pa.int64()).cast(TIME_TYPE),
+            pa.array(aggregates["avg"], pa.float64()),
+            pa.array(aggregates["min"], pa.float64()),
+            pa.array(aggregates["max"], pa.float64()),
+            pa.array(aggregates["count"], pa.int64()),
+        ]
+    else:
+        columns = [
+            table.column("time").combine_chunks(),
+            table.column("value").combine_chunks(),
+        ]
+    series = pa.array([index] * len(columns[0]), pa.int16())
+    return pa.RecordBatch.from_arrays([series] + columns, schema=schema)
+
+
+def series_record_batches(
+    series: List[Series],
+    from_time: Optional[datetime] = None,
+    before_time: Optional[datetime] = None,
+    bucket: Optional[timedelta] = None,
+    using: str = DEFAULT_DB_ALIAS,
+) -> Iterator[pa.RecordBatch]:
+    """Yield the record batches of each series in the requested order. Data points
+    moved to cold storage precede the ones in the database, which is read from the
+    given alias."""
+
+    from iot.cold_storage import read_archived_data_points
+
+    schema = to_schema(series, bucket)
+    for index, (peripheral_component_id, data_point_type_id) in enumerate(series):
+        archived = read_archived_data_points(
+            peripheral_component_id, data_point_type_id, from_time, before_time
+        )
+        if archived.num_rows:
+            yield to_archived_record_batch(index, archived, schema, bucket)
+        yield from copy_series_record_batches(
+            index,
+            peripheral_component_id,
+            data_point_type_id,
+            schema,
+            from_time,
+            before_time,
+            bucket,
+            using,
+        )
+
+
+def to_ipc_stream(
+    schema: pa.Schema, batches: Iterator[pa.RecordBatch]
+) -> Iterator[bytes]:
+    """Encode record batches as an Arrow IPC stream, yielding each encoded message."""
+
+    sink = io.BytesIO()
+
+    def flush() -> bytes:
+        data = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return data
+
+    with pa.ipc.new_stream(sink, schema) as writer:
+        for batch in batches:
+            writer.write_batch(batch)
+            yield flush()
+    yield flush()
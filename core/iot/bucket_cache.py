@@ -0,0 +1,238 @@
+"""Cache of the aggregated buckets of series that have completely passed.
+
+The buckets of dataPointsByDay and dataPointsByHour before the current, open bucket
+only change if data points are ingested late or backfilled. Their rows are kept in
+Django's cache in blocks of consecutive buckets aligned to the epoch, e.g., a UTC day
+of hours, so queries over sliding windows share the blocks and only the open bucket is
+aggregated for each query. The last block is cached until its next bucket closes.
+
+Each series has a cache version per bucket size, which is replaced whenever data
+points arrive for a bucket that has already closed, so the cached blocks of the series
+are never used again. Telemetry for the open bucket leaves the cache untouched. The
+cache has to be shared by all processes, as backfills are merged by Celery workers."""
+
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+from django.conf import settings
+from django.core.cache import cache
+
+BUCKETS = {"day": timedelta(days=1), "time_hour": timedelta(hours=1)}
+# The closed buckets of a series are cached in blocks of this many buckets
+BLOCK_BUCKETS = {"day": 28, "time_hour": 24}
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+Time = Union[date, datetime, None]
+Aggregate = Callable[[Time, Time, bool, int], List[Dict]]
+
+
+def get_closed_before(bucket: timedelta, now: Optional[datetime] = None) -> datetime:
+    """The start of the open bucket, before which all buckets are closed."""
+
+    now = now or datetime.now(timezone.utc)
+    return EPOCH + (now - EPOCH) // bucket * bucket
+
+
+def _version_key(time_key: str, peripheral_component_id, data_point_type_id) -> str:
+    return f"data-point-buckets-version-{time_key}-{peripheral_component_id}-{data_point_type_id}"
+
+
+def get_version(time_key: str, peripheral_component_id, data_point_type_id) -> str:
+    """The current cache version of the series. A new version is created if it is
+    unknown, e.g., evicted, so rows of earlier versions are never reused."""
+
+    key = _version_key(time_key, peripheral_component_id, data_point_type_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def invalidate_series(peripheral_component_id, data_point_type_id, earliest: datetime):
+    """Drop the cached buckets of a series if its earliest new data point falls into
+    an already closed bucket."""
+
+    for time_key, bucket in BUCKETS.items():
+        if earliest < get_closed_before(bucket):
+            key = _version_key(time_key, peripheral_component_id, data_point_type_id)
+            cache.set(key, uuid.uuid4().hex, None)
+
+
+def invalidate_data_points(data_points: Iterable):
+    """Drop the cached buckets of the series of newly stored data points, if needed."""
+
+    earliest: Dict[Tuple[str, str], datetime] = {}
+    for data_point in data_points:
+        series = (
+            str(data_point.peripheral_component_id),
+            str(data_point.data_point_type_id),
+        )
+        if series not in earliest or data_point.time < earliest[series]:
+            earliest[series] = data_point.time
+    for (peripheral_component_id, data_point_type_id), time in earliest.items():
+        invalidate_series(peripheral_component_id, data_point_type_id, time)
+
+
+def _to_datetime(time: Union[date, datetime]) -> datetime:
+    if isinstance(time, datetime):
+        return time
+    return datetime(time.year, time.month, time.day, tzinfo=timezone.utc)
+
+
+def _from_datetime(time_key: str, time: Optional[datetime]) -> Time:
+    return time.date() if time and time_key == "day" else time
+
+
+def _block_key(
+    time_key: str, peripheral_component_id, data_point_type_id, version: str, start, end
+) -> str:
+    return (
+        f"data-point-buckets-{time_key}-{peripheral_component_id}"
+        f"-{data_point_type_id}-{version}-{start.isoformat()}-{end.isoformat()}"
+    )
+
+
+def _closed_buckets(
+    time_key: str,
+    peripheral_component_id,
+    data_point_type_id,
+    start: Optional[datetime],
+    end: datetime,
+    ascending: bool,
+    limit: int,
+    aggregate: Aggregate,
+    closed_before: datetime,
+) -> List[Dict]:
+    """The closed buckets within [start, end), at most the limit, from the cached
+    blocks. Only the blocks needed for the limit without gaps are read, the rest of the
+    range is aggregated at once."""
+
+    bucket = BUCKETS[time_key]
+    block = bucket * BLOCK_BUCKETS[time_key]
+    max_blocks = -(-limit // BLOCK_BUCKETS[time_key]) + 1
+    if ascending:
+        if start is None:
+            # The first bucket of the series is unknown
+            return aggregate(None, _from_datetime(time_key, end), ascending, limit)
+        first_block = EPOCH + (start - EPOCH) // block * block
+        block_starts = [first_block + block * i for i in range(max_blocks)]
+        block_starts = [
+            block_start for block_start in block_starts if block_start < end
+        ]
+    else:
+        last_block = EPOCH + (end - timedelta(microseconds=1) - EPOCH) // block * block
+        block_starts = [last_block - block * i for i in range(max_blocks)]
+        block_starts = [
+            block_start
+            for block_start in block_starts
+            if start is None or block_start + block > start
+        ]
+
+    # Blocks are cached up to the open bucket, the last one only until it closes
+    version = get_version(time_key, peripheral_component_id, data_point_type_id)
+    keys = {
+        block_start: _block_key(
+            time_key,
+            peripheral_component_id,
+            data_point_type_id,
+            version,
+            block_start,
+            min(block_start + block, closed_before),
+        )
+        for block_start in block_starts
+    }
+    blocks = cache.get_many(keys.values())
+    for block_start, key in keys.items():
+        if key in blocks:
+            continue
+        block_end = min(block_start + block, closed_before)
+        blocks[key] = aggregate(
+            _from_datetime(time_key, block_start),
+            _from_datetime(time_key, block_end),
+            True,
+            BLOCK_BUCKETS[time_key],
+        )
+        timeout = settings.DATA_POINT_BUCKET_CACHE_TIMEOUT
+        if block_end < block_start + block:
+            timeout = min(timeout, int(bucket.total_seconds()))
+        cache.set(key, blocks[key], timeout)
+
+    rows: List[Dict] = []
+    for block_start in block_starts:
+        block_rows = [
+            row
+            for row in blocks[keys[block_start]]
+            if (start is None or _to_datetime(row[time_key]) >= start)
+            and _to_datetime(row[time_key]) < end
+        ]
+        rows.extend(block_rows if ascending else reversed(block_rows))
+        if len(rows) >= limit:
+            return rows[:limit]
+
+    # Aggregate the rest of the range, e.g., after long gaps
+    if not block_starts:
+        rest = (start, end)
+    elif ascending:
+        rest = (block_starts[-1] + block, end)
+    else:
+        rest = (start, block_starts[-1])
+    if (rest[0] is None or rest[0] < rest[1]) and len(rows) < limit:
+        rows += aggregate(
+            _from_datetime(time_key, rest[0]),
+            _from_datetime(time_key, rest[1]),
+            ascending,
+            limit - len(rows),
+        )
+    return rows
+
+
+def cached_buckets(
+    time_key: str,
+    peripheral_component_id,
+    data_point_type_id,
+    from_time: Time,
+    before_time: Time,
+    ascending: bool,
+    limit: int,
+    aggregate: Aggregate,
+) -> List[Dict]:
+    """The buckets of the series within [from_time, before_time), at most the limit,
+    in the given order. aggregate(from_time, before_time, ascending, limit) returns the
+    buckets of a range. The closed buckets are cached, only the open one is aggregated
+    for every call. Days are given as dates."""
+
+    if not settings.DATA_POINT_BUCKET_CACHE_TIMEOUT:
+        return aggregate(from_time, before_time, ascending, limit)
+    closed_before = get_closed_before(BUCKETS[time_key])
+    start = _to_datetime(from_time) if from_time else None
+    end = _to_datetime(before_time) if before_time else None
+
+    open_rows: List[Dict] = []
+    closed_until = end
+    if end is None or end > closed_before:
+        open_from = max(start, closed_before) if start else closed_before
+        open_rows = aggregate(
+            _from_datetime(time_key, open_from), before_time, ascending, limit
+        )
+        closed_until = closed_before
+    if start and start >= closed_until:
+        return open_rows[:limit]
+    if not ascending and len(open_rows) >= limit:
+        return open_rows[:limit]
+
+    closed_rows = _closed_buckets(
+        time_key,
+        peripheral_component_id,
+        data_point_type_id,
+        start,
+        closed_until,
+        ascending,
+        limit if ascending else limit - len(open_rows),
+        aggregate,
+        closed_before,
+    )
+    if ascending:
+        return (closed_rows + open_rows)[:limit]
+    return (open_rows + closed_rows)[:limit]
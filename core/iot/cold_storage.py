@@ -0,0 +1,274 @@
+"""Cold storage of old data points as Parquet objects.
+
+Chunks of the data point hypertable older than the archive age are exported to one
+Parquet object per peripheral component and dropped from the database. The objects
+are partitioned Hive style by peripheral component and year, e.g.,
+data_points/peripheral_component=<uuid>/year=2021/_hyper_1_2_chunk.parquet
+
+Archived chunks are always older than the chunks left in the database, so queries
+of historical ranges read the archive first and the database afterwards. Queries that
+only read the database reject ranges reaching into the archive, see archived_until()."""
+
+import io
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Dict, List, Optional, Union
+from uuid import UUID
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from accounts.models import User
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import Storage, get_storage_class
+from django.db import transaction
+from django.db.models import Max, QuerySet
+
+from iot.arrow import EPOCH_US_SQL, TIME_TYPE, copy_to_record_batches
+from iot.models import DataPoint, DataPointArchive
+from iot.timescale import Chunk, drop_chunk, get_chunks
+
+ARCHIVE_PREFIX = "data_points"
+COPY_SCHEMA = pa.schema(
+    [
+        ("peripheral_component", pa.string()),
+        ("data_point_type", pa.string()),
+        ("time", TIME_TYPE),
+        ("value", pa.float64()),
+    ]
+)
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+# TimescaleDB's time_bucket() aligns the buckets to this Monday
+BUCKET_ORIGIN = datetime(2000, 1, 3, tzinfo=timezone.utc)
+
+
+def get_archive_storage() -> Storage:
+    """The storage of the Parquet objects, MinIO by default."""
+
+    return get_storage_class(settings.DATA_POINT_ARCHIVE_STORAGE)()
+
+
+def to_archive_path(peripheral_component_id: str, chunk: Chunk) -> str:
+    """The object path of a peripheral component's data points within a chunk."""
+
+    chunk_name = chunk.name.split(".")[-1].strip('"')
+    return (
+        f"{ARCHIVE_PREFIX}/peripheral_component={peripheral_component_id}"
+        f"/year={chunk.range_start.year}/{chunk_name}.parquet"
+    )
+
+
+def archive_chunk(chunk: Chunk, storage: Storage) -> List[DataPointArchive]:
+    """Write the data points of the chunk to Parquet objects, one per peripheral
+    component, and record them. The chunk itself is left untouched."""
+
+    time_sql = EPOCH_US_SQL.format(time="time")
+    query = (
+        f"SELECT peripheral_component_id, data_point_type_id, {time_sql}, value"
+        f" FROM {DataPoint._meta.db_table} WHERE time >= %s AND time < %s"
+        " ORDER BY peripheral_component_id, time"
+    )
+    batches = copy_to_record_batches(
+        query, [chunk.range_start, chunk.range_end], COPY_SCHEMA
+    )
+    if not batches:
+        return []
+    table = pa.Table.from_batches(batches)
+
+    archives = []
+    peripheral_components = table.column("peripheral_component")
+    for peripheral_component_id in pc.unique(peripheral_components).to_pylist():
+        rows = table.filter(
+            pc.equal(peripheral_components, pa.scalar(peripheral_component_id))
+        ).drop(["peripheral_component"])
+        buffer = io.BytesIO()
+        pq.write_table(rows, buffer)
+        path = to_archive_path(peripheral_component_id, chunk)
+        # A previous, failed archival may have left the object behind
+        if storage.exists(path):
+            storage.delete(path)
+        storage.save(path, ContentFile(buffer.getvalue()))
+        times = rows.column("time")
+        archives.append(
+            DataPointArchive(
+                peripheral_component_id=peripheral_component_id,
+                path=path,
+                start_time=times[0].as_py(),
+                end_time=times[-1].as_py(),
+                row_count=rows.num_rows,
+            )
+        )
+    return DataPointArchive.objects.bulk_create(archives)
+
+
+def archive_data_points(older_than: datetime) -> int:
+    """Move the chunks that only hold data points older than the given time to cold
+    storage and drop them. Returns the number of archived data points."""
+
+    storage = get_archive_storage()
+    archived = 0
+    for chunk in get_chunks(end=older_than):
+        if chunk.range_end > older_than:
+            continue
+        with transaction.atomic():
+            archives = archive_chunk(chunk, storage)
+            drop_chunk(chunk)
+        archived += sum(archive.row_count for archive in archives)
+    return archived
+
+
+def archived_until(archives: Optional[QuerySet] = None) -> Optional[datetime]:
+    """The time of the last archived data point of the archives, all by default, or
+    None if nothing was archived. Older data points are no longer in the database."""
+
+    if archives is None:
+        archives = DataPointArchive.objects.all()
+    return archives.aggregate(end_time=Max("end_time"))["end_time"]
+
+
+def to_datetime(value: Union[date, datetime, None]) -> Optional[datetime]:
+    """Convert dates to the start of the day in UTC."""
+
+    if isinstance(value, date) and not isinstance(value, datetime):
+        return datetime.combine(value, time(), tzinfo=timezone.utc)
+    return value
+
+
+def read_archived_data_points(
+    peripheral_component_id: UUID,
+    data_point_type_id: UUID,
+    from_time: Union[date, datetime, None] = None,
+    before_time: Union[date, datetime, None] = None,
+    owner: Optional[User] = None,
+) -> pa.Table:
+    """Read the archived data points of a series within [from_time, before_time) as a
+    table with the columns time and value, ordered by time. If an owner is given, only
+    their peripheral components are read."""
+
+    from_time = to_datetime(from_time)
+    before_time = to_datetime(before_time)
+    archives = DataPointArchive.objects.filter(
+        peripheral_component_id=peripheral_component_id
+    )
+    if owner:
+        archives = archives.filter(peripheral_component__site_entity__site__owner=owner)
+    if from_time:
+        archives = archives.filter(end_time__gte=from_time)
+    if before_time:
+        archives = archives.filter(start_time__lt=before_time)
+
+    tables = []
+    storage = None
+    for path in archives.values_list("path", flat=True):
+        storage = storage or get_archive_storage()
+        with storage.open(path) as file:
+            table = pq.read_table(
+                file,
+                columns=["time", "value"],
+                filters=[("data_point_type", "=", str(data_point_type_id))],
+            )
+        times = table.column("time")
+        if from_time:
+            table = table.filter(
+                pc.greater_equal(times, pa.scalar(from_time, TIME_TYPE))
+            )
+            times = table.column("time")
+        if before_time:
+            table = table.filter(pc.less(times, pa.scalar(before_time, TIME_TYPE)))
+        tables.append(table)
+    if not tables:
+        return pa.table(
+            {
+                "time": pa.array([], TIME_TYPE),
+                "value": pa.array([], pa.float64()),
+            }
+        )
+    return pa.concat_tables(tables)
+
+
+def aggregate_arrays(
+    times: np.ndarray, values: np.ndarray, bucket: timedelta
+) -> Dict[str, np.ndarray]:
+    """Aggregate data points, given as times in µs since the epoch and values, by time
+    buckets aligned the same as time_bucket(). Returns the bucket start in µs since the
+    epoch with the avg, min, max and count of each bucket, ordered by time. The arrays
+    must not be empty."""
+
+    bucket_us = bucket // timedelta(microseconds=1)
+    origin_us = (BUCKET_ORIGIN - EPOCH) // timedelta(microseconds=1)
+    buckets = (times - origin_us) // bucket_us * bucket_us + origin_us
+    order = np.argsort(buckets, kind="stable")
+    buckets, values = buckets[order], values[order]
+
+    starts, indices = np.unique(buckets, return_index=True)
+    count = np.diff(np.append(indices, len(buckets)))
+    return {
+        "time": starts,
+        "avg": np.add.reduceat(values, indices) / count,
+        "min": np.minimum.reduceat(values, indices),
+        "max": np.maximum.reduceat(values, indices),
+        "count": count,
+    }
+
+
+def aggregate_buckets(table: pa.Table, bucket: timedelta) -> Dict[str, np.ndarray]:
+    """Aggregate a table of data points by time buckets, see aggregate_arrays(). The
+    table must not be empty."""
+
+    return aggregate_arrays(
+        table.column("time").cast(pa.int64()).to_numpy(),
+        table.column("value").to_numpy(),
+        bucket,
+    )
+
+
+def to_bucket_rows(aggregates: Dict[str, np.ndarray], time_key: str) -> List[Dict]:
+    """Convert aggregated buckets to rows like the ones of DataPoint.objects.by_day()
+    and by_hour(), with the bucket start stored under the time key."""
+
+    return [
+        {
+            time_key: EPOCH + timedelta(microseconds=int(start)),
+            "avg": float(avg),
+            "min": float(min_value),
+            "max": float(max_value),
+        }
+        for start, avg, min_value, max_value in zip(
+            aggregates["time"], aggregates["avg"], aggregates["min"], aggregates["max"]
+        )
+    ]
+
+
+def archived_buckets(
+    peripheral_component_id: UUID,
+    data_point_type_id: UUID,
+    bucket: timedelta,
+    time_key: str,
+    from_time: Union[date, datetime, None] = None,
+    before_time: Union[date, datetime, None] = None,
+    owner: Optional[User] = None,
+) -> List[Dict]:
+    """The archived data points aggregated by bucket in ascending order. The rows match
+    the ones of DataPoint.objects.by_day() and by_hour(), with the bucket start stored
+    under the time key."""
+
+    table = read_archived_data_points(
+        peripheral_component_id, data_point_type_id, from_time, before_time, owner
+    )
+    if not table.num_rows:
+        return []
+    return to_bucket_rows(aggregate_buckets(table, bucket), time_key)
+
+
+def merge_archived_buckets(
+    rows: List[Dict], archived_rows: List[Dict], ascending: bool, limit: int
+) -> List[Dict]:
+    """Combine the buckets of the database with the older, archived ones. No data
+    points are merged into the database at or before the last archived data point of
+    a peripheral, see merge_staged_data_points(), so only the bucket of that data
+    point may be returned twice."""
+
+    if ascending:
+        return (archived_rows + rows)[:limit]
+    return (rows + archived_rows[::-1])[:limit]
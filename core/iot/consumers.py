@@ -1,15 +1,17 @@
-import json
-
 import channels_graphql_ws
 from channels.generic.websocket import WebsocketConsumer
 
+from iot import bucket_cache, hot_series
 from iot.serializers import ControllerMessageSerializer
 from iot.models import (
     ControllerMessage,
     ControllerTask,
     DataPoint,
+    DataPointBackfill,
     PeripheralComponent,
 )
+from core import json_codec
+from core.query_cost import QueryCostMiddleware
 from core.schema import schema as graphql_schema
 
 
@@ -56,7 +58,17 @@ class ControllerConsumer(WebsocketConsumer):
         # Handle the different message types
         try:
             if data := message.to_telemetry():
-                DataPoint.objects.from_telemetry(data)
+                # Route late telemetry away from the possibly compressed chunks
+                if DataPointBackfill.objects.is_late(data):
+                    staged = DataPointBackfill.objects.from_telemetry(data)
+                    hot_series.exclude_data_points(staged)
+                else:
+                    data_points = DataPoint.objects.from_telemetry(data)
+                    hot_series.append_data_points(data_points)
+                    bucket_cache.invalidate_data_points(data_points)
+            elif data := message.to_backfill():
+                staged = DataPointBackfill.objects.from_telemetry(data)
+                hot_series.exclude_data_points(staged)
             elif data := message.to_errors():
                 self.handle_errors(data)
             elif message.is_register_type():
@@ -89,15 +101,17 @@ class ControllerConsumer(WebsocketConsumer):
 
         if errors := event.get("errors", ""):
             # print(f"Disconnect errors: {errors}")
-            self.send(json.dumps({"errors": errors}))
+            self.send(json_codec.dumps({"errors": errors}))
         self.close()
 
     def receive(self, text_data=None, bytes_data=None):
         try:
-            data = json.loads(text_data)
-            self.handle_message(data, self.scope["controller"].pk)
-        except json.decoder.JSONDecodeError:
+            data = json_codec.loads(text_data)
+        except ValueError:
             self.disconnect_controller({"errors": "Invalid JSON data"})
+            return
+        try:
+            self.handle_message(data, self.scope["controller"].pk)
         except self.InvalidData as err:
             self.disconnect_controller({"errors": str(err.args)})
 
@@ -107,7 +121,7 @@ class ControllerConsumer(WebsocketConsumer):
         request = ControllerMessage.to_command_message(
             peripheral_commands=message["commands"], request_id=message["request_id"]
         )
-        self.send(json.dumps(request))
+        self.send(json_codec.dumps(request))
 
     def send_controller_task_commands(self, message):
         """Send task commands to the controller"""
@@ -115,13 +129,23 @@ class ControllerConsumer(WebsocketConsumer):
         request = ControllerMessage.to_command_message(
             task_commands=message["commands"], request_id=message["request_id"]
         )
-        self.send(json.dumps(request))
+        self.send(json_codec.dumps(request))
 
 
 class GraphqlConsumer(channels_graphql_ws.GraphqlWsConsumer):
     """Channels WebSocket consumer which provides GraphQL API."""
+
     schema = graphql_schema
-    
+    middleware = [QueryCostMiddleware()]
+
+    @classmethod
+    async def decode_json(cls, text_data):
+        return json_codec.loads(text_data)
+
+    @classmethod
+    async def encode_json(cls, content):
+        return json_codec.dumps(content)
+
     async def connect(self):
         """If the user is not authenticated, close the connection."""
         if not self.scope["user"].is_authenticated:
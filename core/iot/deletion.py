@@ -0,0 +1,143 @@
+"""Background deletion of sites and controllers with all their time series.
+
+Deleting a site with the ORM cascades to all data points and messages of its
+peripherals and controllers in a single transaction, which blocks the request and
+locks the hypertable chunks for as long as it runs. Instead, the site or controller is
+detached from its owner right away and a task clears the data points chunk by chunk,
+dropping the chunks that only hold data points of the deleted peripherals and skipping
+the ones without any. The remaining rows are deleted in batches, before the ORM deletes
+what is left."""
+
+from typing import Iterator, List
+
+from django.db import connection, transaction
+from django.db.models import Q, QuerySet
+
+from iot.cold_storage import get_archive_storage
+from iot.models import (
+    ControllerMessage,
+    DataPointArchive,
+    DataPointBackfill,
+    DeletionJob,
+    PeripheralComponent,
+)
+from iot.timescale import (
+    Chunk,
+    compress_chunks,
+    decompress_chunks,
+    drop_chunk,
+    get_chunks,
+)
+
+BATCH_SIZE = 10000
+
+
+def get_peripheral_component_ids(job: DeletionJob) -> List[str]:
+    """The peripheral components of the site and of the controllers on the site."""
+
+    peripheral_components = PeripheralComponent.objects.filter(
+        Q(site_entity__site=job.site)
+        | Q(controller_component__site_entity__site=job.site)
+    )
+    return [str(pk) for pk in peripheral_components.values_list("pk", flat=True)]
+
+
+def delete_chunk_data_points(chunk: Chunk, peripheral_component_ids: List[str]) -> int:
+    """Delete the data points of the peripheral components within the chunk in a single
+    transaction. If the chunk holds no other data points, it is dropped instead, and
+    chunks without data points of the peripheral components are left untouched.
+    Returns the number of deleted data points."""
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Block inserts until the end of the transaction, so no data point written
+        # after the checks is dropped with the chunk
+        cursor.execute(f"LOCK TABLE {chunk.name} IN SHARE ROW EXCLUSIVE MODE")
+        cursor.execute(
+            f"SELECT EXISTS (SELECT FROM {chunk.name}"
+            " WHERE peripheral_component_id = ANY(%s::uuid[]))",
+            [peripheral_component_ids],
+        )
+        if not cursor.fetchone()[0]:
+            return 0
+        cursor.execute(
+            f"SELECT EXISTS (SELECT FROM {chunk.name}"
+            " WHERE peripheral_component_id <> ALL(%s::uuid[]))",
+            [peripheral_component_ids],
+        )
+        if not cursor.fetchone()[0]:
+            cursor.execute(f"SELECT count(*) FROM {chunk.name}")
+            deleted = cursor.fetchone()[0]
+            drop_chunk(chunk)
+            return deleted
+
+        decompressed = decompress_chunks([chunk])
+        cursor.execute(
+            f"DELETE FROM {chunk.name} WHERE peripheral_component_id = ANY(%s::uuid[])",
+            [peripheral_component_ids],
+        )
+        deleted = cursor.rowcount
+        compress_chunks(chunk.name for chunk in decompressed)
+    return deleted
+
+
+def delete_in_batches(
+    queryset: QuerySet, batch_size: int = BATCH_SIZE
+) -> Iterator[int]:
+    """Delete the rows of the query set in batches, each in its own transaction, and
+    yield the number of rows deleted per batch."""
+
+    while pks := list(queryset.values_list("pk", flat=True)[:batch_size]):
+        deleted, _ = queryset.model.objects.filter(pk__in=pks).delete()
+        yield deleted
+
+
+def run_deletion_job(job: DeletionJob):
+    """Delete the time series of the job's site and then the site itself, recording
+    the progress on the job. Failed jobs can be run again."""
+
+    if job.site_id is None:
+        job.state = DeletionJob.State.DONE
+        job.save(update_fields=["state", "modified_at"])
+        return
+
+    peripheral_component_ids = get_peripheral_component_ids(job)
+    chunks = get_chunks() if peripheral_component_ids else []
+    job.state = DeletionJob.State.RUNNING
+    job.chunks_total = len(chunks)
+    job.chunks_done = 0
+    job.save(update_fields=["state", "chunks_total", "chunks_done", "modified_at"])
+
+    # Staged data points first, so no merge writes them to the cleared chunks
+    backfill = DataPointBackfill.objects.filter(
+        peripheral_component_id__in=peripheral_component_ids
+    )
+    for deleted in delete_in_batches(backfill):
+        job.deleted_data_points += deleted
+    for chunk in chunks:
+        job.deleted_data_points += delete_chunk_data_points(
+            chunk, peripheral_component_ids
+        )
+        job.chunks_done += 1
+        job.save(update_fields=["chunks_done", "deleted_data_points", "modified_at"])
+
+    messages = ControllerMessage.objects.filter(
+        controller__site_entity__site=job.site_id
+    )
+    for deleted in delete_in_batches(messages):
+        job.deleted_messages += deleted
+        job.save(update_fields=["deleted_messages", "modified_at"])
+
+    storage = None
+    archives = DataPointArchive.objects.filter(
+        peripheral_component_id__in=peripheral_component_ids
+    )
+    for archive in archives.iterator():
+        storage = storage or get_archive_storage()
+        storage.delete(archive.path)
+        archive.delete()
+        job.deleted_data_points += archive.row_count
+
+    # Only the sites, entities, components and tasks are left to delete
+    job.site.delete()
+    job.state = DeletionJob.State.DONE
+    job.save(update_fields=["state", "deleted_data_points", "modified_at"])
@@ -1,3 +1,5 @@
+from datetime import date, datetime, timedelta, timezone
+
 import graphene
 from django.conf import settings
 from django.db.models import Q
@@ -5,7 +7,22 @@ from django_filters import BooleanFilter, FilterSet, OrderingFilter
 from graphene import Date, Float, List, ObjectType, String, relay
 from graphene.types.datetime import DateTime
 from graphene_django import DjangoObjectType
+from graphene_django.settings import graphene_settings
+from graphql import GraphQLError
 from graphql_relay.node.node import from_global_id
+from graphql_relay.utils import base64, unbase64
+
+from core.dataloaders import get_loader, resolve_related
+from core.keyset import KeysetConnectionField
+from core.query_optimizer import OptimizedConnectionField
+from iot import analysis, bucket_cache, hot_series, sparklines
+from iot.access import (
+    can_access_peripheral_component,
+    can_access_site,
+    filter_by_site,
+    filter_by_site_entity,
+)
+from iot.cold_storage import archived_buckets, archived_until, merge_archived_buckets
 
 from iot.models import (
     ControllerComponent,
@@ -13,6 +30,7 @@ from iot.models import (
     ControllerMessage,
     ControllerTask,
     DataPoint,
+    DataPointArchive,
     DataPointType,
     PeripheralComponent,
     PeripheralDataPointType,
@@ -85,7 +103,13 @@ class SiteEntityNode(DjangoObjectType):
 
     @classmethod
     def get_queryset(cls, queryset, info):
-        return queryset.filter(site__owner=info.context.user)
+        return filter_by_site(queryset, info)
+
+    resolve_site = resolve_related("site")
+
+    # Batch the lookups of each registered component type
+    for component in settings.SITE_ENTITY_COMPONENTS:
+        locals()[f"resolve_{component}"] = resolve_related(component)
 
 
 class ControllerComponentNode(DjangoObjectType):
@@ -108,9 +132,16 @@ class ControllerComponentNode(DjangoObjectType):
         )
         interfaces = (relay.Node,)
 
+    peripheral_component_set = OptimizedConnectionField(
+        lambda: PeripheralComponentNode, required=True
+    )
+
     @classmethod
     def get_queryset(cls, queryset, info):
-        return queryset.filter(site_entity__site__owner=info.context.user)
+        return filter_by_site_entity(queryset, info)
+
+    resolve_site_entity = resolve_related("site_entity")
+    resolve_component_type = resolve_related("component_type")
 
 
 class ControllerComponentTypeNode(DjangoObjectType):
@@ -164,10 +195,12 @@ class ControllerTaskNode(DjangoObjectType):
 
     @classmethod
     def get_queryset(cls, queryset, info):
-        return queryset.filter(
-            controller_component__site_entity__site__owner=info.context.user
+        return filter_by_site_entity(
+            queryset, info, "controller_component__site_entity"
         )
 
+    resolve_controller_component = resolve_related("controller_component")
+
 
 class ControllerTaskEnumNode(ObjectType):
     states = List(TextChoice)
@@ -197,12 +230,15 @@ class ControllerMessageNode(DjangoObjectType):
             "request_id": ["exact"],
         }
         fields = ("controller", "message", "request_id", "message_type", "created_at")
+        interfaces = (relay.Node,)
 
     message_type = graphene.String(description="The message type.")
 
     @classmethod
     def get_queryset(cls, queryset, info):
-        return queryset.filter(controller__site_entity__site__owner=info.context.user)
+        return filter_by_site_entity(queryset, info, "controller__site_entity")
+
+    resolve_controller = resolve_related("controller")
 
     @staticmethod
     def resolve_type(controller_message, _):
@@ -217,6 +253,18 @@ class ControllerMessageEnumNode(ObjectType):
         return [TextChoice(value=i, label=i) for i in ControllerMessage.TYPES]
 
 
+class SparklineNode(ObjectType):
+    """The bucket averages of a data point type of a peripheral, oldest first. Buckets
+    without data points are null."""
+
+    data_point_type = graphene.Field(lambda: DataPointTypeNode)
+    values = List(Float)
+
+    @staticmethod
+    def resolve_data_point_type(sparkline, info):
+        return get_loader(info, DataPointType).load(sparkline["data_point_type_id"])
+
+
 class PeripheralComponentNode(DjangoObjectType):
     class Meta:
         model = PeripheralComponent
@@ -246,13 +294,23 @@ class PeripheralComponentNode(DjangoObjectType):
         convert_choices_to_enum = False
         interfaces = (relay.Node,)
 
+    data_point_type_set = OptimizedConnectionField(
+        lambda: DataPointTypeNode, required=True
+    )
+    data_point_set = KeysetConnectionField(lambda: DataPointNode, required=True)
     parameters = graphene.JSONString(
         description="Combines other parameters and data point types to create controller commands."
     )
+    sparkline = List(
+        SparklineNode,
+        hours=graphene.Int(default_value=24),
+        points=graphene.Int(default_value=24),
+        description="The trend of each data point type over the last hours.",
+    )
 
     @classmethod
     def get_queryset(cls, queryset, info):
-        return queryset.filter(site_entity__site__owner=info.context.user)
+        return filter_by_site_entity(queryset, info)
 
     @staticmethod
     def resolve_parameters(peripheral_component, _):
@@ -260,6 +318,24 @@ class PeripheralComponentNode(DjangoObjectType):
 
         return peripheral_component.parameters
 
+    @staticmethod
+    def resolve_sparkline(peripheral_component, info, hours, points):
+        """Batch the sparklines of all peripherals of the operation."""
+
+        if not 0 < hours <= sparklines.MAX_HOURS:
+            raise GraphQLError(
+                f"The hours have to be between 1 and {sparklines.MAX_HOURS}"
+            )
+        if not 0 < points <= sparklines.MAX_POINTS:
+            raise GraphQLError(
+                f"The points have to be between 1 and {sparklines.MAX_POINTS}"
+            )
+        loader = sparklines.get_sparkline_loader(info, hours, points)
+        return loader.load(peripheral_component.pk)
+
+    resolve_site_entity = resolve_related("site_entity")
+    resolve_controller_component = resolve_related("controller_component")
+
 
 class PeripheralComponentEnumNode(ObjectType):
     states = List(TextChoice)
@@ -286,6 +362,9 @@ class PeripheralDataPointTypeNode(DjangoObjectType):
         filter_fields = ["data_point_type", "peripheral", "parameter_prefix"]
         fields = ("data_point_type", "peripheral", "parameter_prefix")
 
+    resolve_data_point_type = resolve_related("data_point_type")
+    resolve_peripheral = resolve_related("peripheral")
+
 
 class DataPointTypeNode(DjangoObjectType):
     class Meta:
@@ -305,6 +384,11 @@ class DataPointTypeNode(DjangoObjectType):
         )
         interfaces = (relay.Node,)
 
+    peripheral_component_set = OptimizedConnectionField(
+        PeripheralComponentNode, required=True
+    )
+    data_point_set = KeysetConnectionField(lambda: DataPointNode, required=True)
+
     @classmethod
     def get_queryset(cls, queryset, info):
         """Limit results to those create by themselves and global ones."""
@@ -328,19 +412,239 @@ class DataPointFilter(FilterSet):
     order_by = OrderingFilter(fields=("time",))
 
 
+class DataPointConnection(relay.Connection):
+    """Data points in the database. Older ones were moved to cold storage."""
+
+    class Meta:
+        abstract = True
+
+    archived_until = DateTime(
+        description="The time of the last archived data point of the user's"
+        " peripherals. The connection does not list it or older data points."
+    )
+
+    @staticmethod
+    def resolve_archived_until(connection, info):
+        return archived_until(
+            filter_by_site_entity(
+                DataPointArchive.objects.all(),
+                info,
+                "peripheral_component__site_entity",
+            )
+        )
+
+
 class DataPointNode(DjangoObjectType):
     class Meta:
         model = DataPoint
         filterset_class = DataPointFilter
         interfaces = (relay.Node,)
+        connection_class = DataPointConnection
 
     @classmethod
     def get_queryset(cls, queryset, info):
         """Limit results to the site owner."""
-        return queryset.filter(
-            peripheral_component__site_entity__site__owner=info.context.user
+        return filter_by_site_entity(
+            queryset, info, "peripheral_component__site_entity"
         )
 
+    resolve_peripheral_component = resolve_related("peripheral_component")
+    resolve_data_point_type = resolve_related("data_point_type")
+
+
+def get_hot_buckets(
+    info,
+    peripheral_component_id,
+    data_point_type_id,
+    bucket: timedelta,
+    time_key: str,
+    from_time=None,
+    before_time=None,
+):
+    """Aggregate the recent buckets of a series of the user from its ring buffer, see
+    hot_series.hot_buckets()."""
+
+    if not hot_series.get_store():
+        return None, []
+    if not can_access_peripheral_component(info, peripheral_component_id):
+        return None, []
+    return hot_series.hot_buckets(
+        peripheral_component_id,
+        data_point_type_id,
+        bucket,
+        time_key,
+        from_time,
+        before_time,
+    )
+
+
+def get_stored_buckets(
+    info,
+    peripheral_component_id,
+    data_point_type_id,
+    time_key: str,
+    from_time=None,
+    before_time=None,
+    ascending=False,
+    limit=100,
+):
+    """Aggregate the buckets of a series of the user from the database and cold
+    storage, at most the limit. The closed buckets are served from the bucket cache."""
+
+    if not can_access_peripheral_component(info, peripheral_component_id):
+        return []
+    bucket = bucket_cache.BUCKETS[time_key]
+    by_bucket = (
+        DataPoint.objects.by_day if time_key == "day" else DataPoint.objects.by_hour
+    )
+
+    def aggregate(from_bucket, before_bucket, ascending, limit):
+        data_points = list(
+            by_bucket(
+                peripheral_component_id,
+                data_point_type_id,
+                from_bucket,
+                before_bucket,
+                ascending,
+            )[:limit]
+        )
+        # Add the buckets of data points that were moved to cold storage
+        if len(data_points) < limit or ascending:
+            archived = archived_buckets(
+                peripheral_component_id,
+                data_point_type_id,
+                bucket,
+                time_key,
+                from_bucket,
+                before_bucket,
+                owner=info.context.user,
+            )
+            data_points = merge_archived_buckets(
+                data_points, archived, ascending, limit
+            )
+        return data_points
+
+    return bucket_cache.cached_buckets(
+        time_key,
+        peripheral_component_id,
+        data_point_type_id,
+        from_time,
+        before_time,
+        ascending,
+        limit,
+        aggregate,
+    )
+
+
+BUCKET_CURSOR_PREFIX = "bucket:"
+
+
+def to_bucket_start(row, time_key: str):
+    """The start of the row's bucket, a date for days."""
+
+    time = row[time_key]
+    if time_key == "day" and isinstance(time, datetime):
+        return time.date()
+    return time
+
+
+def encode_bucket_cursor(start) -> str:
+    return base64(BUCKET_CURSOR_PREFIX + start.isoformat())
+
+
+def decode_bucket_cursor(cursor: str, time_key: str):
+    """The bucket start of the cursor, a date for days. Raises a GraphQLError for
+    invalid cursors."""
+
+    try:
+        value = unbase64(cursor)
+        if not value.startswith(BUCKET_CURSOR_PREFIX):
+            raise ValueError(value)
+        value = value[len(BUCKET_CURSOR_PREFIX) :]
+        if time_key == "day":
+            return date.fromisoformat(value)
+        start = datetime.fromisoformat(value)
+        if start.tzinfo is None:
+            raise ValueError(value)
+        return start
+    except (ValueError, TypeError):
+        raise GraphQLError(f"Invalid cursor: {cursor}")
+
+
+def resolve_buckets(connection, info, kwargs, time_key: str, range_keys):
+    """Resolve a page of the buckets of a series, newest first unless ascending. The
+    cursor of a bucket is its start, so the next page is aggregated from the range
+    after it and only the rows of the page, and one more to tell whether there is a
+    next page, are fetched."""
+
+    peripheral_component_id = from_global_id(kwargs["peripheral_component"])[1]
+    data_point_type_id = from_global_id(kwargs["data_point_type"])[1]
+    from_time, before_time = (kwargs.get(key) for key in range_keys)
+    ascending = kwargs.get("ascending")
+    max_limit = graphene_settings.RELAY_CONNECTION_MAX_LIMIT
+    first = kwargs.get("first")
+    if first is None:
+        first = max_limit
+    if not 0 < first <= max_limit:
+        raise GraphQLError(f"first has to be between 1 and {max_limit}")
+    bucket = bucket_cache.BUCKETS[time_key]
+
+    after = kwargs.get("after")
+    if after:
+        start = decode_bucket_cursor(after, time_key)
+        if ascending:
+            start += bucket
+            from_time = max(from_time, start) if from_time else start
+        else:
+            before_time = min(before_time, start) if before_time else start
+
+    # The recent buckets are aggregated from the series' ring buffer
+    limit = first + 1
+    hot_start, hot_rows = get_hot_buckets(
+        info,
+        peripheral_component_id,
+        data_point_type_id,
+        bucket,
+        time_key,
+        from_time,
+        before_time,
+    )
+    rows = None
+    if hot_start:
+        before_time = hot_start.date() if time_key == "day" else hot_start
+        if (from_time and from_time >= before_time) or (
+            len(hot_rows) >= limit and not ascending
+        ):
+            rows = hot_series.merge_hot_buckets([], hot_rows, ascending, limit)
+    if rows is None:
+        data_points = get_stored_buckets(
+            info,
+            peripheral_component_id,
+            data_point_type_id,
+            time_key,
+            from_time,
+            before_time,
+            ascending,
+            limit,
+        )
+        rows = hot_series.merge_hot_buckets(data_points, hot_rows, ascending, limit)
+
+    edges = [
+        connection.Edge(
+            node=row, cursor=encode_bucket_cursor(to_bucket_start(row, time_key))
+        )
+        for row in rows[:first]
+    ]
+    return connection(
+        edges=edges,
+        page_info=relay.PageInfo(
+            start_cursor=edges[0].cursor if edges else None,
+            end_cursor=edges[-1].cursor if edges else None,
+            has_previous_page=bool(after),
+            has_next_page=len(rows) > first,
+        ),
+    )
+
 
 class DataPointByDayNode(ObjectType):
     """Aggregates data points by day for a given peripheral and data point type."""
@@ -352,31 +656,29 @@ class DataPointByDayNode(ObjectType):
 
     @classmethod
     def resolve(cls, parent, info, **kwargs):
-        peripheral_component_id = from_global_id(kwargs["peripheral_component"])[1]
-        data_point_type_id = from_global_id(kwargs["data_point_type"])[1]
-        data_points = DataPoint.objects.by_day(
-            peripheral_component_id,
-            data_point_type_id,
-            kwargs.get("from_date"),
-            kwargs.get("before_date"),
-            kwargs.get("ascending"),
+        return resolve_buckets(
+            DataPointByDayConnection, info, kwargs, "day", ("from_date", "before_date")
         )
-        return data_points.filter(
-            peripheral_component__site_entity__site__owner=info.context.user
-        )[:100]
 
     @classmethod
-    def as_list_field(cls) -> "graphene.List":
-        return graphene.List(
-            cls,
+    def as_connection_field(cls) -> graphene.Field:
+        return graphene.Field(
+            DataPointByDayConnection,
             peripheral_component=graphene.ID(required=True),
             data_point_type=graphene.ID(required=True),
             from_date=graphene.Date(),
             before_date=graphene.Date(),
             ascending=graphene.Boolean(required=False),
+            first=graphene.Int(),
+            after=graphene.String(),
         )
 
 
+class DataPointByDayConnection(relay.Connection):
+    class Meta:
+        node = DataPointByDayNode
+
+
 class DataPointByHourNode(ObjectType):
     """Aggregates data points by the hour for a given peripheral and data point type."""
 
@@ -385,28 +687,293 @@ class DataPointByHourNode(ObjectType):
     min = Float()
     max = Float()
 
+    @classmethod
+    def resolve(cls, parent, info, **kwargs):
+        return resolve_buckets(
+            DataPointByHourConnection,
+            info,
+            kwargs,
+            "time_hour",
+            ("from_time", "before_time"),
+        )
+
+    @classmethod
+    def as_connection_field(cls) -> graphene.Field:
+        return graphene.Field(
+            DataPointByHourConnection,
+            peripheral_component=graphene.ID(required=True),
+            data_point_type=graphene.ID(required=True),
+            from_time=graphene.DateTime(),
+            before_time=graphene.DateTime(),
+            ascending=graphene.Boolean(required=False),
+            first=graphene.Int(),
+            after=graphene.String(),
+        )
+
+
+class DataPointByHourConnection(relay.Connection):
+    class Meta:
+        node = DataPointByHourNode
+
+
+def get_time_range(kwargs, default: timedelta):
+    """The time range of the arguments, by default the given time until now."""
+
+    before_time = kwargs.get("before_time") or datetime.now(timezone.utc)
+    from_time = kwargs.get("from_time") or before_time - default
+    if from_time >= before_time:
+        raise GraphQLError("fromTime has to be before beforeTime")
+    return from_time, before_time
+
+
+def reject_archived_range(from_time, archives):
+    """Raise a GraphQLError if the range starts before the end of the archives, as
+    the query only reads the data points in the database."""
+
+    until = archived_until(archives)
+    if until and from_time <= until:
+        raise GraphQLError(
+            f"The range reaches into data points archived until {until.isoformat()},"
+            " which only dataPointsByDay, dataPointsByHour and the Arrow export read"
+        )
+
+
+class DataPointGapNode(ObjectType):
+    """An interval without data points of a peripheral."""
+
+    start = DateTime()
+    end = DateTime()
+    duration = Float(description="The duration in seconds.")
+
+    @staticmethod
+    def resolve_duration(gap, _):
+        return (gap["end"] - gap["start"]).total_seconds()
+
     @classmethod
     def resolve(cls, parent, info, **kwargs):
         peripheral_component_id = from_global_id(kwargs["peripheral_component"])[1]
-        data_point_type_id = from_global_id(kwargs["data_point_type"])[1]
-        data_points = DataPoint.objects.by_hour(
+        data_point_type_id = None
+        if kwargs.get("data_point_type"):
+            data_point_type_id = from_global_id(kwargs["data_point_type"])[1]
+        from_time, before_time = get_time_range(kwargs, timedelta(days=7))
+        bucket = timedelta(seconds=kwargs.get("bucket_seconds", 60))
+        min_gap = timedelta(seconds=kwargs.get("min_gap_seconds", 600))
+        if bucket < timedelta(seconds=1) or min_gap < bucket:
+            raise GraphQLError("The min gap has to be at least one bucket of 1 s")
+        if not can_access_peripheral_component(info, peripheral_component_id):
+            return []
+        reject_archived_range(
+            from_time,
+            DataPointArchive.objects.filter(
+                peripheral_component_id=peripheral_component_id
+            ),
+        )
+        return DataPoint.objects.gaps(
             peripheral_component_id,
-            data_point_type_id,
-            from_time=kwargs.get("from_time"),
-            before_time=kwargs.get("before_time"),
-            ascending=kwargs.get("ascending"),
+            from_time,
+            before_time,
+            data_point_type_id=data_point_type_id,
+            min_gap=min_gap,
+            bucket=bucket,
         )
-        return data_points.filter(
-            peripheral_component__site_entity__site__owner=info.context.user
-        )[:100]
 
     @classmethod
     def as_list_field(cls) -> graphene.List:
         return graphene.List(
             cls,
             peripheral_component=graphene.ID(required=True),
-            data_point_type=graphene.ID(required=True),
+            data_point_type=graphene.ID(),
             from_time=graphene.DateTime(),
             before_time=graphene.DateTime(),
-            ascending=graphene.Boolean(required=False),
+            min_gap_seconds=graphene.Int(),
+            bucket_seconds=graphene.Int(),
+        )
+
+
+class PeripheralAvailabilityNode(ObjectType):
+    """The share of time buckets in which a peripheral sent data points."""
+
+    peripheral_component = graphene.Field(PeripheralComponentNode)
+    availability = Float()
+    last_seen = DateTime()
+
+    @classmethod
+    def resolve(cls, parent, info, **kwargs):
+        site_id = from_global_id(kwargs["site"])[1]
+        from_time, before_time = get_time_range(kwargs, timedelta(days=1))
+        bucket = timedelta(seconds=kwargs.get("bucket_seconds", 600))
+        if bucket < timedelta(seconds=1):
+            raise GraphQLError("The bucket has to be at least 1 s")
+        if not can_access_site(info, site_id):
+            return []
+        reject_archived_range(
+            from_time,
+            DataPointArchive.objects.filter(
+                peripheral_component__site_entity__site_id=site_id
+            ),
+        )
+        return DataPoint.objects.availability(site_id, from_time, before_time, bucket)
+
+    @classmethod
+    def as_list_field(cls) -> graphene.List:
+        return graphene.List(
+            cls,
+            site=graphene.ID(required=True),
+            from_time=graphene.DateTime(),
+            before_time=graphene.DateTime(),
+            bucket_seconds=graphene.Int(),
+        )
+
+
+class LatestDataPointNode(ObjectType):
+    """The latest data point of a data point type of a peripheral, if any."""
+
+    data_point_type = graphene.Field(DataPointTypeNode)
+    time = DateTime()
+    value = Float()
+
+
+class PeripheralSnapshotNode(ObjectType):
+    """A peripheral with the latest data point of each of its data point types."""
+
+    peripheral_component = graphene.Field(PeripheralComponentNode)
+    latest_data_points = List(LatestDataPointNode)
+
+
+class SiteSnapshotNode(ObjectType):
+    """The current state of a site for its overview: all peripherals with their latest
+    values and the active controller tasks. Each field is loaded with a fixed number of
+    queries, no matter how many peripherals and sensors the site has."""
+
+    peripherals = List(PeripheralSnapshotNode)
+    controller_tasks = List(
+        ControllerTaskNode, description="The starting, running and stopping tasks."
+    )
+
+    @staticmethod
+    def resolve_peripherals(snapshot, _):
+        latest_data_points = {}
+        for row in DataPoint.objects.latest(snapshot["site_id"]):
+            key = str(row["peripheral_component_id"])
+            latest_data_points.setdefault(key, []).append(row)
+        peripheral_components = (
+            PeripheralComponent.objects.filter(site_entity__site_id=snapshot["site_id"])
+            .select_related("site_entity")
+            .order_by("site_entity__name")
+        )
+        return [
+            {
+                "peripheral_component": peripheral_component,
+                "latest_data_points": latest_data_points.get(
+                    str(peripheral_component.pk), []
+                ),
+            }
+            for peripheral_component in peripheral_components
+        ]
+
+    @staticmethod
+    def resolve_controller_tasks(snapshot, _):
+        return ControllerTask.objects.filter(
+            controller_component__site_entity__site_id=snapshot["site_id"],
+            state__in=ControllerTask.STOPPABLE_STATES,
+        ).order_by("created_at")
+
+    @classmethod
+    def resolve(cls, parent, info, **kwargs):
+        site_id = from_global_id(kwargs["site"])[1]
+        if not can_access_site(info, site_id):
+            return None
+        return {"site_id": site_id}
+
+    @classmethod
+    def as_field(cls) -> graphene.Field:
+        return graphene.Field(cls, site=graphene.ID(required=True))
+
+
+class SeriesInput(graphene.InputObjectType):
+    """A series of data points of a peripheral and data point type."""
+
+    peripheral_component = graphene.ID(required=True)
+    data_point_type = graphene.ID(required=True)
+
+
+class LinearRegressionNode(ObjectType):
+    """A least squares fit of a series as a linear function of the first series."""
+
+    slope = Float()
+    intercept = Float()
+    r_squared = Float()
+
+
+class AlignedSeriesNode(ObjectType):
+    """Series aligned onto a common grid of time buckets. Each row of the values
+    holds the average of each series in the bucket, or null."""
+
+    MAX_SERIES = 10
+    MAX_BUCKETS = 10000
+
+    times = List(DateTime)
+    values = List(List(Float))
+    correlation = List(
+        List(Float), description="The Pearson correlation of each pair of series."
+    )
+    regression = List(
+        LinearRegressionNode,
+        description="The linear regression of each series on the first series.",
+    )
+
+    @staticmethod
+    def resolve_times(aligned, _):
+        return [row[0] for row in aligned["rows"]]
+
+    @staticmethod
+    def resolve_values(aligned, _):
+        return [row[1:] for row in aligned["rows"]]
+
+    @staticmethod
+    def resolve_correlation(aligned, _):
+        return analysis.pearson_correlation(aligned["matrix"])
+
+    @staticmethod
+    def resolve_regression(aligned, _):
+        return analysis.linear_regression(aligned["matrix"])
+
+    @classmethod
+    def resolve(cls, parent, info, **kwargs):
+        series = [
+            (
+                from_global_id(item["peripheral_component"])[1],
+                from_global_id(item["data_point_type"])[1],
+            )
+            for item in kwargs["series"]
+        ]
+        if not 0 < len(series) <= cls.MAX_SERIES:
+            raise GraphQLError(f"Between 1 and {cls.MAX_SERIES} series can be aligned")
+        from_time, before_time = get_time_range(kwargs, timedelta(days=1))
+        bucket = timedelta(seconds=kwargs.get("bucket_seconds", 600))
+        if bucket < timedelta(seconds=1):
+            raise GraphQLError("The bucket has to be at least 1 s")
+        if (before_time - from_time) / bucket > cls.MAX_BUCKETS:
+            raise GraphQLError(f"The range exceeds {cls.MAX_BUCKETS} buckets")
+        if not all(can_access_peripheral_component(info, pair[0]) for pair in series):
+            raise GraphQLError("Unknown peripheral component")
+        reject_archived_range(
+            from_time,
+            DataPointArchive.objects.filter(
+                peripheral_component_id__in=[pair[0] for pair in series]
+            ),
+        )
+
+        rows = DataPoint.objects.aligned(series, from_time, before_time, bucket)
+        _, matrix = analysis.to_matrix(rows, len(series))
+        return {"rows": rows, "matrix": matrix}
+
+    @classmethod
+    def as_field(cls) -> graphene.Field:
+        return graphene.Field(
+            cls,
+            series=graphene.List(graphene.NonNull(SeriesInput), required=True),
+            from_time=graphene.DateTime(),
+            before_time=graphene.DateTime(),
+            bucket_seconds=graphene.Int(),
         )
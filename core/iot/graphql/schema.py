@@ -1,11 +1,13 @@
 import graphene
-from graphene_django.filter import DjangoFilterConnectionField
+from core.keyset import KeysetConnectionField
+from core.query_optimizer import OptimizedConnectionField
 
 from iot.graphql.nodes import (
     SiteNode,
     SiteEntityNode,
     ControllerComponentNode,
     ControllerComponentTypeNode,
+    ControllerMessageNode,
     ControllerTaskNode,
     ControllerTaskEnumNode,
     PeripheralComponentNode,
@@ -14,6 +16,10 @@ from iot.graphql.nodes import (
     DataPointNode,
     DataPointByDayNode,
     DataPointByHourNode,
+    DataPointGapNode,
+    PeripheralAvailabilityNode,
+    SiteSnapshotNode,
+    AlignedSeriesNode,
 )
 
 from iot.graphql.mutations import (
@@ -33,35 +39,43 @@ class Query:
     """Query commands for the iot GraphQL schema"""
 
     site = graphene.relay.Node.Field(SiteNode)
-    all_sites = DjangoFilterConnectionField(SiteNode)
+    all_sites = OptimizedConnectionField(SiteNode)
 
     site_entity = graphene.relay.Node.Field(SiteEntityNode)
-    all_site_entities = DjangoFilterConnectionField(SiteEntityNode)
+    all_site_entities = OptimizedConnectionField(SiteEntityNode)
 
     controller_component = graphene.relay.Node.Field(ControllerComponentNode)
-    all_controller_components = DjangoFilterConnectionField(ControllerComponentNode)
+    all_controller_components = OptimizedConnectionField(ControllerComponentNode)
 
     controller_component_type = graphene.relay.Node.Field(ControllerComponentTypeNode)
-    all_controller_component_types = DjangoFilterConnectionField(
+    all_controller_component_types = OptimizedConnectionField(
         ControllerComponentTypeNode
     )
 
+    all_controller_messages = KeysetConnectionField(
+        ControllerMessageNode, key=("created_at", "pk")
+    )
+
     controller_task = graphene.relay.Node.Field(ControllerTaskNode)
-    all_controller_tasks = DjangoFilterConnectionField(ControllerTaskNode)
+    all_controller_tasks = OptimizedConnectionField(ControllerTaskNode)
     controller_task_enums = graphene.Field(ControllerTaskEnumNode)
 
     peripheral_component = graphene.relay.Node.Field(PeripheralComponentNode)
-    all_peripheral_components = DjangoFilterConnectionField(PeripheralComponentNode)
+    all_peripheral_components = OptimizedConnectionField(PeripheralComponentNode)
     peripheral_component_enums = graphene.Field(PeripheralComponentEnumNode)
 
     data_point_type = graphene.relay.Node.Field(DataPointTypeNode)
-    all_data_point_types = DjangoFilterConnectionField(DataPointTypeNode)
+    all_data_point_types = OptimizedConnectionField(DataPointTypeNode)
 
     data_point = graphene.relay.Node.Field(DataPointTypeNode)
-    all_data_points = DjangoFilterConnectionField(DataPointNode)
+    all_data_points = KeysetConnectionField(DataPointNode)
 
-    data_points_by_day = DataPointByDayNode.as_list_field()
-    data_points_by_hour = DataPointByHourNode.as_list_field()
+    data_points_by_day = DataPointByDayNode.as_connection_field()
+    data_points_by_hour = DataPointByHourNode.as_connection_field()
+    data_point_gaps = DataPointGapNode.as_list_field()
+    site_availability = PeripheralAvailabilityNode.as_list_field()
+    site_snapshot = SiteSnapshotNode.as_field()
+    aligned_series = AlignedSeriesNode.as_field()
 
     @staticmethod
     def resolve_controller_task_enums(parent, args):
@@ -79,6 +93,22 @@ class Query:
     def resolve_data_points_by_hour(parent, info, **kwargs):
         return DataPointByHourNode.resolve(parent, info, **kwargs)
 
+    @staticmethod
+    def resolve_data_point_gaps(parent, info, **kwargs):
+        return DataPointGapNode.resolve(parent, info, **kwargs)
+
+    @staticmethod
+    def resolve_site_availability(parent, info, **kwargs):
+        return PeripheralAvailabilityNode.resolve(parent, info, **kwargs)
+
+    @staticmethod
+    def resolve_site_snapshot(parent, info, **kwargs):
+        return SiteSnapshotNode.resolve(parent, info, **kwargs)
+
+    @staticmethod
+    def resolve_aligned_series(parent, info, **kwargs):
+        return AlignedSeriesNode.resolve(parent, info, **kwargs)
+
 
 class Mutation:
     """Mutation commands for the iot GraphQL schema"""
@@ -0,0 +1,289 @@
+"""In-memory ring buffers of the most recent data points of each series.
+
+A series is the data points of one peripheral component and data point type. The
+ingest path appends the data points it stores to the ring buffer of their series, and
+a series that is read before any of its data points were ingested is loaded from the
+database once. Recent buckets of dataPointsByHour and dataPointsByDay are aggregated
+from the buffers with NumPy, so only older ranges reach PostgreSQL.
+
+The buffers are kept per process and assume that all telemetry is ingested by the
+same process that serves the reads, as with a single Daphne server. With several
+server processes, disable them by setting HOT_SERIES_CAPACITY to 0."""
+
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import date, datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+from django.conf import settings
+
+from core.db_routers import PRIMARY_DATABASE
+from iot.cold_storage import (
+    BUCKET_ORIGIN,
+    EPOCH,
+    aggregate_arrays,
+    to_bucket_rows,
+    to_datetime,
+)
+from iot.models import DataPoint
+
+SeriesKey = Tuple[str, str]
+
+
+def to_microseconds(time: datetime) -> int:
+    """The time in µs since the epoch."""
+
+    return (time - EPOCH) // timedelta(microseconds=1)
+
+
+def to_series_key(peripheral_component_id, data_point_type_id) -> SeriesKey:
+    """Normalize the IDs of a series, which may be UUIDs or strings."""
+
+    return (
+        str(uuid.UUID(str(peripheral_component_id))),
+        str(uuid.UUID(str(data_point_type_id))),
+    )
+
+
+class RingBuffer:
+    """Fixed-size arrays of the most recent times, in µs since the epoch, and values of
+    a series. Once full, each new data point overwrites the oldest one."""
+
+    def __init__(self, capacity: int, covered_from: int):
+        self.times = np.empty(capacity, dtype=np.int64)
+        self.values = np.empty(capacity, dtype=np.float64)
+        self.start = 0
+        self.size = 0
+        # All data points of the series at or after this time are in the buffer
+        self.covered_from = covered_from
+
+    @property
+    def capacity(self) -> int:
+        return len(self.times)
+
+    def append(self, time: int, value: float) -> bool:
+        """Append a data point newer than the others. Returns False if it is older than
+        the newest one and not in the buffer yet, i.e., it cannot be inserted."""
+
+        if self.size:
+            newest = self.times[(self.start + self.size - 1) % self.capacity]
+            if time <= newest:
+                times, _ = self.get_range(time, time + 1)
+                return bool(len(times))
+        end = (self.start + self.size) % self.capacity
+        self.times[end] = time
+        self.values[end] = value
+        if self.size < self.capacity:
+            self.size += 1
+        else:
+            self.start = (self.start + 1) % self.capacity
+            self.covered_from = int(self.times[self.start])
+        return True
+
+    def get_range(
+        self, from_time: Optional[int] = None, before_time: Optional[int] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Copy the times and values within [from_time, before_time) in ascending
+        order."""
+
+        order = (np.arange(self.size) + self.start) % self.capacity
+        times, values = self.times[order], self.values[order]
+        low = 0 if from_time is None else np.searchsorted(times, from_time)
+        high = self.size if before_time is None else np.searchsorted(times, before_time)
+        return times[low:high], values[low:high]
+
+
+class HotSeriesStore:
+    """The ring buffers of the process' most recently used series."""
+
+    def __init__(self, capacity: int, max_series: int, load_window: timedelta):
+        self.capacity = capacity
+        self.max_series = max_series
+        self.load_window = load_window
+        self._buffers: "OrderedDict[SeriesKey, RingBuffer]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def append(self, data_points: Iterable[DataPoint]):
+        """Append stored data points to the buffers of their series. A series without
+        buffer gets one covering the series from its first appended data point."""
+
+        with self._lock:
+            for data_point in data_points:
+                key = to_series_key(
+                    data_point.peripheral_component_id, data_point.data_point_type_id
+                )
+                time = to_microseconds(data_point.time)
+                buffer = self._buffers.get(key)
+                if buffer is None:
+                    buffer = self._add(key, RingBuffer(self.capacity, time))
+                if not buffer.append(time, float(data_point.value)):
+                    # Leave the older data points to the database
+                    del self._buffers[key]
+
+    def exclude(self, data_points: Iterable):
+        """Stop serving the time range up to the given data points from the buffers,
+        e.g., for data points staged for a later merge into the database."""
+
+        with self._lock:
+            for data_point in data_points:
+                key = to_series_key(
+                    data_point.peripheral_component_id, data_point.data_point_type_id
+                )
+                time = to_microseconds(data_point.time) + 1
+                buffer = self._buffers.get(key)
+                if buffer is None:
+                    # Only data points ingested from now on will be in the buffer
+                    now = to_microseconds(datetime.now(timezone.utc))
+                    self._add(key, RingBuffer(self.capacity, max(time, now)))
+                else:
+                    buffer.covered_from = max(buffer.covered_from, time)
+
+    def get_range(
+        self, key: SeriesKey, from_time: Optional[int], before_time: Optional[int]
+    ) -> Tuple[int, np.ndarray, np.ndarray]:
+        """Return the start of the buffer's coverage and the copied data points within
+        [from_time, before_time). The series is loaded from the database if needed."""
+
+        with self._lock:
+            buffer = self._buffers.get(key)
+            if buffer is not None:
+                self._buffers.move_to_end(key)
+                return (buffer.covered_from, *buffer.get_range(from_time, before_time))
+
+        loaded = self._load(key)
+        with self._lock:
+            # Keep a buffer that was filled by the ingest path in the meantime
+            buffer = self._buffers.get(key) or self._add(key, loaded)
+            return (buffer.covered_from, *buffer.get_range(from_time, before_time))
+
+    def clear(self):
+        with self._lock:
+            self._buffers.clear()
+
+    def _add(self, key: SeriesKey, buffer: RingBuffer) -> RingBuffer:
+        """Add a buffer, evicting the least recently used ones. Must hold the lock."""
+
+        self._buffers[key] = buffer
+        while len(self._buffers) > self.max_series:
+            self._buffers.popitem(last=False)
+        return buffer
+
+    def _load(self, key: SeriesKey) -> RingBuffer:
+        """Load the newest data points of the load window into a new buffer. Reads
+        from the primary, as a replica may not have the latest data points yet."""
+
+        covered_from = datetime.now(timezone.utc) - self.load_window
+        rows = list(
+            DataPoint.objects.using(PRIMARY_DATABASE)
+            .filter(
+                peripheral_component_id=key[0],
+                data_point_type_id=key[1],
+                time__gte=covered_from,
+            )
+            .order_by("-time")
+            .values_list("time", "value")[: self.capacity]
+        )
+        if len(rows) == self.capacity:
+            covered_from = rows[-1][0]
+        buffer = RingBuffer(self.capacity, to_microseconds(covered_from))
+        for time, value in reversed(rows):
+            buffer.append(to_microseconds(time), value)
+        return buffer
+
+
+_store: Optional[HotSeriesStore] = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> Optional[HotSeriesStore]:
+    """The process' store, or None if the ring buffers are disabled."""
+
+    global _store  # pylint: disable=global-statement
+    options = (
+        settings.HOT_SERIES_CAPACITY,
+        settings.HOT_SERIES_MAX_SERIES,
+        settings.HOT_SERIES_LOAD_WINDOW,
+    )
+    if not settings.HOT_SERIES_CAPACITY:
+        return None
+    with _store_lock:
+        if (
+            _store is None
+            or (
+                _store.capacity,
+                _store.max_series,
+                _store.load_window,
+            )
+            != options
+        ):
+            _store = HotSeriesStore(*options)
+        return _store
+
+
+def append_data_points(data_points: Iterable[DataPoint]):
+    """Append newly stored data points to the ring buffers."""
+
+    if store := get_store():
+        store.append(data_points)
+
+
+def exclude_data_points(data_points: Iterable):
+    """Exclude the time ranges of data points not yet stored in the hypertable."""
+
+    if store := get_store():
+        store.exclude(data_points)
+
+
+def floor_bucket(time: int, bucket: timedelta) -> int:
+    """The start of the bucket the time in µs falls into, aligned as time_bucket()."""
+
+    bucket_us = bucket // timedelta(microseconds=1)
+    origin_us = to_microseconds(BUCKET_ORIGIN)
+    return (time - origin_us) // bucket_us * bucket_us + origin_us
+
+
+def hot_buckets(
+    peripheral_component_id,
+    data_point_type_id,
+    bucket: timedelta,
+    time_key: str,
+    from_time: Union[date, datetime, None] = None,
+    before_time: Union[date, datetime, None] = None,
+) -> Tuple[Optional[datetime], List[Dict]]:
+    """Aggregate the recent part of the series within [from_time, before_time) by
+    bucket from its ring buffer. Returns the start of the first bucket served from the
+    buffer, before which the database has to be queried, and the buckets in ascending
+    order. The start is None if the buffer holds no complete bucket of the range."""
+
+    store = get_store()
+    if not store:
+        return None, []
+    from_us = to_microseconds(to_datetime(from_time)) if from_time else None
+    before_us = to_microseconds(to_datetime(before_time)) if before_time else None
+    key = to_series_key(peripheral_component_id, data_point_type_id)
+    covered_from, times, values = store.get_range(key, from_us, before_us)
+
+    # Buckets that started before the coverage may miss data points
+    start = floor_bucket(covered_from, bucket)
+    if start < covered_from:
+        start += bucket // timedelta(microseconds=1)
+    if before_us is not None and start >= before_us:
+        return None, []
+    times_from = np.searchsorted(times, start)
+    times, values = times[times_from:], values[times_from:]
+    rows = []
+    if times.size:
+        rows = to_bucket_rows(aggregate_arrays(times, values, bucket), time_key)
+    return EPOCH + timedelta(microseconds=int(start)), rows
+
+
+def merge_hot_buckets(
+    rows: List[Dict], hot_rows: List[Dict], ascending: bool, limit: int
+) -> List[Dict]:
+    """Combine the buckets of the database with the newer ones of the ring buffer."""
+
+    if ascending:
+        return (rows + hot_rows)[:limit]
+    return (hot_rows[::-1] + rows)[:limit]
@@ -0,0 +1,254 @@
+import io
+import json
+import os
+import uuid
+from datetime import timedelta
+from typing import Dict, Iterator, Set
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connection, transaction
+from pyarrow import csv as pa_csv
+
+from iot.models import DataPointType, PeripheralComponent
+from iot.timescale import (
+    compress_chunks,
+    decompress_chunks,
+    get_chunks,
+    merge_staged_data_points,
+)
+
+STAGING_TABLE = "iot_datapoint_import"
+COLUMNS = ["time", "peripheral_component", "data_point_type", "value"]
+# Rough size of a CSV row, used to read CSV files in blocks of about the batch size
+CSV_ROW_BYTES = 80
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk import historical data points from a CSV or Parquet file with the columns"
+        " time, peripheral_component, data_point_type and value. The rows are copied"
+        " into an uncompressed staging table and merged into the hypertable per batch."
+        " Rows sharing a timestamp with other series are shifted by microseconds and"
+        " rows already stored are skipped, as are rows at or before the last archived"
+        " data point of their peripheral component."
+        " Interrupted imports continue where they stopped when run again."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="The CSV or Parquet file to import.")
+        parser.add_argument(
+            "--format",
+            choices=["csv", "parquet"],
+            help="The file format. Inferred from the file extension by default.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100000,
+            help="The number of rows imported per transaction.",
+        )
+        parser.add_argument(
+            "--state-file",
+            help="Where the progress is stored. Defaults to PATH.import-state.",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Ignore the progress of a previous run and import from the start.",
+        )
+
+    def handle(self, *args, **options):
+        path = os.path.abspath(options["path"])
+        if not os.path.isfile(path):
+            raise CommandError(f"File not found: {path}")
+        file_format = options["format"] or os.path.splitext(path)[1][1:].lower()
+        if file_format not in ("csv", "parquet"):
+            raise CommandError(f"Unsupported file format: {file_format}")
+        state_file = options["state_file"] or f"{path}.import-state"
+        state = self.load_state(state_file, path, options["restart"])
+        if state["rows"]:
+            self.stdout.write(f"Resuming import after {state['rows']} rows")
+
+        total_rows = None
+        if file_format == "parquet":
+            total_rows = pq.ParquetFile(path).metadata.num_rows
+        known_ids: Dict[str, Set[str]] = {column: set() for column in COLUMNS[1:3]}
+        self.create_staging_table()
+
+        offset = 0
+        for batch in self.read_batches(path, file_format, options["batch_size"]):
+            # Skip the rows that were imported by a previous run
+            if offset + batch.num_rows <= state["rows"]:
+                offset += batch.num_rows
+                continue
+            if offset < state["rows"]:
+                batch = batch.slice(state["rows"] - offset)
+            offset = state["rows"] + batch.num_rows
+
+            self.validate_ids(batch, known_ids)
+            with transaction.atomic():
+                decompressed = self.copy_to_staging_table(batch)
+                merged = merge_staged_data_points(STAGING_TABLE)
+                merged_rows = sum(merged)
+                if merged_rows != batch.num_rows:
+                    raise CommandError(
+                        f"Merged {merged_rows} of {batch.num_rows} rows after row"
+                        f" {state['rows']}"
+                    )
+            state["rows"] = offset
+            state["inserted"] += merged.inserted
+            state["duplicates"] += merged.duplicates
+            state["archived"] += merged.archived
+            state["decompressed"].extend(chunk.name for chunk in decompressed)
+            self.save_state(state_file, state)
+            progress = f"{offset}/{total_rows}" if total_rows else str(offset)
+            self.stdout.write(
+                f"Imported {progress} rows ({state['inserted']} new data points,"
+                f" {state['duplicates']} duplicates, {state['archived']} archived)"
+            )
+
+        if state["decompressed"]:
+            self.stdout.write(
+                f"Compressing {len(state['decompressed'])} decompressed chunks"
+            )
+            compress_chunks(state["decompressed"])
+        if os.path.exists(state_file):
+            os.remove(state_file)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {state['inserted']} of {offset} data points from {path},"
+                f" skipped {state['duplicates']} duplicates and {state['archived']}"
+                " data points older than the archived ones"
+            )
+        )
+
+    @staticmethod
+    def load_state(state_file: str, path: str, restart: bool) -> Dict:
+        """Load the progress of a previous run of the same file."""
+
+        state = {
+            "path": path,
+            "rows": 0,
+            "inserted": 0,
+            "duplicates": 0,
+            "archived": 0,
+            "decompressed": [],
+        }
+        if restart or not os.path.exists(state_file):
+            return state
+        with open(state_file) as file:
+            previous_state = json.load(file)
+        if previous_state.get("path") != path:
+            raise CommandError(f"The state file {state_file} belongs to another file")
+        state.update(previous_state)
+        return state
+
+    @staticmethod
+    def save_state(state_file: str, state: Dict):
+        """Atomically replace the state file, so an interruption never corrupts it."""
+
+        temp_file = f"{state_file}.tmp"
+        with open(temp_file, "w") as file:
+            json.dump(state, file)
+        os.replace(temp_file, state_file)
+
+    @staticmethod
+    def read_batches(
+        path: str, file_format: str, batch_size: int
+    ) -> Iterator[pa.RecordBatch]:
+        """Stream the file as record batches of at most the batch size."""
+
+        if file_format == "parquet":
+            yield from pq.ParquetFile(path).iter_batches(
+                batch_size=batch_size, columns=COLUMNS
+            )
+            return
+        reader = pa_csv.open_csv(
+            path,
+            read_options=pa_csv.ReadOptions(block_size=batch_size * CSV_ROW_BYTES),
+            convert_options=pa_csv.ConvertOptions(
+                include_columns=COLUMNS,
+                column_types={
+                    "time": pa.string(),
+                    "peripheral_component": pa.string(),
+                    "data_point_type": pa.string(),
+                    "value": pa.float64(),
+                },
+            ),
+        )
+        for batch in reader:
+            for start in range(0, batch.num_rows, batch_size):
+                yield batch.slice(start, batch_size)
+
+    @staticmethod
+    def validate_ids(batch: pa.RecordBatch, known_ids: Dict[str, Set[str]]):
+        """Check that the peripheral components and data point types exist. Each ID is
+        only looked up the first time it occurs."""
+
+        models = {
+            "peripheral_component": PeripheralComponent,
+            "data_point_type": DataPointType,
+        }
+        for column, model in models.items():
+            try:
+                ids = {
+                    str(uuid.UUID(i))
+                    for i in pc.unique(batch.column(column)).to_pylist()
+                }
+            except (TypeError, ValueError) as err:
+                raise CommandError(f"Invalid {column} ID: {err}") from err
+            new_ids = ids - known_ids[column]
+            existing_ids = {
+                str(pk)
+                for pk in model.objects.filter(pk__in=new_ids).values_list(
+                    "pk", flat=True
+                )
+            }
+            if missing_ids := new_ids - existing_ids:
+                raise CommandError(f"Unknown {column} IDs: {', '.join(missing_ids)}")
+            known_ids[column] |= new_ids
+
+    @staticmethod
+    def create_staging_table():
+        """Create the session's staging table, which is emptied on every commit."""
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE TEMPORARY TABLE IF NOT EXISTS {STAGING_TABLE} ("
+                " id bigserial PRIMARY KEY,"
+                " time timestamptz NOT NULL,"
+                " peripheral_component_id uuid NOT NULL,"
+                " data_point_type_id uuid NOT NULL,"
+                " value double precision NOT NULL"
+                ") ON COMMIT DELETE ROWS"
+            )
+
+    @staticmethod
+    def copy_to_staging_table(batch: pa.RecordBatch):
+        """Copy the batch into the staging table and decompress the chunks its time
+        range falls into. Returns the decompressed chunks."""
+
+        buffer = io.BytesIO()
+        pa_csv.write_csv(
+            pa.Table.from_batches([batch]).select(COLUMNS),
+            buffer,
+            write_options=pa_csv.WriteOptions(include_header=False),
+        )
+        buffer.seek(0)
+        try:
+            with connection.cursor() as cursor:
+                cursor.copy_expert(
+                    f"COPY {STAGING_TABLE}"
+                    " (time, peripheral_component_id, data_point_type_id, value)"
+                    " FROM STDIN WITH (FORMAT csv)",
+                    buffer,
+                )
+                cursor.execute(f"SELECT min(time), max(time) FROM {STAGING_TABLE}")
+                start, end = cursor.fetchone()
+        except DatabaseError as err:
+            raise CommandError(f"Failed to copy batch: {err}") from err
+        # The timestamps may be smeared past the last time by a few microseconds
+        return decompress_chunks(get_chunks(start, end + timedelta(seconds=1)))
@@ -0,0 +1,25 @@
+# Generated by Django 3.1.14 on 2026-10-19 16:28
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('iot', '0006_auto_20210416_1347'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataPointBackfill',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('time', models.DateTimeField(db_index=True)),
+                ('value', models.FloatField(help_text='The value of the data given by the data point type and peripheral.')),
+                ('created_at', models.DateTimeField(auto_now_add=True, help_text='The datetime when the data point was received.')),
+                ('data_point_type', models.ForeignKey(help_text='The type of data recorded and its unit.', on_delete=django.db.models.deletion.CASCADE, related_name='data_point_backfill_set', to='iot.datapointtype')),
+                ('peripheral_component', models.ForeignKey(help_text='The peripheral that generated the data point.', on_delete=django.db.models.deletion.CASCADE, related_name='data_point_backfill_set', to='iot.peripheralcomponent')),
+            ],
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 3.1.14 on 2026-10-19 16:31
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('iot', '0007_datapointbackfill'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataPointArchive',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(help_text='The path of the Parquet object.', max_length=255, unique=True)),
+                ('start_time', models.DateTimeField(help_text='The time of the first data point.')),
+                ('end_time', models.DateTimeField(help_text='The time of the last data point.')),
+                ('row_count', models.PositiveIntegerField(help_text='The number of archived data points.')),
+                ('created_at', models.DateTimeField(auto_now_add=True, help_text='The datetime of the archival.')),
+                ('peripheral_component', models.ForeignKey(help_text='The peripheral that generated the archived data points.', on_delete=django.db.models.deletion.CASCADE, related_name='data_point_archive_set', to='iot.peripheralcomponent')),
+            ],
+            options={
+                'ordering': ['start_time'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='datapointarchive',
+            index=models.Index(fields=['peripheral_component', 'start_time'], name='iot_datapoi_periphe_2c4bfa_idx'),
+        ),
+    ]
@@ -0,0 +1,126 @@
+# Generated by Django 3.1.14 on 2026-10-19 16:38
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("iot", "0008_datapointarchive"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="DeletionJob",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                (
+                    "target_type",
+                    models.CharField(
+                        choices=[("site", "Site"), ("controller", "Controller")],
+                        help_text="Whether a site or a controller is deleted.",
+                        max_length=16,
+                    ),
+                ),
+                (
+                    "name",
+                    models.CharField(
+                        help_text="The name of the deleted site or controller.",
+                        max_length=255,
+                    ),
+                ),
+                (
+                    "state",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pending"),
+                            ("running", "Running"),
+                            ("failed", "Failed"),
+                            ("done", "Done"),
+                        ],
+                        default="pending",
+                        help_text="The state of the deletion.",
+                        max_length=16,
+                    ),
+                ),
+                (
+                    "chunks_total",
+                    models.PositiveIntegerField(
+                        default=0, help_text="The number of hypertable chunks to clear."
+                    ),
+                ),
+                (
+                    "chunks_done",
+                    models.PositiveIntegerField(
+                        default=0, help_text="The number of cleared hypertable chunks."
+                    ),
+                ),
+                (
+                    "deleted_data_points",
+                    models.BigIntegerField(
+                        default=0, help_text="The number of deleted data points."
+                    ),
+                ),
+                (
+                    "deleted_messages",
+                    models.BigIntegerField(
+                        default=0,
+                        help_text="The number of deleted controller messages.",
+                    ),
+                ),
+                (
+                    "error",
+                    models.TextField(
+                        blank=True, default="", help_text="Why the deletion failed."
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        auto_now_add=True, help_text="The datetime of creation."
+                    ),
+                ),
+                (
+                    "modified_at",
+                    models.DateTimeField(
+                        auto_now=True, help_text="The datetime of the last update."
+                    ),
+                ),
+                (
+                    "owner",
+                    models.ForeignKey(
+                        help_text="The user that requested the deletion.",
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="deletion_job_set",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "site",
+                    models.ForeignKey(
+                        blank=True,
+                        help_text="The detached site that is being deleted.",
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="deletion_job_set",
+                        to="iot.site",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["-created_at"],
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 3.1.14 on 2026-10-19 18:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("iot", "0009_deletionjob"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="datapoint",
+            index=models.Index(
+                fields=["peripheral_component", "data_point_type", "-time"],
+                name="iot_datapoi_periphe_0d021f_idx",
+            ),
+        ),
+    ]
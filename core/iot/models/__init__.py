@@ -1,5 +1,6 @@
 from iot.models.controller import *
 from iot.models.controller_task import *
 from iot.models.data_point import *
+from iot.models.deletion_job import *
 from iot.models.peripheral import *
 from iot.models.site import *
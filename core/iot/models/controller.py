@@ -126,6 +126,7 @@ class ControllerMessage(models.Model):
     RESULT_TYPE = "result"
     TELEMETRY_TYPE = "tel"
     SYSTEM_TYPE = "sys"
+    BACKFILL_TYPE = "backfill"
 
     TYPES = [
         COMMAND_TYPE,
@@ -134,6 +135,7 @@ class ControllerMessage(models.Model):
         RESULT_TYPE,
         TELEMETRY_TYPE,
         SYSTEM_TYPE,
+        BACKFILL_TYPE,
     ]
 
     created_at = models.DateTimeField(
@@ -229,6 +231,13 @@ class ControllerMessage(models.Model):
             return self.message
         return {}
 
+    def to_backfill(self):
+        """Try to extract late telemetry, e.g., buffered while offline"""
+
+        if self.message.get("type", "") == self.BACKFILL_TYPE:
+            return self.message
+        return {}
+
     def get_type(self):
         """Get the message type"""
 
@@ -1,15 +1,17 @@
 import uuid
 from datetime import datetime, timedelta, timezone
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 from accounts.models import User
-from django.db import IntegrityError, models, transaction
+from django.conf import settings
+from django.db import IntegrityError, connections, models, transaction
 from django.db.models.functions import TruncDay, TruncHour
 from django.db.models.query import QuerySet
 from django.utils.dateparse import parse_datetime
 from graphene.types.datetime import Date
 from graphene.types.uuid import UUID
-from iot.models.peripheral import PeripheralComponent
+from iot.models.peripheral import PeripheralComponent, PeripheralDataPointType
+from iot.models.site import SiteEntity
 
 
 class DataPointType(models.Model):
@@ -38,19 +40,19 @@ class DataPointType(models.Model):
         return f"{self.name} in {self.unit}"
 
 
-class DataPointManager(models.Manager):
-    """Handles telemetry messages for the DataPoint class"""
+class TelemetryManager(models.Manager):
+    """Creates data points, or staged data points, from telemetry messages"""
 
-    def from_telemetry(self, message: Dict) -> List["DataPoint"]:
+    def from_telemetry(self, message: Dict) -> List[models.Model]:
         """Create data points from a telemetry message. Raises ValueError on error"""
 
         # Get, parse and validate the time
         time = message.get("time", datetime.now(timezone.utc))
-        time = self.model.to_timezone_datetime(time)
+        time = DataPoint.to_timezone_datetime(time)
 
         try:
             peripheral_id = message["peripheral"]
-            data_points: List["DataPoint"] = []
+            data_points: List[models.Model] = []
             for data_point in message["data_points"]:
                 data_points.append(
                     self.model(
@@ -67,6 +69,10 @@ class DataPointManager(models.Manager):
         self.bulk_create(data_points)
         return data_points
 
+
+class DataPointManager(TelemetryManager):
+    """Handles telemetry messages and aggregations for the DataPoint class"""
+
     def by_day(
         self,
         peripheral_component_id: UUID,
@@ -135,6 +141,216 @@ class DataPointManager(models.Manager):
             ordered_series = series.order_by("-time_hour")
         return ordered_series
 
+    def gaps(
+        self,
+        peripheral_component_id: UUID,
+        from_time: datetime,
+        before_time: datetime,
+        data_point_type_id: Optional[UUID] = None,
+        min_gap: timedelta = timedelta(minutes=10),
+        bucket: timedelta = timedelta(minutes=1),
+    ) -> List[Dict]:
+        """Find the intervals of at least the min gap within [from_time, before_time)
+        without data points of the peripheral, optionally of one data point type.
+
+        The data points are grouped by bucket in the database and lag() compares each
+        bucket with the previous one, so the gaps are only as precise as the bucket.
+        Returns the start and end of each gap in ascending order. Data points moved to
+        cold storage are not considered."""
+
+        where = "peripheral_component_id = %s AND time >= %s AND time < %s"
+        where_params = [str(peripheral_component_id), from_time, before_time]
+        if data_point_type_id:
+            where += " AND data_point_type_id = %s"
+            where_params.append(str(data_point_type_id))
+        # The first and the last row bound the gaps at the start and end of the range
+        query = (
+            "SELECT gap_start, gap_end FROM ("
+            "  SELECT lag(bucket) OVER (ORDER BY bucket) + %s AS gap_start,"
+            "  bucket AS gap_end FROM ("
+            "    SELECT %s::timestamptz - %s::interval AS bucket"
+            "    UNION ALL"
+            f"   SELECT time_bucket(%s, time) FROM {self.model._meta.db_table}"
+            f"   WHERE {where} GROUP BY 1"
+            "    UNION ALL"
+            "    SELECT %s::timestamptz"
+            "  ) AS buckets"
+            ") AS gaps WHERE gap_end - gap_start >= %s ORDER BY gap_start"
+        )
+        params = [
+            bucket,
+            from_time,
+            bucket,
+            bucket,
+            *where_params,
+            before_time,
+            min_gap,
+        ]
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(query, params)
+            return [{"start": start, "end": end} for start, end in cursor.fetchall()]
+
+    def aligned(
+        self,
+        series: List[Tuple[UUID, UUID]],
+        from_time: datetime,
+        before_time: datetime,
+        bucket: timedelta = timedelta(minutes=10),
+    ) -> List[Tuple]:
+        """Align the series, given as pairs of peripheral component and data point
+        type IDs, onto a common grid of time buckets in a single query. Returns a row
+        per bucket with data points, holding the bucket start followed by the average
+        value of each series in the bucket, or None."""
+
+        columns = ", ".join(
+            "avg(value) FILTER (WHERE peripheral_component_id = %s"
+            " AND data_point_type_id = %s)"
+            for _ in series
+        )
+        pairs = ", ".join("(%s::uuid, %s::uuid)" for _ in series)
+        ids = [str(pk) for pair in series for pk in pair]
+        query = (
+            f"SELECT time_bucket(%s, time) AS bucket, {columns}"
+            f" FROM {self.model._meta.db_table} WHERE time >= %s AND time < %s"
+            f" AND (peripheral_component_id, data_point_type_id) IN ({pairs})"
+            " GROUP BY bucket ORDER BY bucket"
+        )
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(query, [bucket, *ids, from_time, before_time, *ids])
+            return cursor.fetchall()
+
+    def sparklines(
+        self,
+        peripheral_component_ids: List[UUID],
+        from_time: datetime,
+        before_time: datetime,
+        points: int,
+    ) -> List[Tuple]:
+        """Average the series of the peripherals within [from_time, before_time) into
+        the given number of equal buckets in a single query. Returns a row per series
+        and bucket with data points, holding the peripheral component and data point
+        type IDs, the bucket's index and the average value."""
+
+        ids = ", ".join("%s" for _ in peripheral_component_ids)
+        query = (
+            "SELECT peripheral_component_id, data_point_type_id,"
+            " width_bucket(extract(epoch FROM time), %s, %s, %s) - 1 AS bucket,"
+            f" avg(value) FROM {self.model._meta.db_table}"
+            f" WHERE peripheral_component_id IN ({ids}) AND time >= %s AND time < %s"
+            " GROUP BY 1, 2, 3"
+        )
+        params = [
+            from_time.timestamp(),
+            before_time.timestamp(),
+            points,
+            *[str(pk) for pk in peripheral_component_ids],
+            from_time,
+            before_time,
+        ]
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(query, params)
+            return cursor.fetchall()
+
+    def availability(
+        self,
+        site_id: UUID,
+        from_time: datetime,
+        before_time: datetime,
+        bucket: timedelta = timedelta(minutes=10),
+    ) -> List[Dict]:
+        """Summarize the availability of the site's peripherals within
+        [from_time, before_time) as the share of buckets with data points. Returns the
+        peripheral component, its availability and the time of its last data point
+        within the range, also for peripherals without data points."""
+
+        buckets = (
+            self.filter(
+                peripheral_component__site_entity__site_id=site_id,
+                time__gte=from_time,
+                time__lt=before_time,
+            )
+            .values("peripheral_component_id")
+            .annotate(
+                buckets=models.Count(
+                    models.Func(
+                        models.Value(bucket, output_field=models.DurationField()),
+                        "time",
+                        function="time_bucket",
+                        output_field=models.DateTimeField(),
+                    ),
+                    distinct=True,
+                ),
+                last_seen=models.Max("time"),
+            )
+            .order_by()
+        )
+        by_peripheral = {row["peripheral_component_id"]: row for row in buckets}
+        total = max(1, -((from_time - before_time) // bucket))
+
+        peripheral_components = (
+            PeripheralComponent.objects.using(self.db)
+            .filter(site_entity__site_id=site_id)
+            .select_related("site_entity")
+            .order_by("site_entity__name")
+        )
+        summary = []
+        for peripheral_component in peripheral_components:
+            row = by_peripheral.get(peripheral_component.pk, {})
+            summary.append(
+                {
+                    "peripheral_component": peripheral_component,
+                    "availability": min(1.0, row.get("buckets", 0) / total),
+                    "last_seen": row.get("last_seen"),
+                }
+            )
+        return summary
+
+    def latest(self, site_id: UUID) -> List[Dict]:
+        """The latest data point of each data point type of the site's peripherals in
+        a single query. Each series' newest row is found through the series index, so
+        the cost grows with the number of series, not with their data points. Returns
+        the peripheral component ID, the data point type and the time and value of its
+        latest data point, which are None for series without data points."""
+
+        query = (
+            "SELECT edge.peripheral_id, type.id, type.name, type.unit,"
+            " type.created_by_id, latest.time, latest.value"
+            f" FROM {PeripheralDataPointType._meta.db_table} AS edge"
+            f" JOIN {SiteEntity._meta.db_table} AS entity"
+            " ON entity.id = edge.peripheral_id"
+            f" JOIN {DataPointType._meta.db_table} AS type"
+            " ON type.id = edge.data_point_type_id"
+            " LEFT JOIN LATERAL ("
+            f"  SELECT time, value FROM {self.model._meta.db_table}"
+            "   WHERE peripheral_component_id = edge.peripheral_id"
+            "   AND data_point_type_id = edge.data_point_type_id"
+            "   ORDER BY time DESC LIMIT 1"
+            " ) AS latest ON true"
+            " WHERE entity.site_id = %s ORDER BY type.name"
+        )
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(query, [str(site_id)])
+            return [
+                {
+                    "peripheral_component_id": peripheral_component_id,
+                    "data_point_type": DataPointType(
+                        id=type_id, name=name, unit=unit, created_by_id=created_by_id
+                    ),
+                    "time": time,
+                    "value": value,
+                }
+                for (
+                    peripheral_component_id,
+                    type_id,
+                    name,
+                    unit,
+                    created_by_id,
+                    time,
+                    value,
+                ) in cursor.fetchall()
+            ]
+
+
 def timezone_aware_now():
     """Return the current time as a timezone aware object."""
     return datetime.now(tz=timezone.utc)
@@ -165,6 +381,9 @@ class DataPoint(models.Model):
 
     class Meta:
         ordering = ["-time"]
+        indexes = [
+            models.Index(fields=["peripheral_component", "data_point_type", "-time"])
+        ]
 
     def save(self, *args, **kwargs):  # pylint: disable=signature-differs
         # If it is a 'naive' datetime, no timezone info, raise an error
@@ -204,3 +423,78 @@ class DataPoint(models.Model):
 
     def __str__(self):
         return f"{self.value} {self.data_point_type.unit} from {self.peripheral_component.site_entity.name}"
+
+
+class DataPointBackfillManager(TelemetryManager):
+    """Stages late telemetry, which is merged into the data points in the background"""
+
+    def is_late(self, message: Dict) -> bool:
+        """Whether the telemetry is older than the backfill age. Telemetry without a
+        time is never late."""
+
+        if "time" not in message:
+            return False
+        time = DataPoint.to_timezone_datetime(message["time"])
+        return time < timezone_aware_now() - settings.DATA_POINT_BACKFILL_AGE
+
+
+class DataPointBackfill(models.Model):
+    """Data points received after the fact, e.g., readings buffered by a controller
+    while it was offline. Inserting them directly could hit compressed chunks of the
+    data point hypertable, so they are staged here and merged per chunk."""
+
+    objects = DataPointBackfillManager()
+
+    id = models.BigAutoField(primary_key=True)
+    time = models.DateTimeField(db_index=True)
+    peripheral_component = models.ForeignKey(
+        PeripheralComponent,
+        on_delete=models.CASCADE,
+        related_name="data_point_backfill_set",
+        help_text="The peripheral that generated the data point.",
+    )
+    data_point_type = models.ForeignKey(
+        DataPointType,
+        on_delete=models.CASCADE,
+        related_name="data_point_backfill_set",
+        help_text="The type of data recorded and its unit.",
+    )
+    value = models.FloatField(
+        help_text="The value of the data given by the data point type and peripheral."
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True, help_text="The datetime when the data point was received."
+    )
+
+    def __str__(self):
+        return f"Backfill of {self.value} at {self.time}"
+
+
+class DataPointArchive(models.Model):
+    """A Parquet object holding the data points of one peripheral component from a
+    hypertable chunk that was moved to cold storage."""
+
+    peripheral_component = models.ForeignKey(
+        PeripheralComponent,
+        on_delete=models.CASCADE,
+        related_name="data_point_archive_set",
+        help_text="The peripheral that generated the archived data points.",
+    )
+    path = models.CharField(
+        max_length=255, unique=True, help_text="The path of the Parquet object."
+    )
+    start_time = models.DateTimeField(help_text="The time of the first data point.")
+    end_time = models.DateTimeField(help_text="The time of the last data point.")
+    row_count = models.PositiveIntegerField(
+        help_text="The number of archived data points."
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True, help_text="The datetime of the archival."
+    )
+
+    class Meta:
+        ordering = ["start_time"]
+        indexes = [models.Index(fields=["peripheral_component", "start_time"])]
+
+    def __str__(self):
+        return f"Archive of {self.row_count} data points from {self.start_time}"
@@ -0,0 +1,134 @@
+import uuid
+
+from accounts.models import User
+from django.db import models, transaction
+from iot.models.controller import ControllerAuthToken
+from iot.models.site import Site, SiteEntity
+
+
+class DeletionJobManager(models.Manager):
+    """Detaches sites and controllers from their owner and records their deletion"""
+
+    def detach_site(self, site: Site, user: User) -> "DeletionJob":
+        """Hide the site from its owner and revoke its controllers' tokens. The site
+        itself is deleted by the returned job."""
+
+        with transaction.atomic():
+            Site.objects.filter(pk=site.pk).update(owner=None)
+            ControllerAuthToken.objects.filter(
+                controller__site_entity__site=site
+            ).delete()
+            return self.create(
+                owner=user,
+                target_type=DeletionJob.TargetType.SITE,
+                name=site.name,
+                site=site,
+            )
+
+    def detach_controller(self, site_entity: SiteEntity, user: User) -> "DeletionJob":
+        """Move the controller's site entity to an ownerless site of its own and revoke
+        its token. The returned job deletes that site with the controller."""
+
+        with transaction.atomic():
+            site = Site.objects.create(
+                name=site_entity.name[: Site._meta.get_field("name").max_length],
+                owner=None,
+            )
+            SiteEntity.objects.filter(pk=site_entity.pk).update(site=site)
+            ControllerAuthToken.objects.filter(
+                controller__site_entity=site_entity
+            ).delete()
+            return self.create(
+                owner=user,
+                target_type=DeletionJob.TargetType.CONTROLLER,
+                name=site_entity.name,
+                site=site,
+            )
+
+
+class DeletionJob(models.Model):
+    """The background deletion of a detached site and all its time series"""
+
+    class TargetType(models.TextChoices):
+        SITE = "site", "Site"
+        CONTROLLER = "controller", "Controller"
+
+    class State(models.TextChoices):
+        PENDING = "pending", "Pending"
+        RUNNING = "running", "Running"
+        FAILED = "failed", "Failed"
+        DONE = "done", "Done"
+
+    id = models.UUIDField(
+        primary_key=True,
+        default=uuid.uuid4,
+        editable=False,
+    )
+    owner = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name="deletion_job_set",
+        help_text="The user that requested the deletion.",
+    )
+    target_type = models.CharField(
+        max_length=16,
+        choices=TargetType.choices,
+        help_text="Whether a site or a controller is deleted.",
+    )
+    name = models.CharField(
+        max_length=255, help_text="The name of the deleted site or controller."
+    )
+    site = models.ForeignKey(
+        Site,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="deletion_job_set",
+        help_text="The detached site that is being deleted.",
+    )
+    state = models.CharField(
+        max_length=16,
+        choices=State.choices,
+        default=State.PENDING,
+        help_text="The state of the deletion.",
+    )
+    chunks_total = models.PositiveIntegerField(
+        default=0, help_text="The number of hypertable chunks to clear."
+    )
+    chunks_done = models.PositiveIntegerField(
+        default=0, help_text="The number of cleared hypertable chunks."
+    )
+    deleted_data_points = models.BigIntegerField(
+        default=0, help_text="The number of deleted data points."
+    )
+    deleted_messages = models.BigIntegerField(
+        default=0, help_text="The number of deleted controller messages."
+    )
+    error = models.TextField(
+        blank=True, default="", help_text="Why the deletion failed."
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        help_text="The datetime of creation.",
+    )
+    modified_at = models.DateTimeField(
+        auto_now=True, help_text="The datetime of the last update."
+    )
+
+    objects = DeletionJobManager()
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    @property
+    def progress(self) -> int:
+        """The percentage of cleared chunks."""
+
+        if self.state == self.State.DONE:
+            return 100
+        if not self.chunks_total:
+            return 0
+        return self.chunks_done * 100 // self.chunks_total
+
+    def __str__(self):
+        return f"Deletion of {self.target_type} {self.name}"
@@ -1,3 +1,5 @@
+import uuid
+
 from rest_framework import serializers
 from rest_framework.exceptions import ValidationError
 
@@ -14,3 +16,32 @@ class ControllerMessageSerializer(serializers.ModelSerializer):
         if not message_type in ControllerMessage.TYPES:
             raise ValidationError(detail=f"message type not recognized: {message_type}")
         return message
+
+
+class DataPointSeriesSerializer(serializers.Serializer):
+    """Validates the query parameters for exporting data point series. Each series is
+    given as "<peripheral component UUID>:<data point type UUID>"."""
+
+    series = serializers.ListField(child=serializers.CharField(), allow_empty=False)
+    from_time = serializers.DateTimeField(required=False)
+    before_time = serializers.DateTimeField(required=False)
+    bucket = serializers.DurationField(required=False)
+
+    def validate_series(self, series):
+        pairs = []
+        for pair in series:
+            try:
+                peripheral_component, data_point_type = pair.split(":")
+                pairs.append(
+                    (uuid.UUID(peripheral_component), uuid.UUID(data_point_type))
+                )
+            except ValueError as err:
+                raise ValidationError(
+                    detail=f"Series not formatted as <peripheral>:<data point type>: {pair}"
+                ) from err
+        return pairs
+
+    def validate_bucket(self, bucket):
+        if bucket.total_seconds() <= 0:
+            raise ValidationError(detail="The bucket must be a positive duration")
+        return bucket
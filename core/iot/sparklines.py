@@ -0,0 +1,64 @@
+"""Sparklines, i.e., small fixed-size trends of the recent data points of peripherals.
+
+Resolving a trend per peripheral of a list, e.g., with dataPointsByHour, runs a query
+per row. Instead, the sparkline field of PeripheralComponentNode loads its series
+through a DataLoader per hours and points, so all peripherals of a page are averaged
+into their buckets by a single query over all their series."""
+
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Hashable, List
+
+from promise import Promise
+from promise.dataloader import DataLoader
+
+from core.dataloaders import get_context_loader
+from iot.models import DataPoint
+
+MAX_HOURS = 24 * 31
+MAX_POINTS = 200
+
+
+class SparklineLoader(DataLoader):
+    """Loads the sparklines of peripheral components over the given hours until now,
+    each a list of the data point type ID and its bucket averages, or None for buckets
+    without data points. Only data point types with data points are included."""
+
+    def __init__(self, hours: int, points: int, cache=True):
+        super().__init__(cache=cache)
+        self.points = points
+        # All peripherals of the operation share the same buckets
+        self.before_time = datetime.now(timezone.utc)
+        self.from_time = self.before_time - timedelta(hours=hours)
+
+    def batch_load_fn(self, keys: List[Hashable]) -> Promise:
+        series: Dict = defaultdict(lambda: [None] * self.points)
+        for (
+            peripheral_component_id,
+            data_point_type_id,
+            bucket,
+            value,
+        ) in DataPoint.objects.sparklines(
+            keys, self.from_time, self.before_time, self.points
+        ):
+            key = (str(peripheral_component_id), str(data_point_type_id))
+            series[key][bucket] = value
+
+        by_peripheral: Dict[str, List[Dict]] = defaultdict(list)
+        for (peripheral_component_id, data_point_type_id), values in sorted(
+            series.items()
+        ):
+            by_peripheral[peripheral_component_id].append(
+                {"data_point_type_id": data_point_type_id, "values": values}
+            )
+        return Promise.resolve([by_peripheral.get(str(key), []) for key in keys])
+
+
+def get_sparkline_loader(info, hours: int, points: int) -> SparklineLoader:
+    """The sparkline loader of the arguments in the current GraphQL operation."""
+
+    return get_context_loader(
+        info,
+        (SparklineLoader, hours, points),
+        lambda cache: SparklineLoader(hours, points, cache=cache),
+    )
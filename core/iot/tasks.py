@@ -1,3 +1,120 @@
+from datetime import datetime, timedelta, timezone
+
+from celery import shared_task
+from celery.utils.log import get_task_logger
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Max, Min
+
+from iot.cold_storage import archive_data_points
+from iot.deletion import run_deletion_job
+from iot.models import DataPointBackfill, DeletionJob
+from iot.timescale import (
+    Chunk,
+    compress_chunks,
+    decompress_chunks,
+    get_chunks,
+    merge_staged_data_points,
+)
+
+logger = get_task_logger(__name__)
+
+# Arbitrary key of the advisory lock that prevents concurrent backfill merges
+BACKFILL_LOCK_ID = 8_412_031
+
+
+def _merge_backfill_range(last_id: int, chunk: Chunk = None) -> int:
+    """Merge the staged data points up to the last ID in a single transaction and
+    return the number of new data points. If a chunk is given, only its time range is
+    merged and it is decompressed meanwhile."""
+
+    table = DataPointBackfill._meta.db_table
+    staged = DataPointBackfill.objects.filter(id__lte=last_id)
+    where = "id <= %s"
+    params = [last_id]
+    if chunk:
+        staged = staged.filter(time__gte=chunk.range_start, time__lt=chunk.range_end)
+        where += " AND time >= %s AND time < %s"
+        params += [chunk.range_start, chunk.range_end]
+
+    with transaction.atomic():
+        if not staged.exists():
+            return 0
+        decompressed = decompress_chunks([chunk]) if chunk else []
+        merged = merge_staged_data_points(table, where, params)
+        compress_chunks(chunk.name for chunk in decompressed)
+    if merged.archived:
+        logger.warning(
+            "Rejected %d backfill data points older than their archived data points",
+            merged.archived,
+        )
+    return merged.inserted
+
+
+@shared_task
+def merge_data_point_backfill() -> int:
+    """Merge the staged backfill data points into the data point hypertable. Each
+    chunk is merged in its own transaction, decompressing and compressing it again if
+    needed. Returns the number of new data points."""
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_try_advisory_lock(%s)", [BACKFILL_LOCK_ID])
+        if not cursor.fetchone()[0]:
+            logger.info("Backfill merge already running")
+            return 0
+    try:
+        # Data points staged while merging are left for the next run
+        staged = DataPointBackfill.objects.aggregate(
+            last_id=Max("id"), start=Min("time"), end=Max("time")
+        )
+        if staged["last_id"] is None:
+            return 0
+        merged = 0
+        end = staged["end"] + timedelta(microseconds=1)
+        for chunk in get_chunks(staged["start"], end):
+            merged += _merge_backfill_range(staged["last_id"], chunk)
+        # The remaining data points are outside any existing chunk
+        merged += _merge_backfill_range(staged["last_id"])
+        logger.info("Merged %d backfill data points", merged)
+        return merged
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", [BACKFILL_LOCK_ID])
+
+
+@shared_task
+def archive_old_data_points() -> int:
+    """Move the chunks of data points older than the archive age to cold storage.
+    Returns the number of archived data points."""
+
+    if not settings.DATA_POINT_ARCHIVE_AGE:
+        return 0
+    older_than = datetime.now(timezone.utc) - settings.DATA_POINT_ARCHIVE_AGE
+    archived = archive_data_points(older_than)
+    logger.info("Archived %d data points older than %s", archived, older_than)
+    return archived
+
+
+@shared_task
+def delete_detached_site(job_id: str):
+    """Run the deletion job of a detached site or controller."""
+
+    job = DeletionJob.objects.select_related("site").get(pk=job_id)
+    try:
+        run_deletion_job(job)
+    except Exception as err:
+        job.state = DeletionJob.State.FAILED
+        job.error = str(err)
+        job.save(update_fields=["state", "error", "modified_at"])
+        raise
+    logger.info(
+        "Deleted %s with %d data points and %d messages",
+        job,
+        job.deleted_data_points,
+        job.deleted_messages,
+    )
+
+
 # import uuid
 
 # from celery import shared_task, current_task
@@ -86,4 +203,3 @@
 #     certificate = client.cert()
 #     certificate_key = client.certificate_key
 #     account_key = client.account_key
-
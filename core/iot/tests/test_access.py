@@ -0,0 +1,88 @@
+from types import SimpleNamespace
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from iot.access import (
+    can_access_peripheral_component,
+    can_access_site,
+    filter_by_site_entity,
+    get_accessible_ids,
+)
+from iot.models import (
+    ControllerComponent,
+    ControllerComponentType,
+    ControllerMessage,
+    PeripheralComponent,
+    Site,
+    SiteEntity,
+)
+
+
+class AccessibleIdsTests(TestCase):
+    """Test the owner scoping by cached IDs"""
+
+    def setUp(self):
+        self.owner = get_user_model().objects.create_user(
+            email="owner@bar.com", password="foo"
+        )
+        self.other = get_user_model().objects.create_user(
+            email="other@bar.com", password="foo"
+        )
+        self.site = Site.objects.create(name="Site A", owner=self.owner)
+        self.other_site = Site.objects.create(name="Site Z", owner=self.other)
+        esp32_type = ControllerComponentType.objects.create(name="ESP32")
+        self.controllers = [
+            ControllerComponent.objects.create(
+                component_type=esp32_type,
+                site_entity=SiteEntity.objects.create(name="ESP32", site=site),
+            )
+            for site in (self.site, self.other_site)
+        ]
+        self.peripheral, self.other_peripheral = [
+            PeripheralComponent.objects.create(
+                peripheral_type=PeripheralComponent.PeripheralType.ANALOG_IN,
+                site_entity=SiteEntity.objects.create(name="Peri", site=site),
+                controller_component=controller,
+                state=PeripheralComponent.State.ADDED,
+                other_parameters={},
+            )
+            for site, controller in zip((self.site, self.other_site), self.controllers)
+        ]
+
+    def create_info(self, operation="query"):
+        return SimpleNamespace(
+            context=SimpleNamespace(user=self.owner),
+            operation=SimpleNamespace(operation=operation),
+        )
+
+    def test_cached_ids(self):
+        """Test that the IDs are loaded once per query operation"""
+
+        info = self.create_info()
+        with self.assertNumQueries(2):
+            self.assertTrue(can_access_site(info, self.site.pk))
+            self.assertFalse(can_access_site(info, self.other_site.pk))
+            self.assertTrue(can_access_peripheral_component(info, self.peripheral.pk))
+            self.assertFalse(
+                can_access_peripheral_component(info, self.other_peripheral.pk)
+            )
+            self.assertFalse(can_access_peripheral_component(info, "invalid"))
+        self.assertIs(get_accessible_ids(info), get_accessible_ids(info))
+        self.assertIsNone(get_accessible_ids(self.create_info("mutation")))
+
+    def test_filter_by_site_entity(self):
+        """Test that querysets are filtered the same with and without cached IDs"""
+
+        for controller in self.controllers:
+            ControllerMessage.objects.create(controller=controller, message={})
+        for operation in ("query", "mutation"):
+            messages = filter_by_site_entity(
+                ControllerMessage.objects.all(),
+                self.create_info(operation),
+                "controller__site_entity",
+            )
+            self.assertEqual(
+                list(messages.values_list("controller_id", flat=True)),
+                [self.controllers[0].pk],
+            )
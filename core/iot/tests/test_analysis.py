@@ -0,0 +1,39 @@
+from django.test import SimpleTestCase
+
+from iot.analysis import linear_regression, pearson_correlation, to_matrix
+
+
+class AnalysisTests(SimpleTestCase):
+    """Test the statistics of aligned series"""
+
+    def setUp(self):
+        rows = [
+            (0, 1.0, 2.0, None),
+            (1, 2.0, 4.0, 5.0),
+            (2, 3.0, 6.0, 5.0),
+            (3, None, 8.0, 7.0),
+        ]
+        self.times, self.matrix = to_matrix(rows, 3)
+
+    def test_to_matrix(self):
+        self.assertEqual(self.times, [0, 1, 2, 3])
+        self.assertEqual(self.matrix.shape, (4, 3))
+        _, matrix = to_matrix([], 2)
+        self.assertEqual(matrix.shape, (0, 2))
+
+    def test_pearson_correlation(self):
+        """Test that only buckets with values of both series are correlated"""
+
+        correlation = pearson_correlation(self.matrix)
+        self.assertAlmostEqual(correlation[0][1], 1.0)
+        self.assertAlmostEqual(correlation[1][2], correlation[2][1])
+        # The third series is constant in the buckets shared with the first
+        self.assertIsNone(correlation[0][2])
+        self.assertEqual(pearson_correlation(to_matrix([], 2)[1]), [[None] * 2] * 2)
+
+    def test_linear_regression(self):
+        fits = linear_regression(self.matrix)
+        self.assertAlmostEqual(fits[1]["slope"], 2.0)
+        self.assertAlmostEqual(fits[1]["intercept"], 0.0)
+        self.assertAlmostEqual(fits[1]["r_squared"], 1.0)
+        self.assertAlmostEqual(fits[2]["slope"], 0.0)
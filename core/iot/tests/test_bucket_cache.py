@@ -0,0 +1,141 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from django.test import SimpleTestCase, override_settings
+
+from iot import bucket_cache
+from iot.models import DataPoint
+
+
+@override_settings(DATA_POINT_BUCKET_CACHE_TIMEOUT=60)
+class BucketCacheTests(SimpleTestCase):
+    """Test the cache of closed aggregation buckets"""
+
+    def setUp(self):
+        self.peripheral_component_id = str(uuid.uuid4())
+        self.data_point_type_id = str(uuid.uuid4())
+        self.open_hour = bucket_cache.get_closed_before(timedelta(hours=1))
+        self.first_hour = self.open_hour - timedelta(hours=30)
+        self.ranges = []
+
+    def aggregate(self, from_time, before_time, ascending, limit):
+        """Return the hourly buckets since the first hour, numbered by the call"""
+
+        self.ranges.append((from_time, before_time))
+        start = max(from_time or self.first_hour, self.first_hour)
+        end = before_time or self.open_hour + timedelta(hours=1)
+        hours = range(max((end - start) // timedelta(hours=1), 0))
+        rows = [
+            {"time_hour": start + timedelta(hours=hour), "avg": len(self.ranges)}
+            for hour in (hours if ascending else reversed(hours))
+        ]
+        return rows[:limit]
+
+    def get_buckets(self, from_time=None, ascending=False, limit=100):
+        return bucket_cache.cached_buckets(
+            "time_hour",
+            self.peripheral_component_id,
+            self.data_point_type_id,
+            from_time,
+            None,
+            ascending,
+            limit,
+            self.aggregate,
+        )
+
+    def test_closed_buckets(self):
+        """Test that only the open bucket is aggregated again, also for sliding
+        windows"""
+
+        rows = self.get_buckets(self.open_hour - timedelta(hours=6))
+        self.assertEqual(
+            [row["time_hour"] for row in rows],
+            [self.open_hour - timedelta(hours=hour) for hour in range(7)],
+        )
+        self.assertEqual(self.ranges[0], (self.open_hour, None))
+        calls = len(self.ranges)
+
+        rows = self.get_buckets(self.open_hour - timedelta(hours=5))
+        self.assertEqual(len(self.ranges), calls + 1)
+        self.assertEqual(self.ranges[-1], (self.open_hour, None))
+        self.assertEqual(rows[0]["avg"], calls + 1)
+        self.assertEqual(
+            [row["time_hour"] for row in rows],
+            [self.open_hour - timedelta(hours=hour) for hour in range(6)],
+        )
+        self.assertTrue(all(row["avg"] <= calls for row in rows[1:]))
+
+        rows = self.get_buckets(self.open_hour - timedelta(hours=3), True, 2)
+        self.assertEqual(
+            [row["time_hour"] for row in rows],
+            [self.open_hour - timedelta(hours=3), self.open_hour - timedelta(hours=2)],
+        )
+
+        # Ranges within the open bucket are never cached
+        calls = len(self.ranges)
+        self.get_buckets(self.open_hour)
+        self.assertEqual(self.ranges[calls:], [(self.open_hour, None)])
+
+    def test_whole_series(self):
+        """Test that the series is read from the cached blocks and the rest of the
+        range after the blocks needed for the limit"""
+
+        rows = self.get_buckets(limit=20)
+        self.assertEqual(len(rows), 20)
+        self.assertEqual(rows[0]["time_hour"], self.open_hour)
+        rows = self.get_buckets(limit=100)
+        self.assertEqual(
+            [row["time_hour"] for row in rows],
+            [self.open_hour - timedelta(hours=hour) for hour in range(31)],
+        )
+        # The range before the blocks is aggregated at once, as it might be empty
+        self.assertEqual(self.ranges[-1][0], None)
+
+        rows = self.get_buckets(ascending=True, limit=5)
+        self.assertEqual(rows[0]["time_hour"], self.first_hour)
+
+    @override_settings(DATA_POINT_BUCKET_CACHE_TIMEOUT=0)
+    def test_disabled(self):
+        """Test that the whole range is aggregated if the cache is disabled"""
+
+        self.get_buckets(self.open_hour - timedelta(hours=6))
+        self.get_buckets(self.open_hour - timedelta(hours=6))
+        self.assertEqual(self.ranges, [(self.open_hour - timedelta(hours=6), None)] * 2)
+
+    def test_invalidation(self):
+        """Test that only data points of closed buckets invalidate the cache"""
+
+        def create_data_point(time):
+            return DataPoint(
+                time=time,
+                value=1,
+                peripheral_component_id=self.peripheral_component_id,
+                data_point_type_id=self.data_point_type_id,
+            )
+
+        from_time = self.open_hour - timedelta(hours=3)
+        self.get_buckets(from_time)
+        calls = len(self.ranges)
+        bucket_cache.invalidate_data_points([create_data_point(self.open_hour)])
+        self.get_buckets(from_time)
+        self.assertEqual(len(self.ranges), calls + 1)
+
+        bucket_cache.invalidate_data_points(
+            [create_data_point(self.open_hour - timedelta(minutes=1))]
+        )
+        rows = self.get_buckets(from_time)
+        self.assertGreater(len(self.ranges), calls + 2)
+        self.assertTrue(all(row["avg"] > calls + 1 for row in rows))
+
+    def test_closed_before(self):
+        """Test that buckets are aligned to UTC hours and days"""
+
+        now = datetime(2021, 4, 1, 12, 34, 56, tzinfo=timezone.utc)
+        self.assertEqual(
+            bucket_cache.get_closed_before(timedelta(hours=1), now),
+            datetime(2021, 4, 1, 12, tzinfo=timezone.utc),
+        )
+        self.assertEqual(
+            bucket_cache.get_closed_before(timedelta(days=1), now),
+            datetime(2021, 4, 1, tzinfo=timezone.utc),
+        )
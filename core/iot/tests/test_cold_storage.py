@@ -0,0 +1,222 @@
+import shutil
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+from django.contrib.auth import get_user_model
+from django.test import RequestFactory, TestCase, override_settings
+from graphql_relay.node.node import to_global_id
+
+from core.schema import schema
+from iot.cold_storage import (
+    archive_data_points,
+    archived_buckets,
+    archived_until,
+    get_archive_storage,
+    read_archived_data_points,
+)
+from iot.models import (
+    ControllerComponent,
+    ControllerComponentType,
+    DataPoint,
+    DataPointArchive,
+    DataPointBackfill,
+    DataPointType,
+    PeripheralComponent,
+    Site,
+    SiteEntity,
+)
+from iot.tasks import merge_data_point_backfill
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(
+    DATA_POINT_ARCHIVE_STORAGE="django.core.files.storage.FileSystemStorage",
+    MEDIA_ROOT=MEDIA_ROOT,
+)
+class ColdStorageTests(TestCase):
+    """Test moving data points to Parquet objects and reading them again"""
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.owner = get_user_model().objects.create_user(
+            email="owner@bar.com", password="foo"
+        )
+        site = Site.objects.create(name="Site A", owner=self.owner)
+        controller = ControllerComponent.objects.create(
+            component_type=ControllerComponentType.objects.create(name="ESP32"),
+            site_entity=SiteEntity.objects.create(name="ESP32 A", site=site),
+        )
+        self.bme280 = PeripheralComponent.objects.create(
+            site_entity=SiteEntity.objects.create(name="BME280 A", site=site),
+            peripheral_type=PeripheralComponent.PeripheralType.BME280_SENSOR.value,
+            controller_component=controller,
+        )
+        self.air_temperature = DataPointType.objects.create(name="Air Temp", unit="°C")
+        self.air_pressure = DataPointType.objects.create(name="Air Pressure", unit="Pa")
+
+        # Two days of hourly data points in the same weekly chunk and a recent one
+        self.start = datetime(2020, 1, 6, tzinfo=timezone.utc)
+        for hour in range(48):
+            for data_point_type in (self.air_temperature, self.air_pressure):
+                DataPoint.objects.create(
+                    time=self.start + timedelta(hours=hour),
+                    value=hour,
+                    peripheral_component=self.bme280,
+                    data_point_type=data_point_type,
+                )
+        DataPoint.objects.create(
+            value=100,
+            peripheral_component=self.bme280,
+            data_point_type=self.air_temperature,
+        )
+
+    def test_archive(self):
+        """Test that old chunks are archived and dropped"""
+
+        older_than = datetime.now(timezone.utc) - timedelta(days=30)
+        self.assertEqual(archive_data_points(older_than), 96)
+        self.assertEqual(DataPoint.objects.count(), 1)
+        archive = DataPointArchive.objects.get()
+        self.assertEqual(archive.peripheral_component, self.bme280)
+        self.assertEqual(archive.start_time, self.start)
+        self.assertEqual(archive.end_time, self.start + timedelta(hours=47))
+        self.assertTrue(get_archive_storage().exists(archive.path))
+        self.assertIn(f"peripheral_component={self.bme280.pk}/year=2020", archive.path)
+
+        # Nothing left to archive
+        self.assertEqual(archive_data_points(older_than), 0)
+
+    def test_read_archive(self):
+        """Test reading archived data points of a series and time range"""
+
+        archive_data_points(datetime.now(timezone.utc) - timedelta(days=30))
+        table = read_archived_data_points(self.bme280.pk, self.air_temperature.pk)
+        self.assertEqual(table.column("value").to_pylist(), list(range(48)))
+        self.assertEqual(table.column("time")[0].as_py(), self.start)
+
+        table = read_archived_data_points(
+            self.bme280.pk,
+            self.air_temperature.pk,
+            from_time=self.start + timedelta(hours=10),
+            before_time=self.start + timedelta(hours=20),
+        )
+        self.assertEqual(table.column("value").to_pylist(), list(range(10, 20)))
+
+        # Other owners have no access
+        other_owner = get_user_model().objects.create_user(
+            email="other@bar.com", password="foo"
+        )
+        table = read_archived_data_points(
+            self.bme280.pk, self.air_temperature.pk, owner=other_owner
+        )
+        self.assertEqual(table.num_rows, 0)
+
+    def test_archived_buckets(self):
+        """Test aggregating archived data points like by_day()"""
+
+        archive_data_points(datetime.now(timezone.utc) - timedelta(days=30))
+        days = archived_buckets(
+            self.bme280.pk,
+            self.air_pressure.pk,
+            timedelta(days=1),
+            "day",
+            owner=self.owner,
+        )
+        self.assertEqual(len(days), 2)
+        self.assertEqual(days[0]["day"], self.start)
+        self.assertEqual(days[0]["avg"], 11.5)
+        self.assertEqual(days[1]["min"], 24)
+        self.assertEqual(days[1]["max"], 47)
+
+    def test_database_queries(self):
+        """Test that queries of the database only reject ranges reaching into the
+        archive and flag the archived data points"""
+
+        self.assertIsNone(archived_until())
+        archive_data_points(datetime.now(timezone.utc) - timedelta(days=30))
+        end_time = self.start + timedelta(hours=47)
+        self.assertEqual(archived_until(), end_time)
+
+        request = RequestFactory().get("/graphql/")
+        request.user = self.owner
+        query = """
+            query (
+                $peripheralComponent: ID!
+                $site: ID!
+                $series: [SeriesInput!]!
+                $fromTime: DateTime
+                $beforeTime: DateTime
+            ) {
+                dataPointGaps(
+                    peripheralComponent: $peripheralComponent
+                    fromTime: $fromTime
+                    beforeTime: $beforeTime
+                ) { start }
+                siteAvailability(
+                    site: $site, fromTime: $fromTime, beforeTime: $beforeTime
+                ) { availability }
+                alignedSeries(
+                    series: $series, fromTime: $fromTime, beforeTime: $beforeTime
+                ) { times }
+            }"""
+        peripheral_component = to_global_id("PeripheralComponentNode", self.bme280.pk)
+        variables = {
+            "peripheralComponent": peripheral_component,
+            "site": to_global_id("SiteNode", self.bme280.site_entity.site_id),
+            "series": [
+                {
+                    "peripheralComponent": peripheral_component,
+                    "dataPointType": to_global_id(
+                        "DataPointTypeNode", self.air_temperature.pk
+                    ),
+                }
+            ],
+            "fromTime": end_time.isoformat(),
+            "beforeTime": (end_time + timedelta(hours=1)).isoformat(),
+        }
+        result = schema.execute(query, context=request, variables=variables)
+        self.assertEqual(len(result.errors), 3)
+        for error in result.errors:
+            self.assertIn("archived until", error.message)
+
+        variables["fromTime"] = (end_time + timedelta(seconds=1)).isoformat()
+        result = schema.execute(query, context=request, variables=variables)
+        self.assertIsNone(result.errors)
+
+        result = schema.execute(
+            "{ allDataPoints(first: 10) { archivedUntil edges { node { value } } } }",
+            context=request,
+        )
+        self.assertIsNone(result.errors)
+        data_points = result.data["allDataPoints"]
+        self.assertEqual(data_points["archivedUntil"], end_time.isoformat())
+        self.assertEqual(data_points["edges"], [{"node": {"value": 100.0}}])
+
+    def test_reject_archived_backfill(self):
+        """Test that staged data points are not merged into archived time ranges"""
+
+        archive_data_points(datetime.now(timezone.utc) - timedelta(days=30))
+        end_time = self.start + timedelta(hours=47)
+        for time in (end_time, end_time + timedelta(minutes=1)):
+            DataPointBackfill.objects.create(
+                time=time,
+                value=50,
+                peripheral_component=self.bme280,
+                data_point_type=self.air_temperature,
+            )
+
+        self.assertEqual(merge_data_point_backfill(), 1)
+        self.assertFalse(DataPointBackfill.objects.exists())
+        self.assertEqual(
+            list(
+                DataPoint.objects.filter(
+                    time__lt=self.start + timedelta(days=30)
+                ).values_list("time", flat=True)
+            ),
+            [end_time + timedelta(minutes=1)],
+        )
@@ -78,6 +78,12 @@ class TestControllerComponent(TestCase):
             message={"type": "tel", "jo": some_command},
         )
         self.assertEqual({"type": "tel", "jo": some_command}, message.to_telemetry())
+        self.assertFalse(message.to_backfill())
+        message.message["type"] = "backfill"
+        self.assertFalse(message.to_telemetry())
+        self.assertEqual(
+            {"type": "backfill", "jo": some_command}, message.to_backfill()
+        )
 
         message = ControllerMessage(
             controller=self.esp32_a_controller,
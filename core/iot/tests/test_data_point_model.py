@@ -8,11 +8,13 @@ from iot.models import (
     ControllerComponent,
     ControllerComponentType,
     DataPoint,
+    DataPointBackfill,
     DataPointType,
     PeripheralComponent,
     Site,
     SiteEntity,
 )
+from iot.tasks import merge_data_point_backfill
 
 
 class DataPointTests(TestCase):
@@ -350,4 +352,187 @@ class DataPointAggregationTests(TestCase):
         self.assertEqual(hour_ten_dps["time_hour"], hour_ten)
         self.assertEqual(hour_ten_dps["avg"], 56.0)
         self.assertEqual(hour_ten_dps["min"], 54.0)
-        self.assertEqual(hour_ten_dps["max"], 58.0)
\ No newline at end of file
+        self.assertEqual(hour_ten_dps["max"], 58.0)
+
+    def test_gaps(self):
+        """Test finding the intervals without data points"""
+
+        day_one = self.now.replace(hour=0, minute=0, second=0, microsecond=0)
+        gaps = DataPoint.objects.gaps(
+            self.peripheral_a.pk,
+            day_one,
+            day_one + timedelta(days=2),
+            min_gap=timedelta(hours=1),
+        )
+        # The data points of a day end at 16:20 and the gaps at the next bucket
+        self.assertEqual(
+            gaps,
+            [
+                {
+                    "start": day_one + timedelta(hours=16, minutes=21),
+                    "end": day_one + timedelta(days=1),
+                },
+                {
+                    "start": day_one + timedelta(days=1, hours=16, minutes=21),
+                    "end": day_one + timedelta(days=2),
+                },
+            ],
+        )
+
+        # The whole range is a gap for other data point types
+        gaps = DataPoint.objects.gaps(
+            self.peripheral_a.pk,
+            day_one,
+            day_one + timedelta(days=2),
+            data_point_type_id=self.data_point_type_b.pk,
+        )
+        self.assertEqual(gaps, [{"start": day_one, "end": day_one + timedelta(days=2)}])
+
+    def test_availability(self):
+        """Test summarizing the availability of a site's peripherals"""
+
+        day_one = self.now.replace(hour=0, minute=0, second=0, microsecond=0)
+        availability = DataPoint.objects.availability(
+            self.site.pk, day_one, day_one + timedelta(days=1), timedelta(hours=1)
+        )
+        self.assertEqual(
+            [row["peripheral_component"] for row in availability],
+            [self.peripheral_a, self.peripheral_b],
+        )
+        self.assertEqual(availability[0]["availability"], 17 / 24)
+        self.assertEqual(
+            availability[0]["last_seen"], day_one + timedelta(hours=16, minutes=20)
+        )
+
+    def test_aligned(self):
+        """Test aligning series onto a common grid of buckets"""
+
+        day_one = self.now.replace(hour=0, minute=0, second=0, microsecond=0)
+        rows = DataPoint.objects.aligned(
+            [
+                (self.peripheral_a.pk, self.data_point_type_a.pk),
+                (self.peripheral_b.pk, self.data_point_type_b.pk),
+                (self.peripheral_b.pk, self.data_point_type_a.pk),
+            ],
+            day_one,
+            day_one + timedelta(days=1),
+            timedelta(hours=1),
+        )
+        self.assertEqual(len(rows), 17)
+        self.assertEqual(rows[0], (day_one, 1.0, 2.0, None))
+
+
+class DataPointBackfillTests(TestCase):
+    """Test staging late telemetry and merging it into the data points"""
+
+    def setUp(self):
+        site = Site.objects.create(
+            name="Site A",
+            owner=get_user_model().objects.create_user(
+                email="owner@bar.com",
+                password="foo",
+            ),
+        )
+        controller = ControllerComponent.objects.create(
+            component_type=ControllerComponentType.objects.create(name="ESP32"),
+            site_entity=SiteEntity.objects.create(name="ESP32 A", site=site),
+        )
+        self.bme280 = PeripheralComponent.objects.create(
+            site_entity=SiteEntity.objects.create(name="BME280 A", site=site),
+            peripheral_type=PeripheralComponent.PeripheralType.BME280_SENSOR.value,
+            controller_component=controller,
+        )
+        self.air_temperature = DataPointType.objects.create(name="Air Temp", unit="°C")
+
+    def to_telemetry(self, time, value):
+        return {
+            "peripheral": str(self.bme280.pk),
+            "time": time,
+            "data_points": [
+                {"value": value, "data_point_type": str(self.air_temperature.pk)},
+            ],
+        }
+
+    def test_is_late(self):
+        """Test that only telemetry older than the backfill age is late"""
+
+        now = datetime.now(tz=timezone.utc)
+        self.assertFalse(DataPointBackfill.objects.is_late({"data_points": []}))
+        self.assertFalse(DataPointBackfill.objects.is_late(self.to_telemetry(now, 1)))
+        late_telemetry = self.to_telemetry(now - timedelta(days=30), 1)
+        self.assertTrue(DataPointBackfill.objects.is_late(late_telemetry))
+        late_telemetry["time"] = str(late_telemetry["time"])
+        self.assertTrue(DataPointBackfill.objects.is_late(late_telemetry))
+        self.assertRaises(
+            ValueError,
+            DataPointBackfill.objects.is_late,
+            self.to_telemetry(datetime.now(), 1),
+        )
+
+    def test_merge(self):
+        """Test that staged data points are merged and removed from the staging table"""
+
+        time = datetime(2021, 1, 1, tzinfo=timezone.utc)
+        DataPoint.objects.create(
+            time=time,
+            value=10,
+            peripheral_component=self.bme280,
+            data_point_type=self.air_temperature,
+        )
+        # The first data point is a duplicate of the existing one
+        DataPointBackfill.objects.from_telemetry(self.to_telemetry(time, 10))
+        for days in range(1, 31):
+            DataPointBackfill.objects.from_telemetry(
+                self.to_telemetry(time + timedelta(days=days), days)
+            )
+        self.assertEqual(DataPointBackfill.objects.count(), 31)
+
+        self.assertEqual(merge_data_point_backfill(), 30)
+        self.assertEqual(DataPointBackfill.objects.count(), 0)
+        self.assertEqual(DataPoint.objects.count(), 31)
+        self.assertEqual(DataPoint.objects.first().value, 30)
+
+        # Nothing left to merge
+        self.assertEqual(merge_data_point_backfill(), 0)
+
+    def test_merge_collisions(self):
+        """Test that staged data points colliding with other series are kept"""
+
+        time = datetime(2021, 1, 1, tzinfo=timezone.utc)
+        air_humidity = DataPointType.objects.create(name="Air Humidity", unit="%")
+        DataPoint.objects.create(
+            time=time,
+            value=50,
+            peripheral_component=self.bme280,
+            data_point_type=air_humidity,
+        )
+        # The same timestamp as the other series, twice and with a repeated reading
+        DataPointBackfill.objects.from_telemetry(self.to_telemetry(time, 20))
+        DataPointBackfill.objects.from_telemetry(self.to_telemetry(time, 21))
+        DataPointBackfill.objects.from_telemetry(self.to_telemetry(time, 21))
+
+        self.assertEqual(merge_data_point_backfill(), 2)
+        self.assertEqual(DataPointBackfill.objects.count(), 0)
+        self.assertEqual(
+            list(
+                DataPoint.objects.order_by("time").values_list(
+                    "data_point_type", "value"
+                )
+            ),
+            [
+                (air_humidity.pk, 50),
+                (self.air_temperature.pk, 20),
+                (self.air_temperature.pk, 21),
+            ],
+        )
+        self.assertEqual(
+            DataPoint.objects.order_by("time")[2].time,
+            time + timedelta(microseconds=2),
+        )
+
+        # Merging the same data points again only finds the duplicates
+        DataPointBackfill.objects.from_telemetry(self.to_telemetry(time, 20))
+        DataPointBackfill.objects.from_telemetry(self.to_telemetry(time, 21))
+        self.assertEqual(merge_data_point_backfill(), 0)
+        self.assertEqual(DataPoint.objects.count(), 3)
+        self.assertEqual(DataPointBackfill.objects.count(), 0)
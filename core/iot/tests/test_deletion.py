@@ -0,0 +1,153 @@
+from datetime import datetime, timedelta, timezone
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from iot.deletion import delete_chunk_data_points
+from iot.models import (
+    ControllerAuthToken,
+    ControllerComponent,
+    ControllerComponentType,
+    ControllerMessage,
+    DataPoint,
+    DataPointBackfill,
+    DataPointType,
+    DeletionJob,
+    PeripheralComponent,
+    Site,
+    SiteEntity,
+)
+from iot.tasks import delete_detached_site
+from iot.timescale import get_chunks
+
+
+class DeletionJobTests(TestCase):
+    """Test the background deletion of sites and controllers"""
+
+    def setUp(self):
+        self.owner = get_user_model().objects.create_user(
+            email="owner@bar.com", password="foo"
+        )
+        self.site_a = Site.objects.create(name="Site A", owner=self.owner)
+        self.site_b = Site.objects.create(name="Site B", owner=self.owner)
+        self.esp32_type = ControllerComponentType.objects.create(name="ESP32")
+        self.air_temperature = DataPointType.objects.create(name="Air Temp", unit="°C")
+        self.controller_a, self.bme280_a = self.create_controller(self.site_a, "A")
+        self.controller_b, self.bme280_b = self.create_controller(self.site_b, "B")
+
+    def create_controller(self, site, name):
+        controller = ControllerComponent.objects.create(
+            component_type=self.esp32_type,
+            site_entity=SiteEntity.objects.create(name=f"ESP32 {name}", site=site),
+        )
+        ControllerAuthToken.objects.create(controller=controller)
+        peripheral = PeripheralComponent.objects.create(
+            site_entity=SiteEntity.objects.create(name=f"BME280 {name}", site=site),
+            peripheral_type=PeripheralComponent.PeripheralType.BME280_SENSOR.value,
+            controller_component=controller,
+        )
+        now = datetime.now(timezone.utc)
+        for days in range(3):
+            DataPoint.objects.create(
+                time=now - timedelta(days=days * 30),
+                value=days,
+                peripheral_component=peripheral,
+                data_point_type=self.air_temperature,
+            )
+        DataPointBackfill.objects.create(
+            time=now - timedelta(days=100),
+            value=4,
+            peripheral_component=peripheral,
+            data_point_type=self.air_temperature,
+        )
+        ControllerMessage.objects.create(controller=controller, message={})
+        return controller, peripheral
+
+    def test_delete_site(self):
+        """Test detaching a site and deleting its time series"""
+
+        job = DeletionJob.objects.detach_site(self.site_a, self.owner)
+        self.assertFalse(Site.objects.filter(owner=self.owner, pk=self.site_a.pk))
+        self.assertFalse(
+            ControllerAuthToken.objects.filter(controller=self.controller_a)
+        )
+        self.assertEqual(job.state, DeletionJob.State.PENDING)
+
+        delete_detached_site(job.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.state, DeletionJob.State.DONE)
+        self.assertEqual(job.progress, 100)
+        self.assertEqual(job.deleted_data_points, 4)
+        self.assertEqual(job.deleted_messages, 1)
+        self.assertFalse(Site.objects.filter(pk=self.site_a.pk))
+        self.assertFalse(DataPoint.objects.filter(peripheral_component=self.bme280_a))
+        self.assertFalse(
+            DataPointBackfill.objects.filter(peripheral_component=self.bme280_a)
+        )
+
+        # The data of other sites is left untouched
+        self.assertEqual(
+            DataPoint.objects.filter(peripheral_component=self.bme280_b).count(), 3
+        )
+        self.assertEqual(
+            ControllerMessage.objects.filter(controller=self.controller_b).count(), 1
+        )
+
+    def test_delete_chunk_data_points(self):
+        """Test that chunks are only changed if they hold data points to delete"""
+
+        # Chunks of only one of the peripherals besides the ones holding both
+        old = datetime.now(timezone.utc) - timedelta(days=400)
+        for time, peripheral in (
+            (old, self.bme280_a),
+            (old - timedelta(days=100), self.bme280_b),
+        ):
+            DataPoint.objects.create(
+                time=time,
+                value=5,
+                peripheral_component=peripheral,
+                data_point_type=self.air_temperature,
+            )
+        chunks = get_chunks()
+        self.assertEqual(len(chunks), 5)
+
+        peripheral_component_ids = [str(self.bme280_a.pk)]
+        deleted = [
+            delete_chunk_data_points(chunk, peripheral_component_ids)
+            for chunk in chunks
+        ]
+        # Oldest first: the chunk of the other peripheral is skipped
+        self.assertEqual(deleted, [0, 1, 1, 1, 1])
+        self.assertFalse(DataPoint.objects.filter(peripheral_component=self.bme280_a))
+        self.assertEqual(
+            DataPoint.objects.filter(peripheral_component=self.bme280_b).count(), 4
+        )
+        # Only the chunk of the deleted peripheral is dropped
+        self.assertEqual(
+            [chunk.name for chunk in get_chunks()],
+            [chunks[0].name] + [chunk.name for chunk in chunks[2:]],
+        )
+
+    def test_delete_controller(self):
+        """Test detaching a controller and deleting it with its peripherals"""
+
+        job = DeletionJob.objects.detach_controller(
+            self.controller_a.site_entity, self.owner
+        )
+        detached_site_id = job.site_id
+        self.assertFalse(
+            ControllerComponent.objects.filter(
+                site_entity__site__owner=self.owner, pk=self.controller_a.pk
+            )
+        )
+
+        delete_detached_site(job.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.state, DeletionJob.State.DONE)
+        self.assertFalse(ControllerComponent.objects.filter(pk=self.controller_a.pk))
+        self.assertFalse(PeripheralComponent.objects.filter(pk=self.bme280_a.pk))
+        self.assertFalse(Site.objects.filter(pk=detached_site_id))
+        self.assertFalse(DataPoint.objects.filter(peripheral_component=self.bme280_a))
+
+        # The site of the controller remains
+        self.assertTrue(Site.objects.filter(pk=self.site_a.pk, owner=self.owner))
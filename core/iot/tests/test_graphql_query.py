@@ -3,10 +3,17 @@ from datetime import datetime, timedelta, timezone
 from functools import reduce
 
 from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from graphene_django.utils.testing import GraphQLTestCase
 from graphql_relay.node.node import to_global_id
 
-from iot.models import ControllerComponentType, ControllerTask, PeripheralComponent
+from iot.models import (
+    ControllerComponentType,
+    ControllerTask,
+    PeripheralComponent,
+    PeripheralDataPointType,
+)
 from iot.models.controller import ControllerComponent
 from iot.models.data_point import DataPoint, DataPointType
 from iot.models.site import Site, SiteEntity
@@ -180,20 +187,17 @@ class QueryTestCase(GraphQLTestCase):
                     dataPointType: "{data_point_type_a_gid}",
                     fromDate: "{from_date.isoformat()}",
                     beforeDate: "{before_date.isoformat()}") {{
-                        day
-                        avg
-                        min
-                        max
+                        edges {{ node {{ day, avg, min, max }} }}
                 }}
             }}
             """
         )
         self.assertResponseNoErrors(response)
-        content = json.loads(response.content)["data"]["dataPointsByDay"]
+        content = json.loads(response.content)["data"]["dataPointsByDay"]["edges"]
         day_one_dp = next(
-            data_point
-            for data_point in content
-            if data_point["day"] == from_date.isoformat()
+            edge["node"]
+            for edge in content
+            if edge["node"]["day"] == from_date.isoformat()
         )
         self.assertEqual(day_one_dp["avg"], 24.5)
         self.assertEqual(day_one_dp["min"], 0)
@@ -214,25 +218,71 @@ class QueryTestCase(GraphQLTestCase):
                     dataPointType: "{data_point_type_b_gid}",
                     fromTime: "{hour_one.isoformat()}",
                     beforeTime: "{(hour_ten + timedelta(hours=10)).isoformat()}") {{
-                        timeHour
-                        avg
-                        min
-                        max
+                        edges {{ node {{ timeHour, avg, min, max }} }}
                 }}
             }}
             """
         )
         self.assertResponseNoErrors(response)
-        content = json.loads(response.content)["data"]["dataPointsByHour"]
+        content = json.loads(response.content)["data"]["dataPointsByHour"]["edges"]
         hour_ten_dp = next(
-            data_point
-            for data_point in content
-            if data_point["timeHour"] == hour_ten.isoformat()
+            edge["node"]
+            for edge in content
+            if edge["node"]["timeHour"] == hour_ten.isoformat()
         )
         self.assertEqual(hour_ten_dp["avg"], 56.0)
         self.assertEqual(hour_ten_dp["min"], 54.0)
         self.assertEqual(hour_ten_dp["max"], 58.0)
 
+    def test_data_point_hour_pagination(self):
+        """Test that all buckets are paged through by bucket time cursors"""
+
+        peripheral_gid = to_global_id("PeripheralComponentNode", self.peripheral_a.pk)
+        data_point_type_gid = to_global_id(
+            "DataPointTypeNode", self.data_point_type_a.pk
+        )
+        query = """
+            {{ dataPointsByHour(
+                peripheralComponent: "{}", dataPointType: "{}", ascending: {},
+                first: 30, after: "{}"
+            ) {{
+                pageInfo {{ hasNextPage, hasPreviousPage, endCursor }}
+                edges {{ node {{ timeHour }} }}
+            }} }}
+            """
+        hours = sorted(
+            {
+                data_point.time.replace(minute=0, second=0, microsecond=0).isoformat()
+                for data_point in DataPoint.objects.filter(
+                    peripheral_component=self.peripheral_a,
+                    data_point_type=self.data_point_type_a,
+                )
+            }
+        )
+        self.assertGreater(len(hours), 60)
+        for ascending in ("true", "false"):
+            pages = []
+            cursor = ""
+            while True:
+                response = self.query(
+                    query.format(peripheral_gid, data_point_type_gid, ascending, cursor)
+                )
+                self.assertResponseNoErrors(response)
+                page = json.loads(response.content)["data"]["dataPointsByHour"]
+                self.assertEqual(page["pageInfo"]["hasPreviousPage"], bool(cursor))
+                pages.append([i["node"]["timeHour"] for i in page["edges"]])
+                if not page["pageInfo"]["hasNextPage"]:
+                    break
+                cursor = page["pageInfo"]["endCursor"]
+            self.assertEqual(len(pages), -(-len(hours) // 30))
+            times = [time for page in pages for time in page]
+            self.assertEqual(times, hours if ascending == "true" else hours[::-1])
+
+        response = self.query(
+            query.format(peripheral_gid, data_point_type_gid, "true", "invalid")
+        )
+        self.assertResponseHasErrors(response)
+
     def test_data_point_ordering(self):
         """Test that the ordering is respected."""
 
@@ -280,13 +330,16 @@ class QueryTestCase(GraphQLTestCase):
             {{ dataPointsByDay(
                 ascending: {}, peripheralComponent: "{}", dataPointType: "{}"
             ) {{
-                day, avg
+                edges {{ node {{ day, avg }} }}
               }}
             }}
             """
         response = self.query(query.format("true", peripheral_gid, data_point_type_gid))
         self.assertResponseNoErrors(response)
-        data_points = json.loads(response.content)["data"]["dataPointsByDay"]
+        data_points = [
+            i["node"]
+            for i in json.loads(response.content)["data"]["dataPointsByDay"]["edges"]
+        ]
         data_point_query = DataPoint.objects.filter(
             peripheral_component=self.peripheral_a.pk,
             data_point_type=self.data_point_type_a.pk,
@@ -298,7 +351,10 @@ class QueryTestCase(GraphQLTestCase):
             query.format("false", peripheral_gid, data_point_type_gid)
         )
         self.assertResponseNoErrors(response)
-        data_points = json.loads(response.content)["data"]["dataPointsByDay"]
+        data_points = [
+            i["node"]
+            for i in json.loads(response.content)["data"]["dataPointsByDay"]["edges"]
+        ]
         time = data_point_query.first().time
         self.assertEqual(data_points[0]["day"], time.strftime("%Y-%m-%d"))
 
@@ -313,13 +369,16 @@ class QueryTestCase(GraphQLTestCase):
             {{ dataPointsByHour(
                 ascending: {}, peripheralComponent: "{}", dataPointType: "{}"
             ) {{
-                timeHour, avg
+                edges {{ node {{ timeHour, avg }} }}
               }}
             }}
             """
         response = self.query(query.format("true", peripheral_gid, data_point_type_gid))
         self.assertResponseNoErrors(response)
-        data_points = json.loads(response.content)["data"]["dataPointsByHour"]
+        data_points = [
+            i["node"]
+            for i in json.loads(response.content)["data"]["dataPointsByHour"]["edges"]
+        ]
         data_point_query = DataPoint.objects.filter(
             peripheral_component=self.peripheral_a.pk,
             data_point_type=self.data_point_type_a.pk,
@@ -331,7 +390,10 @@ class QueryTestCase(GraphQLTestCase):
             query.format("false", peripheral_gid, data_point_type_gid)
         )
         self.assertResponseNoErrors(response)
-        data_points = json.loads(response.content)["data"]["dataPointsByHour"]
+        data_points = [
+            i["node"]
+            for i in json.loads(response.content)["data"]["dataPointsByHour"]["edges"]
+        ]
         time = data_point_query.first().time.strftime("%Y-%m-%dT%H:00:00+00:00")
         self.assertEqual(data_points[0]["timeHour"], time)
 
@@ -404,3 +466,230 @@ class QueryTestCase(GraphQLTestCase):
         self.assertResponseNoErrors(response)
         nodes = json.loads(response.content)["data"]["allDataPoints"]["edges"]
         self.assertTrue(nodes)
+
+    def test_related_object_batching(self):
+        """Test that related objects are loaded with one query per relation"""
+
+        query = """
+            {{ allDataPoints(first: {first}) {{
+                edges {{ node {{
+                  value
+                  dataPointType {{ name }}
+                  peripheralComponent {{ siteEntity {{ name, site {{ name }} }} }}
+                }} }}
+            }} }}
+            """
+        query_counts = []
+        for first in (2, 50):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.query(query.format(first=first))
+            self.assertResponseNoErrors(response)
+            edges = json.loads(response.content)["data"]["allDataPoints"]["edges"]
+            self.assertEqual(len(edges), first)
+            names = {
+                edge["node"]["peripheralComponent"]["siteEntity"]["name"]
+                for edge in edges
+            }
+            self.assertLessEqual(names, {"PeriA", "PeriB"})
+            query_counts.append(len(queries))
+        self.assertEqual(query_counts[0], query_counts[1])
+
+    def test_data_point_keyset_pagination(self):
+        """Test that data points are paged by time cursors without counting them"""
+
+        gid = to_global_id("PeripheralComponentNode", self.peripheral_a.pk)
+        query = """
+            {{ allDataPoints(peripheralComponent: "{gid}", {page}) {{
+                pageInfo {{ hasNextPage, hasPreviousPage, startCursor, endCursor }}
+                edges {{ node {{ time }} }}
+            }} }}
+            """
+        expected = [
+            data_point.time.isoformat()
+            for data_point in DataPoint.objects.filter(
+                peripheral_component=self.peripheral_a
+            )[:6]
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.query(query.format(gid=gid, page="first: 3"))
+        self.assertResponseNoErrors(response)
+        self.assertFalse(any("COUNT(" in i["sql"] for i in queries))
+        page = json.loads(response.content)["data"]["allDataPoints"]
+        self.assertEqual([i["node"]["time"] for i in page["edges"]], expected[:3])
+        self.assertTrue(page["pageInfo"]["hasNextPage"])
+        self.assertFalse(page["pageInfo"]["hasPreviousPage"])
+
+        after = f'first: 3, after: "{page["pageInfo"]["endCursor"]}"'
+        response = self.query(query.format(gid=gid, page=after))
+        self.assertResponseNoErrors(response)
+        next_page = json.loads(response.content)["data"]["allDataPoints"]
+        self.assertEqual([i["node"]["time"] for i in next_page["edges"]], expected[3:])
+        self.assertTrue(next_page["pageInfo"]["hasPreviousPage"])
+
+        before = f'last: 2, before: "{next_page["pageInfo"]["startCursor"]}"'
+        response = self.query(query.format(gid=gid, page=before))
+        self.assertResponseNoErrors(response)
+        previous_page = json.loads(response.content)["data"]["allDataPoints"]
+        self.assertEqual(
+            [i["node"]["time"] for i in previous_page["edges"]], expected[1:3]
+        )
+        self.assertTrue(previous_page["pageInfo"]["hasPreviousPage"])
+
+        response = self.query(query.format(gid=gid, page='first: 3, after: "x"'))
+        self.assertResponseHasErrors(response)
+
+    def test_site_snapshot(self):
+        """Test that the latest values of a site are loaded with a fixed query count"""
+
+        for peripheral, data_point_type in (
+            (self.peripheral_a, self.data_point_type_a),
+            (self.peripheral_a, self.data_point_type_b),
+            (self.peripheral_b, self.data_point_type_b),
+            (self.peripheral_z, self.data_point_type_z),
+        ):
+            PeripheralDataPointType.objects.create(
+                peripheral=peripheral, data_point_type=data_point_type
+            )
+        query = """
+            {{ siteSnapshot(site: "{gid}") {{
+                peripherals {{
+                    peripheralComponent {{ siteEntity {{ name }} }}
+                    latestDataPoints {{ dataPointType {{ name }}, time, value }}
+                }}
+                controllerTasks {{ taskType, state }}
+            }} }}
+            """
+        gid = to_global_id("SiteNode", self.site_a.pk)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.query(query.format(gid=gid))
+        self.assertResponseNoErrors(response)
+        snapshot = json.loads(response.content)["data"]["siteSnapshot"]
+        peripheral_a, peripheral_b = snapshot["peripherals"]
+        self.assertEqual(
+            peripheral_a["peripheralComponent"]["siteEntity"]["name"], "PeriA"
+        )
+        latest = DataPoint.objects.filter(
+            peripheral_component=self.peripheral_a,
+            data_point_type=self.data_point_type_a,
+        ).first()
+        self.assertEqual(
+            peripheral_a["latestDataPoints"],
+            [
+                {
+                    "dataPointType": {"name": "dptA"},
+                    "time": latest.time.isoformat(),
+                    "value": latest.value,
+                },
+                {"dataPointType": {"name": "dptB"}, "time": None, "value": None},
+            ],
+        )
+        self.assertEqual(len(peripheral_b["latestDataPoints"]), 1)
+        self.assertEqual(
+            snapshot["controllerTasks"],
+            [{"taskType": "ReadSensor", "state": "running"}],
+        )
+        query_count = len(queries)
+
+        PeripheralComponent.objects.create(
+            peripheral_type=PeripheralComponent.PeripheralType.ANALOG_IN,
+            site_entity=SiteEntity.objects.create(name="PeriC", site=self.site_a),
+            controller_component=self.controller_a,
+            state=PeripheralComponent.State.ADDED,
+            other_parameters={},
+        )
+        with CaptureQueriesContext(connection) as queries:
+            response = self.query(query.format(gid=gid))
+        self.assertResponseNoErrors(response)
+        snapshot = json.loads(response.content)["data"]["siteSnapshot"]
+        self.assertEqual(len(snapshot["peripherals"]), 3)
+        self.assertEqual(len(queries), query_count)
+
+        gid = to_global_id("SiteNode", self.site_z.pk)
+        response = self.query(query.format(gid=gid))
+        self.assertResponseNoErrors(response)
+        self.assertIsNone(json.loads(response.content)["data"]["siteSnapshot"])
+
+    def test_sparkline(self):
+        """Test that the sparklines of a page of peripherals are loaded at once"""
+
+        DataPoint.objects.all().delete()
+        for minutes, value in ((35, 1), (45, 3), (75, 5), (200, 7)):
+            DataPoint.objects.create(
+                peripheral_component=self.peripheral_a,
+                data_point_type=self.data_point_type_a,
+                value=value,
+                time=datetime.now(tz=timezone.utc) - timedelta(minutes=minutes),
+            )
+        query = """
+            { allPeripheralComponents(first: 10) { edges { node {
+                siteEntity { name }
+                sparkline(hours: 2, points: 4) { dataPointType { name }, values }
+            } } } }
+            """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.query(query)
+        self.assertResponseNoErrors(response)
+        nodes = {
+            edge["node"]["siteEntity"]["name"]: edge["node"]["sparkline"]
+            for edge in json.loads(response.content)["data"]["allPeripheralComponents"][
+                "edges"
+            ]
+        }
+        self.assertEqual(
+            nodes,
+            {
+                "PeriA": [
+                    {"dataPointType": {"name": "dptA"}, "values": [None, 5, 2, None]}
+                ],
+                "PeriB": [],
+            },
+        )
+        self.assertEqual(sum("width_bucket" in i["sql"] for i in queries), 1)
+
+        response = self.query(
+            "{ allPeripheralComponents { edges { node { sparkline(points: 0) {"
+            " values } } } } }"
+        )
+        self.assertResponseHasErrors(response)
+
+    def test_nested_query_optimization(self):
+        """Test that the number of queries does not grow with the nested objects"""
+
+        query = """
+            { allControllerComponents(first: 10) { edges { node {
+                siteEntity { name }
+                peripheralComponentSet(first: 10) { edges { node {
+                    siteEntity { name }
+                    dataPointTypeSet(first: 10) { edges { node { name } } }
+                } } }
+            } } } }
+            """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.query(query)
+        self.assertResponseNoErrors(response)
+        edges = json.loads(response.content)["data"]["allControllerComponents"]["edges"]
+        self.assertEqual(len(edges), 1)
+        peripherals = edges[0]["node"]["peripheralComponentSet"]["edges"]
+        self.assertEqual(
+            {i["node"]["siteEntity"]["name"] for i in peripherals}, {"PeriA", "PeriB"}
+        )
+        query_count = len(queries)
+
+        controller = ControllerComponent.objects.create(
+            component_type=self.esp32_type,
+            site_entity=SiteEntity.objects.create(name="OtherESP32", site=self.site_a),
+        )
+        for name in ("PeriC", "PeriD"):
+            PeripheralComponent.objects.create(
+                peripheral_type=PeripheralComponent.PeripheralType.ANALOG_IN,
+                site_entity=SiteEntity.objects.create(name=name, site=self.site_a),
+                controller_component=controller,
+                state=PeripheralComponent.State.ADDED,
+                other_parameters={},
+            )
+        with CaptureQueriesContext(connection) as queries:
+            response = self.query(query)
+        self.assertResponseNoErrors(response)
+        edges = json.loads(response.content)["data"]["allControllerComponents"]["edges"]
+        self.assertEqual(len(edges), 2)
+        self.assertEqual(len(queries), query_count)
@@ -4,9 +4,10 @@ from asgiref.sync import async_to_sync
 from channels.db import database_sync_to_async
 from channels.testing import WebsocketCommunicator
 from django.contrib.auth import get_user_model
-from django.test import TransactionTestCase
+from django.test import TransactionTestCase, override_settings
 from graphql_relay.node.node import to_global_id
 
+from core.query_cost import QUERY_TOO_COMPLEX
 from core.routing import application
 from iot.models import (
     ControllerComponent,
@@ -216,3 +217,44 @@ class TestGraphQLSubscription(TransactionTestCase):
         data = output["payload"]["data"]
         result = data["controllerMessageSubscription"]["controllerMessage"]
         self.assertEqual(controller_message.request_id, result["requestId"])
+
+    @override_settings(
+        GRAPHQL_QUERY_BUDGETS={
+            "default": {
+                "max_depth": 4,
+                "max_rows": 1000,
+                "max_connection_size": 50,
+                "rows_per_minute": 1500,
+            }
+        }
+    )
+    @catch_warnings
+    @async_to_sync
+    async def test_query_cost(self):
+        """Test that operations exceeding the budget are rejected"""
+        communicator = await self.open_graphql_session()
+        output = await communicator.receive_json_from()
+        self.assertDictEqual({"type": "connection_ack"}, output)
+        for operation_id, query in (
+            ("1", "query q { allSites(first: 100) { edges { node { name } } } }"),
+            (
+                "2",
+                """subscription s {
+                  dataPointSubscription(peripheralIds: []) { dataPoint {
+                    peripheralComponent { dataPointSet(first: 100) {
+                      edges { node { value } }
+                    } }
+                  } }
+                }""",
+            ),
+        ):
+            await communicator.send_json_to(
+                {"id": operation_id, "type": "start", "payload": {"query": query}}
+            )
+            output = await communicator.receive_json_from()
+            self.assertEqual(output["id"], operation_id)
+            self.assertEqual(output["type"], "data")
+            error = output["payload"]["errors"][0]
+            self.assertEqual(error["extensions"]["code"], QUERY_TOO_COMPLEX)
+            output = await communicator.receive_json_from()
+            self.assertDictEqual({"id": operation_id, "type": "complete"}, output)
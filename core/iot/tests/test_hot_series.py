@@ -0,0 +1,108 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from django.test import SimpleTestCase, override_settings
+
+from iot import hot_series
+from iot.hot_series import RingBuffer
+from iot.models import DataPoint, DataPointBackfill
+
+
+@override_settings(
+    HOT_SERIES_CAPACITY=4,
+    HOT_SERIES_MAX_SERIES=2,
+    HOT_SERIES_LOAD_WINDOW=timedelta(hours=1),
+)
+class HotSeriesTests(SimpleTestCase):
+    """Test the ring buffers of recent data points"""
+
+    def setUp(self):
+        hot_series.get_store().clear()
+        self.peripheral_component_id = str(uuid.uuid4())
+        self.data_point_type_id = str(uuid.uuid4())
+        self.hour = datetime(2021, 4, 1, 12, tzinfo=timezone.utc)
+
+    def create_data_points(self, minutes, model=DataPoint):
+        return [
+            model(
+                time=self.hour + timedelta(minutes=minute),
+                value=minute,
+                peripheral_component_id=self.peripheral_component_id,
+                data_point_type_id=self.data_point_type_id,
+            )
+            for minute in minutes
+        ]
+
+    def test_ring_buffer(self):
+        """Test that a full buffer overwrites its oldest data points"""
+
+        buffer = RingBuffer(3, covered_from=0)
+        for time in range(1, 6):
+            self.assertTrue(buffer.append(time, time * 10))
+        times, values = buffer.get_range()
+        self.assertEqual(times.tolist(), [3, 4, 5])
+        self.assertEqual(values.tolist(), [30, 40, 50])
+        self.assertEqual(buffer.covered_from, 3)
+
+        times, _ = buffer.get_range(4, 5)
+        self.assertEqual(times.tolist(), [4])
+        # Data points already in the buffer are skipped, missing older ones rejected
+        self.assertTrue(buffer.append(4, 40))
+        self.assertFalse(buffer.append(2, 20))
+
+    def test_hot_buckets(self):
+        """Test aggregating the ingested data points by hour"""
+
+        hot_series.append_data_points(self.create_data_points([0, 30, 60, 90]))
+        start, rows = hot_series.hot_buckets(
+            self.peripheral_component_id,
+            self.data_point_type_id,
+            timedelta(hours=1),
+            "time_hour",
+        )
+        # The buffer covers the series from its first data point
+        self.assertEqual(start, self.hour)
+        self.assertEqual(
+            rows,
+            [
+                {"time_hour": self.hour, "avg": 15, "min": 0, "max": 30},
+                {
+                    "time_hour": self.hour + timedelta(hours=1),
+                    "avg": 75,
+                    "min": 60,
+                    "max": 90,
+                },
+            ],
+        )
+
+        # Evicting the oldest data point makes the first hour incomplete
+        hot_series.append_data_points(self.create_data_points([100]))
+        start, rows = hot_series.hot_buckets(
+            self.peripheral_component_id,
+            self.data_point_type_id,
+            timedelta(hours=1),
+            "time_hour",
+        )
+        self.assertEqual(start, self.hour + timedelta(hours=1))
+        self.assertEqual([row["max"] for row in rows], [100])
+
+        self.assertEqual(
+            hot_series.merge_hot_buckets([{"max": 1}], rows, False, 100),
+            [rows[0], {"max": 1}],
+        )
+
+    def test_exclude(self):
+        """Test that staged data points are left to the database"""
+
+        hot_series.append_data_points(self.create_data_points([0, 10, 70]))
+        hot_series.exclude_data_points(
+            self.create_data_points([65], model=DataPointBackfill)
+        )
+        start, rows = hot_series.hot_buckets(
+            self.peripheral_component_id,
+            self.data_point_type_id,
+            timedelta(hours=1),
+            "time_hour",
+        )
+        self.assertEqual(start, self.hour + timedelta(hours=2))
+        self.assertEqual(rows, [])
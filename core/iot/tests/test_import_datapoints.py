@@ -0,0 +1,154 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from iot.models import (
+    ControllerComponent,
+    ControllerComponentType,
+    DataPoint,
+    DataPointType,
+    PeripheralComponent,
+    Site,
+    SiteEntity,
+)
+
+
+class ImportDataPointsTests(TestCase):
+    """Test the bulk import of historical data points"""
+
+    def setUp(self):
+        site = Site.objects.create(
+            name="Site A",
+            owner=get_user_model().objects.create_user(
+                email="owner@bar.com", password="foo"
+            ),
+        )
+        controller = ControllerComponent.objects.create(
+            component_type=ControllerComponentType.objects.create(name="ESP32"),
+            site_entity=SiteEntity.objects.create(name="ESP32 A", site=site),
+        )
+        self.bme280 = PeripheralComponent.objects.create(
+            site_entity=SiteEntity.objects.create(name="BME280 A", site=site),
+            peripheral_type=PeripheralComponent.PeripheralType.BME280_SENSOR.value,
+            controller_component=controller,
+        )
+        self.air_temperature = DataPointType.objects.create(name="Air Temp", unit="°C")
+        self.air_pressure = DataPointType.objects.create(name="Air Pressure", unit="Pa")
+        self.time = datetime(2021, 1, 1, tzinfo=timezone.utc)
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, "data_points.csv")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def write_csv(self, rows, path=None):
+        with open(path or self.path, "w") as file:
+            file.write("time,peripheral_component,data_point_type,value\n")
+            for time, peripheral_component, data_point_type, value in rows:
+                file.write(
+                    f"{time.isoformat()},{peripheral_component},{data_point_type},"
+                    f"{value}\n"
+                )
+
+    def temperature_rows(self, count):
+        return [
+            (
+                self.time + timedelta(hours=hour),
+                self.bme280.pk,
+                self.air_temperature.pk,
+                hour,
+            )
+            for hour in range(count)
+        ]
+
+    def import_data_points(self, *args, **options):
+        stdout = io.StringIO()
+        call_command("import_datapoints", self.path, *args, stdout=stdout, **options)
+        return stdout.getvalue()
+
+    def test_validation(self):
+        """Test that missing files, unknown formats and unknown IDs are rejected"""
+
+        with self.assertRaisesMessage(CommandError, "File not found"):
+            self.import_data_points()
+
+        text_path = os.path.join(self.directory, "data_points.txt")
+        self.write_csv(self.temperature_rows(1), text_path)
+        with self.assertRaisesMessage(CommandError, "Unsupported file format: txt"):
+            call_command("import_datapoints", text_path, stdout=io.StringIO())
+
+        unknown_id = uuid.uuid4()
+        self.write_csv([(self.time, unknown_id, self.air_temperature.pk, 1)])
+        with self.assertRaisesMessage(CommandError, str(unknown_id)):
+            self.import_data_points()
+        self.write_csv([(self.time, self.bme280.pk, "invalid", 1)])
+        with self.assertRaisesMessage(CommandError, "Invalid data_point_type ID"):
+            self.import_data_points()
+        self.assertFalse(DataPoint.objects.exists())
+
+    def test_import_collisions(self):
+        """Test that rows colliding with other series are kept and stored rows are
+        skipped"""
+
+        DataPoint.objects.create(
+            time=self.time,
+            value=101000,
+            peripheral_component=self.bme280,
+            data_point_type=self.air_pressure,
+        )
+        DataPoint.objects.create(
+            time=self.time + timedelta(hours=1),
+            value=1,
+            peripheral_component=self.bme280,
+            data_point_type=self.air_temperature,
+        )
+        self.write_csv(self.temperature_rows(3))
+
+        output = self.import_data_points("--batch-size", "2")
+        self.assertIn("Imported 2 of 3 data points", output)
+        self.assertIn("skipped 1 duplicates", output)
+        temperatures = DataPoint.objects.filter(data_point_type=self.air_temperature)
+        self.assertEqual(
+            list(temperatures.order_by("time").values_list("time", "value")),
+            [
+                (self.time + timedelta(microseconds=1), 0),
+                (self.time + timedelta(hours=1), 1),
+                (self.time + timedelta(hours=2), 2),
+            ],
+        )
+        self.assertFalse(os.path.exists(f"{self.path}.import-state"))
+
+        # Importing the file again only finds duplicates
+        output = self.import_data_points("--restart")
+        self.assertIn("Imported 0 of 3 data points", output)
+        self.assertEqual(DataPoint.objects.count(), 4)
+
+    def test_resume(self):
+        """Test that an interrupted import continues after the imported rows"""
+
+        self.write_csv(self.temperature_rows(3))
+        state_file = f"{self.path}.import-state"
+        state = {"path": self.path, "rows": 2, "inserted": 2, "decompressed": []}
+        with open(state_file, "w") as file:
+            json.dump(state, file)
+
+        output = self.import_data_points("--batch-size", "2")
+        self.assertIn("Resuming import after 2 rows", output)
+        self.assertIn("Imported 3 of 3 data points", output)
+        self.assertEqual(list(DataPoint.objects.values_list("value", flat=True)), [2])
+        self.assertFalse(os.path.exists(state_file))
+
+        state["path"] = os.path.join(self.directory, "other.csv")
+        with open(state_file, "w") as file:
+            json.dump(state, file)
+        with self.assertRaisesMessage(CommandError, "belongs to another file"):
+            self.import_data_points()
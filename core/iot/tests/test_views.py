@@ -1,9 +1,21 @@
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+import pyarrow as pa
 from django.contrib.auth import get_user_model
 from django.contrib.messages import get_messages
 from django.test import Client, TestCase, TransactionTestCase
 from django.urls.base import reverse
 from rest_framework.authtoken.models import Token
-from iot.models import ControllerComponent, ControllerComponentType, Site, SiteEntity
+from iot.models import (
+    ControllerComponent,
+    ControllerComponentType,
+    DataPoint,
+    DataPointType,
+    PeripheralComponent,
+    Site,
+    SiteEntity,
+)
 
 
 class SiteTests(TestCase):
@@ -300,3 +312,106 @@ class UserTokenTests(TestCase):
         self.assertEqual(len(messages), 2)
         self.assertEqual(messages[1].tags, "error")
 
+
+class DataPointArrowTests(TestCase):
+    """Test the Apache Arrow export of data point series."""
+
+    def setUp(self):
+        self.client = Client()
+        self.owner_a = get_user_model().objects.create_user(
+            email="ownerA@bar.com", password="foo"
+        )
+        self.owner_z = get_user_model().objects.create_user(
+            email="ownerZ@bar.com", password="foo"
+        )
+        self.site_a = Site.objects.create(name="Site A", owner=self.owner_a)
+        controller = ControllerComponent.objects.create(
+            component_type=ControllerComponentType.objects.create(name="ESP32"),
+            site_entity=SiteEntity.objects.create(name="ESP32", site=self.site_a),
+        )
+        self.peripheral_a = PeripheralComponent.objects.create(
+            peripheral_type=PeripheralComponent.PeripheralType.ANALOG_IN,
+            site_entity=SiteEntity.objects.create(name="PeriA", site=self.site_a),
+            controller_component=controller,
+        )
+        self.data_point_type = DataPointType.objects.create(name="dptA", unit="uA")
+        self.start = datetime(2021, 4, 1, tzinfo=timezone.utc)
+        DataPoint.objects.bulk_create(
+            [
+                DataPoint(
+                    peripheral_component=self.peripheral_a,
+                    data_point_type=self.data_point_type,
+                    value=minute,
+                    time=self.start + timedelta(minutes=minute, microseconds=7),
+                )
+                for minute in range(120)
+            ]
+        )
+        self.url = reverse("iot:data-points-arrow")
+        self.series = f"{self.peripheral_a.pk}:{self.data_point_type.pk}"
+
+    def test_raw_series(self):
+        """Check that raw data points are exported with microsecond precision."""
+
+        # Check login required
+        response = self.client.get(self.url, {"series": self.series})
+        self.assertEqual(response.status_code, 401)
+
+        self.client.force_login(self.owner_a)
+        response = self.client.get(
+            self.url,
+            {"series": self.series, "before_time": self.start + timedelta(hours=1)},
+        )
+        self.assertEqual(response.status_code, 200)
+        table = pa.ipc.open_stream(b"".join(response.streaming_content)).read_all()
+        self.assertEqual(table.num_rows, 60)
+        self.assertEqual(table.column("value").to_pylist(), list(range(60)))
+        self.assertEqual(
+            table.column("time")[1].as_py(),
+            self.start + timedelta(minutes=1, microseconds=7),
+        )
+        self.assertIn(
+            str(self.peripheral_a.pk), table.schema.metadata[b"series"].decode()
+        )
+
+    def test_bucketed_series(self):
+        """Check the aggregation by time bucket."""
+
+        self.client.force_login(self.owner_a)
+        response = self.client.get(
+            self.url, {"series": self.series, "bucket": "01:00:00"}
+        )
+        self.assertEqual(response.status_code, 200)
+        table = pa.ipc.open_stream(b"".join(response.streaming_content)).read_all()
+        self.assertEqual(table.column("time").to_pylist()[0], self.start)
+        self.assertEqual(table.column("avg").to_pylist(), [29.5, 89.5])
+        self.assertEqual(table.column("max").to_pylist(), [59, 119])
+        self.assertEqual(table.column("count").to_pylist(), [60, 60])
+
+    @mock.patch("iot.arrow.COPY_BATCH_ROWS", 25)
+    def test_copy_pages(self):
+        """Check that long series are copied in pages of bounded size."""
+
+        self.client.force_login(self.owner_a)
+        response = self.client.get(self.url, {"series": self.series})
+        reader = pa.ipc.open_stream(b"".join(response.streaming_content))
+        batches = list(reader)
+        self.assertEqual([batch.num_rows for batch in batches], [25] * 4 + [20])
+        table = pa.Table.from_batches(batches)
+        self.assertEqual(table.column("value").to_pylist(), list(range(120)))
+
+        response = self.client.get(
+            self.url, {"series": self.series, "bucket": "00:05:00"}
+        )
+        table = pa.ipc.open_stream(b"".join(response.streaming_content)).read_all()
+        self.assertEqual(table.column("count").to_pylist(), [5] * 24)
+        self.assertEqual(table.column("min").to_pylist(), list(range(0, 120, 5)))
+
+    def test_isolation_and_validation(self):
+        """Check that other users' series and malformed series are rejected."""
+
+        self.client.force_login(self.owner_z)
+        response = self.client.get(self.url, {"series": self.series})
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get(self.url, {"series": "abc"})
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,204 @@
+"""Helpers for the TimescaleDB chunks of the data point hypertable.
+
+Rows inserted into compressed chunks are slow or rejected. Bulk writes therefore stage
+their rows in a plain table and merge them per chunk, decompressing the target chunks
+only for as long as needed."""
+
+from datetime import datetime
+from typing import Iterable, List, NamedTuple, Optional
+
+from django.db import connection, transaction
+
+from iot import bucket_cache
+from iot.models import DataPoint, DataPointArchive
+
+
+class Chunk(NamedTuple):
+    """A chunk of a hypertable and the time range it covers."""
+
+    name: str
+    range_start: datetime
+    range_end: datetime
+    is_compressed: bool
+
+
+def get_chunks(
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    table: str = DataPoint._meta.db_table,
+) -> List[Chunk]:
+    """Return the chunks of the hypertable overlapping [start, end), oldest first."""
+
+    query = (
+        "SELECT format('%%I.%%I', chunk_schema, chunk_name), range_start, range_end,"
+        " is_compressed FROM timescaledb_information.chunks"
+        " WHERE hypertable_name = %s"
+    )
+    params: List = [table]
+    if start:
+        query += " AND range_end > %s"
+        params.append(start)
+    if end:
+        query += " AND range_start < %s"
+        params.append(end)
+    with connection.cursor() as cursor:
+        cursor.execute(query + " ORDER BY range_start", params)
+        return [Chunk(*row) for row in cursor.fetchall()]
+
+
+def decompress_chunks(chunks: Iterable[Chunk]) -> List[Chunk]:
+    """Decompress the compressed chunks and return the ones that were decompressed."""
+
+    decompressed = [chunk for chunk in chunks if chunk.is_compressed]
+    with connection.cursor() as cursor:
+        for chunk in decompressed:
+            cursor.execute(
+                "SELECT decompress_chunk(%s::regclass, if_compressed => true)",
+                [chunk.name],
+            )
+    return decompressed
+
+
+def compress_chunks(chunk_names: Iterable[str]):
+    """Compress the chunks again, e.g., after decompressing them for a merge."""
+
+    with connection.cursor() as cursor:
+        for chunk_name in chunk_names:
+            cursor.execute(
+                "SELECT compress_chunk(%s::regclass, if_not_compressed => true)",
+                [chunk_name],
+            )
+
+
+def drop_chunk(chunk: Chunk):
+    """Drop the chunk and all its data points."""
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE {chunk.name}")
+
+
+class MergeResult(NamedTuple):
+    """The number of staged data points inserted, of those already stored and of those
+    rejected as their peripheral's data points of that time were archived."""
+
+    inserted: int
+    duplicates: int
+    archived: int = 0
+
+
+# The session's working copy of the data points being merged
+MERGE_TABLE = "iot_datapoint_merge"
+
+
+def merge_staged_data_points(
+    staging_table: str, where: str = "", params=()
+) -> MergeResult:
+    """Insert the staged data points into the hypertable and delete the merged ones
+    from the staging table.
+
+    The staging table has the columns id, time, peripheral_component_id,
+    data_point_type_id and value. As the time is the primary key of all series,
+    colliding data points are shifted by a microsecond until a free timestamp is
+    found, the same as single inserts. A data point is only skipped if the same
+    series already has the same value at the same timestamp, which makes repeated
+    merges idempotent as the shifts are repeated as well. The cached buckets of the
+    series with new rows are invalidated once the merge is committed.
+
+    Data points at or before the last archived data point of their peripheral are
+    rejected and deleted from the staging table. Queries combine the archive with the
+    database by concatenating them, so such rows would duplicate the archived buckets.
+    """
+
+    condition = f"WHERE {where}" if where else ""
+    table = DataPoint._meta.db_table
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f"DROP TABLE IF EXISTS {MERGE_TABLE}")
+        # Staged copies of the same data point are only merged once
+        cursor.execute(
+            f"CREATE TEMPORARY TABLE {MERGE_TABLE} AS"
+            " SELECT id AS staged_id, time, peripheral_component_id,"
+            " data_point_type_id, value, CASE WHEN row_number() OVER ("
+            "   PARTITION BY time, peripheral_component_id, data_point_type_id, value"
+            "   ORDER BY id) > 1 THEN false END AS inserted, false AS archived"
+            f" FROM {staging_table} {condition}",
+            params,
+        )
+        cursor.execute(
+            f"UPDATE {MERGE_TABLE} AS staged SET inserted = false, archived = true"
+            " FROM (SELECT peripheral_component_id, max(end_time) AS end_time"
+            f" FROM {DataPointArchive._meta.db_table}"
+            " GROUP BY peripheral_component_id) AS archive"
+            " WHERE archive.peripheral_component_id = staged.peripheral_component_id"
+            " AND staged.time <= archive.end_time"
+        )
+        cursor.execute(f"ANALYZE {MERGE_TABLE}")
+        pending = f"SELECT 1 FROM {MERGE_TABLE} WHERE inserted IS NULL LIMIT 1"
+        cursor.execute(pending)
+        while cursor.fetchone():
+            # Insert one of the pending data points per timestamp. The others and
+            # those colliding with stored ones are checked for duplicates at this
+            # timestamp and shifted to the next.
+            cursor.execute(
+                "WITH candidates AS (SELECT DISTINCT ON (time) staged_id, time,"
+                " peripheral_component_id, data_point_type_id, value"
+                f" FROM {MERGE_TABLE} WHERE inserted IS NULL"
+                " ORDER BY time, staged_id),"
+                f" new_rows AS (INSERT INTO {table}"
+                " (time, peripheral_component_id, data_point_type_id, value)"
+                " SELECT time, peripheral_component_id, data_point_type_id, value"
+                " FROM candidates ON CONFLICT (time) DO NOTHING RETURNING time)"
+                f" UPDATE {MERGE_TABLE} SET inserted = true"
+                " FROM candidates JOIN new_rows USING (time)"
+                f" WHERE {MERGE_TABLE}.staged_id = candidates.staged_id"
+            )
+            cursor.execute(
+                f"UPDATE {MERGE_TABLE} AS staged SET inserted = false"
+                f" FROM {table} AS data_point"
+                " WHERE staged.inserted IS NULL"
+                " AND data_point.time = staged.time"
+                " AND data_point.peripheral_component_id"
+                " = staged.peripheral_component_id"
+                " AND data_point.data_point_type_id = staged.data_point_type_id"
+                " AND data_point.value = staged.value"
+            )
+            cursor.execute(
+                f"UPDATE {MERGE_TABLE} SET time = time + interval '1 microsecond'"
+                " WHERE inserted IS NULL"
+            )
+            cursor.execute(pending)
+
+        cursor.execute(
+            f"DELETE FROM {staging_table}"
+            f" WHERE id IN (SELECT staged_id FROM {MERGE_TABLE}"
+            " WHERE inserted IS NOT NULL)"
+        )
+        cursor.execute(
+            "SELECT peripheral_component_id, data_point_type_id,"
+            " min(time) FILTER (WHERE inserted),"
+            " count(*) FILTER (WHERE inserted),"
+            " count(*) FILTER (WHERE NOT inserted AND NOT archived),"
+            " count(*) FILTER (WHERE archived)"
+            f" FROM {MERGE_TABLE} GROUP BY peripheral_component_id, data_point_type_id"
+        )
+        series = cursor.fetchall()
+        cursor.execute(f"DROP TABLE {MERGE_TABLE}")
+
+    def invalidate():
+        for (
+            peripheral_component_id,
+            data_point_type_id,
+            earliest,
+            inserted,
+            *_,
+        ) in series:
+            if inserted:
+                bucket_cache.invalidate_series(
+                    peripheral_component_id, data_point_type_id, earliest
+                )
+
+    transaction.on_commit(invalidate)
+    return MergeResult(
+        inserted=sum(row[3] for row in series),
+        duplicates=sum(row[4] for row in series),
+        archived=sum(row[5] for row in series),
+    )
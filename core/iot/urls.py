@@ -10,9 +10,16 @@ from iot.views import (
     CreateUserTokenView,
     DeleteUserTokenView,
 )
+from iot.views_api import DataPointArrowView
 
 app_name = "iot"
 
+api_urlpatterns = [
+    path(
+        "api/data_points/arrow/", DataPointArrowView.as_view(), name="data-points-arrow"
+    ),
+]
+
 urlpatterns = [
     path("sites/", SiteListView.as_view(), name="site-list"),
     path("site/", CreateSiteView.as_view(), name="create-site"),
@@ -22,4 +29,5 @@ urlpatterns = [
     path("controller/<uuid:pk>/delete/", DeleteControllerView.as_view(), name="delete-controller"),
     path("user_token/", CreateUserTokenView.as_view(), name="create-user-token"),
     path("user_token/delete/", DeleteUserTokenView.as_view(), name="delete-user-token"),
-]
\ No newline at end of file
+    *api_urlpatterns,
+]
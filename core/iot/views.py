@@ -9,7 +9,8 @@ from django.db.utils import IntegrityError
 from rest_framework.authtoken.models import Token
 
 from iot.forms import CreateControllerForm, CreateSiteForm
-from iot.models import ControllerComponent, Site, SiteEntity
+from iot.models import ControllerComponent, DeletionJob, Site, SiteEntity
+from iot.tasks import delete_detached_site
 
 
 class SiteListView(LoginRequiredMixin, View):
@@ -26,6 +27,9 @@ class SiteListView(LoginRequiredMixin, View):
         context["controller_count"] = ControllerComponent.objects.filter(
             site_entity__site__owner=request.user
         ).count()
+        context["deletion_jobs"] = DeletionJob.objects.filter(
+            owner=request.user, target_type=DeletionJob.TargetType.SITE
+        ).exclude(state=DeletionJob.State.DONE)
         return render(request, "iot/site_list.html", context)
 
 
@@ -50,8 +54,9 @@ class DeleteSiteView(LoginRequiredMixin, View):
     def post(self, request, *args, **kwargs):
         try:
             site = Site.objects.filter(owner=request.user).get(pk=kwargs["pk"])
-            site.delete()
-            messages.success(request, f"Deleted site {site.name}")
+            job = DeletionJob.objects.detach_site(site, request.user)
+            delete_detached_site.delay(job.pk)
+            messages.success(request, f"Deleting site {site.name}")
         except Site.DoesNotExist:
             messages.error(request, f"Failed deleting site")
         return HttpResponseRedirect(reverse("iot:site-list"))
@@ -69,6 +74,9 @@ class ControllerListView(LoginRequiredMixin, View):
             .filter(site_entity__site__owner=request.user)
             .annotate(num_peripherals=Count("peripheral_component_set"))
         )
+        context["deletion_jobs"] = DeletionJob.objects.filter(
+            owner=request.user, target_type=DeletionJob.TargetType.CONTROLLER
+        ).exclude(state=DeletionJob.State.DONE)
         return render(request, "iot/controller_list.html", context)
 
 
@@ -125,8 +133,9 @@ class DeleteControllerView(LoginRequiredMixin, View):
             site_entity = SiteEntity.objects.filter(site__owner=request.user).get(
                 pk=kwargs["pk"]
             )
-            site_entity.delete()
-            messages.success(request, f"Deleted controller {site_entity.name}")
+            job = DeletionJob.objects.detach_controller(site_entity, request.user)
+            delete_detached_site.delay(job.pk)
+            messages.success(request, f"Deleting controller {site_entity.name}")
         except SiteEntity.DoesNotExist:
             messages.error(request, "Failed to delete controller")
         return HttpResponseRedirect(reverse("iot:controller-list"))
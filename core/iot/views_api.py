@@ -0,0 +1,52 @@
+from django.http import StreamingHttpResponse
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from core.db_routers import get_read_database
+from iot.arrow import (
+    ARROW_STREAM_CONTENT_TYPE,
+    series_record_batches,
+    to_ipc_stream,
+    to_schema,
+)
+from iot.models import PeripheralComponent
+from iot.serializers import DataPointSeriesSerializer
+
+
+class DataPointArrowView(APIView):
+    """Streams data point series, raw or aggregated by time bucket, in the Apache
+    Arrow IPC stream format."""
+
+    permission_classes = (IsAuthenticated,)
+
+    def get(self, request, **kwargs):
+        serializer = DataPointSeriesSerializer(data=request.query_params)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        series = serializer.validated_data["series"]
+        bucket = serializer.validated_data.get("bucket")
+
+        peripheral_component_ids = {peripheral for peripheral, _ in series}
+        owned_count = PeripheralComponent.objects.filter(
+            pk__in=peripheral_component_ids, site_entity__site__owner=request.user
+        ).count()
+        if owned_count != len(peripheral_component_ids):
+            return Response(
+                {"series": ["Unknown peripheral component"]},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+
+        batches = series_record_batches(
+            series,
+            from_time=serializer.validated_data.get("from_time"),
+            before_time=serializer.validated_data.get("before_time"),
+            bucket=bucket,
+            # The batches are streamed after returning, so pick the database upfront
+            using=get_read_database(request.user),
+        )
+        return StreamingHttpResponse(
+            to_ipc_stream(to_schema(series, bucket), batches),
+            content_type=ARROW_STREAM_CONTENT_TYPE,
+        )
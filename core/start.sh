@@ -268,7 +268,7 @@ fi
 
 if [[ -z $1 ]]; then
   echo "Starting Celery processes"
-  pipenv run celery -A core worker -l info &
+  pipenv run celery -A core worker -B -l info &
 
   # Start the app server, either for the dev or prod environment
   if [[ $DJANGO_DEBUG != "False" ]]; then